@@ -12,27 +12,60 @@
 import warnings
 
 warnings.simplefilter("ignore")
-import multiprocessing
 import sys
 import traceback
-from typing import Callable, List, Optional, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, Final, List, Optional, Set, Tuple
 
 import backend.analyzer.extract_features as ef
 import pandas as pd
+from backend.analyzer.shared_shot_frame import SharedShotFrame
 from backend.common import common
 from backend.common.common_logger import logger
 from backend.data_reader.data_reader import DataReader
 from backend.elastic_manager.elastic_manager import ElasticManager
 from pandas.core.frame import DataFrame
 
+# 複数ショットの一括処理に対応したロジック。ショット単位のロジックと同じ結果を返す
+BATCH_FUNCS: Dict[Callable, Callable] = {ef.max_load: ef.max_load_batch}
+# 1タスクで処理するショット数。小さいほど、処理を終えたプロセスが残りのショットを分担しやすい
+CHUNK_SIZE: Final[int] = 8
+
+# ワーカープロセスのAnalyzer。プロセス起動時に1度だけ受け取り、ショットデータは共有メモリから参照する
+_worker_analyzer: Optional["Analyzer"] = None
+
+
+def _init_worker(analyzer: "Analyzer") -> None:
+    global _worker_analyzer
+    _worker_analyzer = analyzer
+
+
+def _extract_chunk(shot_numbers: List[int], feature: str, func: Callable, sub_func: Optional[Callable]) -> List[dict]:
+    """ワーカープロセスでショットにロジックを適用する"""
+
+    return _worker_analyzer._extract(shot_numbers, feature, func, sub_func)  # type: ignore
+
 
 class Analyzer:
     def __init__(self, target: str, shots_df: DataFrame, shots_meta_df: DataFrame, exclude_shots: Optional[Tuple[int, ...]]):
         self.__target = target
-        self.__shots_df = shots_df
+        # NOTE: ショットデータは共有メモリに配置し、ワーカープロセスはコピーせずに参照する
+        self.__shots: SharedShotFrame = SharedShotFrame.create(shots_df)
         self.__shots_meta_df = shots_meta_df
         self.__exclude_shots = exclude_shots
 
+    def __enter__(self) -> "Analyzer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # NOTE: ロジック適用中の例外やsys.exit()の場合も共有メモリを解放する
+        self.close()
+
+    def close(self) -> None:
+        """共有メモリに配置したショットデータを解放する"""
+
+        self.__shots.close()
+
     def apply(
         self,
         feature: str,
@@ -62,84 +95,82 @@ class Analyzer:
         func: Callable,
         sub_func: Callable = None,
     ) -> None:
-        """データを複数ショット単位で読み込み、ロジック適用、ELS格納"""
+        """ショットを少数ずつプロセスに割り当ててロジック適用し、完了した順にELS格納"""
 
-        # NOTE: ショットを削除した場合ショット番号が歯抜けになるため、countではなく最終ショット番号を採用
-        num_of_shots: int = self.__shots_meta_df.shot_number.iloc[-1]
+        shot_numbers: List[int] = self._target_shot_numbers()
+        chunks: List[List[int]] = [shot_numbers[i : i + CHUNK_SIZE] for i in range(0, len(shot_numbers), CHUNK_SIZE)]
+        logger.debug(f"num_of_shots: {len(shot_numbers)}, num_of_chunks: {len(chunks)}")
 
-        # データをプロセッサの数に均等分配
-        shots_num_by_proc: List[int] = [(num_of_shots + i) // common.NUM_OF_PROCESS for i in range(common.NUM_OF_PROCESS)]
-        logger.debug(f"shots_num_by_proc: {shots_num_by_proc}")
-
-        procs: List[multiprocessing.context.Process] = []
-        start_shot_number: int = 1
-        # Nショット分をまとめてプロセスに割当。
-        for shots_num in shots_num_by_proc:
-            logger.debug(f"start_shot_number: {start_shot_number}")
-            end_shot_number: int = start_shot_number + shots_num
-            logger.debug(f"end_shot_number: {end_shot_number}")
-
-            proc: multiprocessing.context.Process = multiprocessing.Process(
-                target=self._apply_logic,
-                args=(
-                    feature_index,
-                    start_shot_number,
-                    end_shot_number,
-                    feature,
-                    func,
-                    sub_func,
-                ),
-            )
-            proc.start()
-            procs.append(proc)
-
-            start_shot_number = end_shot_number
-
-        for proc in procs:
-            proc.join()
-
-    def _apply_logic(
-        self,
-        feature_index: str,
-        start_shot_number: int,
-        end_shot_number: int,
-        feature: str,
-        func: Callable,
-        sub_func: Callable = None,
-    ) -> None:
-        """ショットに対しロジック(func)適用"""
+        # NOTE: プールの共有キューから、処理を終えたプロセスが次のチャンクを取得する
+        with ProcessPoolExecutor(max_workers=common.NUM_OF_PROCESS, initializer=_init_worker, initargs=(self,)) as executor:
+            futures: List[Future] = [executor.submit(_extract_chunk, chunk, feature, func, sub_func) for chunk in chunks]
 
-        result: List[dict] = []
+            for future in as_completed(futures):
+                result: List[dict] = future.result()
+                if len(result) > 0:
+                    ElasticManager.bulk_insert(result, feature_index)
+
+    def _target_shot_numbers(self) -> List[int]:
+        """ロジック適用対象のショット番号。除外ショットとデータのないショットは含めない"""
+
+        # NOTE: ショットを削除した場合ショット番号が歯抜けになるため、countではなく最終ショット番号を採用
+        num_of_shots: int = self.__shots_meta_df.shot_number.iloc[-1]
 
-        for shot_number in range(start_shot_number, end_shot_number):
+        shot_numbers_with_data: Set[int] = set(self.__shots.shot_numbers())
+        shot_numbers: List[int] = []
+        for shot_number in range(1, num_of_shots + 1):
             # 除外ショットはスキップ
             if self.__exclude_shots is not None:
                 if shot_number in self.__exclude_shots:
                     logger.info(f"shot_number: {shot_number} was excluded.")
                     continue
 
-            # 特定ショット番号のデータを抽出
-            shot_df: DataFrame = self.__shots_df[self.__shots_df.shot_number == shot_number]
-
-            if len(shot_df) == 0:
+            if shot_number not in shot_numbers_with_data:
                 logger.info(f"shot_number: {shot_number} was not found.")
                 continue
 
-            shot_df = shot_df.reset_index()
+            shot_numbers.append(shot_number)
+
+        return shot_numbers
+
+    def _extract(self, shot_numbers: List[int], feature: str, func: Callable, sub_func: Callable = None) -> List[dict]:
+        """ショットに対しロジック(func)適用"""
+
+        result: List[dict] = []
+        targets: List[Tuple[int, DataFrame, float]] = []
+
+        for shot_number in shot_numbers:
+            # 特定ショット番号のデータを抽出
+            shot_df: DataFrame = self.__shots.shot(shot_number)  # type: ignore
 
             spm: Optional[float] = self.__shots_meta_df[self.__shots_meta_df.shot_number == shot_number].spm
             # TODO: 後続エラー回避のため、暫定対処としてNoneのときは80.0としている
-            spm = float(spm) if spm.iloc[0] is not None else 80.0  # type: ignore
+            spm = float(spm.iloc[0]) if spm.iloc[0] is not None else 80.0  # type: ignore
+
+            targets.append((shot_number, shot_df, spm))  # type: ignore
+
+        # ロジック適用。複数ショットの一括処理に対応したロジックは、まとめて適用する
+        extracted: Dict[int, Tuple[List[int], List[float], List[float]]] = {}
+        batch_func: Optional[Callable] = BATCH_FUNCS.get(func) if sub_func is None else None
+        if batch_func is not None and len(targets) > 0:
+            try:
+                batch_results: list = batch_func([t[1] for t in targets], [t[2] for t in targets])
+                extracted = {t[0]: r for t, r in zip(targets, batch_results)}
+            except Exception:
+                logger.error(f"Failed to apply batch logic. Fall back to each shot. \n{traceback.format_exc()}")
 
+        for shot_number, shot_df, spm in targets:
             indices: List[int]
             values: List[float]
             debug_values: List[float]
-            # ロジック適用
-            try:
-                indices, values, debug_values = ef.extract_features(shot_df, spm, func, sub_func=sub_func)
-            except Exception:
-                logger.error(f"Failed to apply logic. shot_number: {shot_number}. \n{traceback.format_exc()}")
-                continue
+            if shot_number in extracted:
+                indices, values, debug_values = extracted[shot_number]
+            else:
+                try:
+                    indices, values, debug_values = ef.extract_features(shot_df, spm, func, sub_func=sub_func)
+                except Exception:
+                    logger.error(f"Failed to apply logic. shot_number: {shot_number}. \n{traceback.format_exc()}")
+                    continue
 
             # NOTE: 独自ロジックにつき不要になる可能性あり
             if feature == "break":
@@ -161,8 +192,7 @@ class Analyzer:
 
                 result.append(d)
 
-        # ELSに保存
-        ElasticManager.bulk_insert(result, feature_index)
+        return result
 
     def _extract_break_channels(self, values: List[float]) -> Tuple[str, str]:
         """4ch分の破断点の荷重値リストを受け取り、破断側のチャネルセットを返す。"""
@@ -226,25 +256,26 @@ if __name__ == "__main__":
     # exclude_shots: Optional[Tuple[int, ...]] = (983, 1227, 1228, 1229, 1369, 1381)
     exclude_shots: Optional[Tuple[int]] = None
 
-    analyzer = Analyzer(target, shots_df, shots_meta_df, exclude_shots)
-    analyzer.apply(
-        feature="max",
-        func=ef.max_load,
-        sub_func=None,
-    )
-    analyzer.apply(
-        feature="start",
-        func=ef.load_start3,
-        sub_func=None,
-    )
-    analyzer.apply(
-        feature="break",
-        func=ef.breaking_vmin_amin,
-        sub_func=ef.narrowing_v4min_mab,
-    )
-
-    start_index = "shots-" + target + "-start-point"
-    start_df = dr.read_all(start_index)
-    break_index = "shots-" + target + "-break-point"
-    break_df = dr.read_all(break_index)
-    analyzer.start_break_diff(start_df=start_df, break_df=break_df)
+    with Analyzer(target, shots_df, shots_meta_df, exclude_shots) as analyzer:
+        del shots_df  # 共有メモリにコピー済みのため解放する
+        analyzer.apply(
+            feature="max",
+            func=ef.max_load,
+            sub_func=None,
+        )
+        analyzer.apply(
+            feature="start",
+            func=ef.load_start3,
+            sub_func=None,
+        )
+        analyzer.apply(
+            feature="break",
+            func=ef.breaking_vmin_amin,
+            sub_func=ef.narrowing_v4min_mab,
+        )
+
+        start_index = "shots-" + target + "-start-point"
+        start_df = dr.read_all(start_index)
+        break_index = "shots-" + target + "-break-point"
+        break_df = dr.read_all(break_index)
+        analyzer.start_break_diff(start_df=start_df, break_df=break_df)
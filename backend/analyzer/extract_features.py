@@ -33,6 +33,18 @@ def _idiff(x):
 
 
 NARROW_PADDING = 50
+# 特徴抽出の対象チャネル(省略時)
+LOAD_CHANNELS = ["load01", "load02", "load03", "load04"]
+
+
+def multi_channel(func):
+    """多チャネル対応の特徴抽出関数とするデコレータ
+    デコレートした関数は、1系列のnp.arrayに加えて全チャネルを並べた2次元配列(サンプル数, チャネル数)を受け取れること。
+    2次元配列の場合は、チャネルごとのindex, 値, デバッグ値をそれぞれリストとして返す。
+    extract_features()はこの関数に全チャネルをまとめて渡し、チャネル方向に一括で処理させる。
+    """
+    func.multi_channel = True
+    return func
 
 
 def narrowing_v4min_mab(shot_df, disp_narrowing=False, shot=9999):
@@ -980,6 +992,23 @@ def load_start3(d, spm, r_window=399, Debug=False, shot=999, ch="loadxx", debug_
     return h, df.d[h], sd_end
 
 
+def _max_load_high(spm, high):
+    """最大荷重点検出のバンドパス上限周波数"""
+    if high is None:  # バンドパス上限周波数が明示されない場合
+        if spm > 60:  # 高SPM時はノイズ除去を優先し2kHz以上をカット
+            high = 2000
+        else:  # 低SPM時はFFTの副作用のデメリットの方が大きくなるので積極的にカットしない
+            high = 5000
+    return high
+
+
+def _max_load_peaks(m):
+    """移動平均後の2次元配列(サンプル数, チャネル数)から、チャネルごとの最大点のindexと値を返す"""
+    hs = np.nanargmax(m, axis=0).tolist()
+    return hs, [m[h, c] for c, h in enumerate(hs)], [None] * len(hs)
+
+
+@multi_channel
 def max_load(
     d, spm, fs=100000, low=0, high=None, r_window=19, Debug=False, shot=9999, ch="loadxx", debug_xlim=[-1500, 1000]
 ):
@@ -997,12 +1026,13 @@ def max_load(
     :r_window (int)      移動平均ウィンドウ範囲
     :return (int,float,*)  最大荷重点index, 最大荷重値
 
+    dが2次元配列(サンプル数, チャネル数)の場合は、全チャネルをまとめてバンドパス、移動平均し、
+    チャネルごとの最大荷重点indexと最大荷重値をリストで返す。
     """
-    if high is None:  # バンドパス上限周波数が明示されない場合
-        if spm > 60:  # 高SPM時はノイズ除去を優先し2kHz以上をカット
-            high = 2000
-        else:  # 低SPM時はFFTの副作用のデメリットの方が大きくなるので積極的にカットしない
-            high = 5000
+    high = _max_load_high(spm, high)
+    if np.ndim(d) == 2:  # 多チャネル
+        b = bandpass_rfft(d, fs, low, high)  # チャネルごとにバンドパス
+        return _max_load_peaks(pd.DataFrame(b).rolling(r_window).mean().to_numpy())
     df = pd.DataFrame({"o": d})
     s, f, p = fft_spectrum(df.o, fs=fs)  # FFT
     df["b"] = bandpass_ifft(s, f, low, high).real  # バンドパス
@@ -1021,6 +1051,46 @@ def max_load(
     return h, df.m[h], None
 
 
+def max_load_batch(shot_dfs, spms, channels=None, fs=100000, low=0, high=None, r_window=19, method="fft", pad=False):
+    """複数ショットの最大荷重点
+    ショットごとにextract_features(shot_df, spm, max_load, channels=channels)を呼び出した場合と同じ結果を返す。
+    バンドパス上限周波数(省略時はSPMにより決まる)が同じショットをまとめ、batch_bandpass()で一括してバンドパスする。
+
+    :shot_dfs (list)     ショットデータ(pd.DataFrame)のリスト
+    :spms (list)         ショットごとのSPM
+    :channels (list)     対象チャネル名のリスト
+    :method (str)        バンドパスの方式。"fft" または "sosfiltfilt"
+    :pad (bool)          0埋めで長さを揃えて処理するか否か。Trueの場合、結果はextract_features()と一致しない
+    :return (list)       ショットごとの(indexリスト, 値リスト, デバッグリスト)
+    """
+    chs = LOAD_CHANNELS if channels is None else list(channels)
+    highs = [_max_load_high(80.0 if spm is None else spm, high) for spm in spms]
+    # extract_features()と同じ範囲(ショットの先頭から最終サンプルの手前まで)
+    waveforms = [np.column_stack([df[ch].to_numpy(dtype=np.float64) for ch in chs])[df.index[0] : df.index[-1]] for df in shot_dfs]
+
+    filtered = [None] * len(shot_dfs)
+    for h in sorted(set(highs)):
+        targets = [i for i, x in enumerate(highs) if x == h]
+        for i, b in zip(targets, batch_bandpass([waveforms[i] for i in targets], fs, low, h, method=method, pad=pad)):
+            filtered[i] = b
+
+    if len(filtered) == 0:
+        return []
+
+    # 全ショットを縦に連結して1回で移動平均する。各ショット先頭のr_window-1行は前のショットを含むため除外する
+    m = pd.DataFrame(np.concatenate(filtered)).rolling(r_window).mean().to_numpy()
+    starts = np.cumsum([0] + [len(b) for b in filtered])
+
+    results = []
+    for i, shot_df in enumerate(shot_dfs):
+        shot_m = m[starts[i] : starts[i + 1]].copy()
+        shot_m[: r_window - 1] = np.nan
+        indices, values, debugs = _max_load_peaks(shot_m)
+        results.append(([x + shot_df.index[0] for x in indices], values, debugs))
+
+    return results
+
+
 def extract_features(
     shot_data,
     spm,
@@ -1030,13 +1100,17 @@ def extract_features(
     disp_narrowing=False,
     disp_chart=False,
     xlim=[-100, 100],
+    channels=None,
     **kwargs
 ):
     """特徴抽出ハンドラ関数
     変位をトリガーに切り出した1ショットのデータをpd.DataFrame(shot_data)として受け取り、
     抽出した特徴値を返す。
-    shot_dataは4ch('load01','load02','load03','load04')固定であり、
-    特徴値はindexと値をそれぞれ長さ4のリストとして返す。
+    対象チャネルはchannelsで指定し、省略時は4ch('load01','load02','load03','load04')とする。
+    特徴値はindexと値をそれぞれチャネル数の長さのリストとして返す。
+
+    funcがmulti_channelでデコレートされている場合は、全チャネルを2次元配列にまとめて1回だけ呼び出す。
+    そうでない場合(およびDebug指定時)は、従来通りチャネルごとに1系列ずつ呼び出す。
 
     funcは特徴抽出関数のポインタであり、kwargsはfuncにそのまま渡される。
     kwargsの内容には基本的に感知しないが、例外が二つ。
@@ -1057,6 +1131,7 @@ def extract_features(
                                       4ch共通の範囲を指定したい場合に使用。現在は破断点の場合のみ、narrowing_var_chを指定。
     :disp_narrowing (bool)            sub_funcで指定した関数に渡され、グラフ表示を制御する
     :disp_chart (bool)                グラフ表示; ショットごとの元波形と特徴量を表示。
+    :channels (list)                  対象チャネル名のリスト
     :**kwargs (可変キーワード引数)    funcに指定した関数に対応した引数を指定
     :return (list, list, list)        indexリスト, 値リスト, デバッグリスト
     """
@@ -1095,13 +1170,20 @@ def extract_features(
     argmax = []
     valmax = []
     debugval = []
-    chs = ["load01", "load02", "load03", "load04"]
-    for ch in chs:
-        kwargs["ch"] = ch  # 可変キーワードにch追加
-        i, v, d = func(np.array(shot_data[ch][sub_start:sub_end]), spm, **kwargs)  # ここでnp.arrayになるのでindexがなくなる
-        argmax.append(i + sub_start)  # funcはsubset中の相対indexを返してくるので、offsetを加える
-        valmax.append(v)
-        debugval.append(d)
+    chs = LOAD_CHANNELS if channels is None else list(channels)
+    if getattr(func, "multi_channel", False) and not kwargs.get("Debug", False):
+        # 全チャネルを(サンプル数, チャネル数)の2次元配列にまとめ、チャネル方向に一括で処理する
+        indices, values, debugs = func(shot_data[chs][sub_start:sub_end].to_numpy(dtype=np.float64), spm, **kwargs)
+        argmax = [i + sub_start for i in indices]  # funcはsubset中の相対indexを返してくるので、offsetを加える
+        valmax = list(values)
+        debugval = list(debugs)
+    else:
+        for ch in chs:
+            kwargs["ch"] = ch  # 可変キーワードにch追加
+            i, v, d = func(np.array(shot_data[ch][sub_start:sub_end]), spm, **kwargs)  # ここでnp.arrayになるのでindexがなくなる
+            argmax.append(i + sub_start)  # funcはsubset中の相対indexを返してくるので、offsetを加える
+            valmax.append(v)
+            debugval.append(d)
 
     if disp_chart:
         plt.figure(figsize=(12, 6))
@@ -18,8 +18,12 @@ try:
     output_notebook()
 except NameError:
     pass
+import functools
+
 import matplotlib.pyplot as plt
 import numpy as np
+import scipy.fft
+from scipy import signal
 
 # from envelope import *
 
@@ -96,7 +100,7 @@ def fft_spectrum(
     戻り値はスペクトルとピークのリストであることに注意。
     グラフ描画におけるY軸はスペクトルの絶対値をそのまま表示している。plot_spectrum()とは
     異なっていることに注意。
-    :x (list)            FFT処理の対象になる波形データ
+    :x (list)            FFT処理の対象になる波形データ。2次元配列(サンプル数, チャネル数)の場合はチャネルごとに処理する
     :fs (int)            サンプリング周波数(Hz)
     :num_average (int)   平均化回数
     :overlap (int)       平均化処理時のオーバーラップ。0.0-1.0の範囲で指定。
@@ -152,11 +156,11 @@ def fft_spectrum(
         d = x[start_idx : start_idx + data_len]
         size = data_len
 
-        dt1 = np.fft.fft(d)  # スペクトル配列
+        dt1 = np.fft.fft(d, axis=0)  # スペクトル配列。2次元配列(サンプル数, チャネル数)の場合はチャネルごとに処理
         # dt1 = (dt1[0:int(size/2)] / (size/2)) / np.sqrt(2)    # スペクトル配列の個々の値をデータ長の1/2で割る
         spectrum_array.append(dt1)  # スペクトルをリストに追加
 
-    s = np.vstack(spectrum_array).mean(axis=0)  # スペクトルのリストを連結してarrayを生成、スペクトル値の算術平均を求める。
+    s = np.stack(spectrum_array).mean(axis=0)  # スペクトルのリストを連結してarrayを生成、スペクトル値の算術平均を求める。
     # s = np.abs(dt1)
     # x0 = [0.0]*len(x)
     # x1 = [0.0]*len(x)
@@ -380,7 +384,7 @@ def bandpass_ifft(s, f, low, high):
        この方法では発生しない。減衰性能も優れていると思われる。
        引数のs,fはfft_spectrum()の戻り値を想定しており、
        虚数を含んだものでなければならない。
-    :s (list)          スペクトル (floatのリスト, 虚数を含んだものが必要)
+    :s (list)          スペクトル (floatのリスト, 虚数を含んだものが必要)。2次元配列の場合は列ごとのスペクトル
     :f (list)          周波数配列
     :low               下限周波数
     :high              上限周波数
@@ -389,6 +393,124 @@ def bandpass_ifft(s, f, low, high):
     ss = s.copy()
     ss[np.where(np.abs(f) < low)] = 0
     ss[np.where(np.abs(f) > high)] = 0
-    d_ifft = np.fft.ifft(ss)
+    d_ifft = np.fft.ifft(ss, axis=0)
 
     return d_ifft
+
+
+@functools.lru_cache(maxsize=128)
+def _rfft_band_mask(n, fs, low, high):
+    """長さnのrfftで通過させる周波数ビン。bandpass_ifft()と同じくlow以上high以下を通過させる。
+    データ長ごとにキャッシュする(FFT自体のプランはnumpy側でデータ長ごとにキャッシュされる)。
+    """
+    f = np.fft.rfftfreq(n, 1.0 / fs)
+    mask = (f >= low) & (f <= high)
+    mask.flags.writeable = False
+    return mask
+
+
+def bandpass_rfft(x, fs, low, high, axis=0):
+    """実数の時系列データをrfft/irfftでバンドパスする。
+    bandpass_ifft(*fft_spectrum(x, fs)[:2], low, high).realと同等で、2次元配列の場合はaxis方向に一括処理する。
+    実数入力のため、スペクトルの後半(折り返し)を計算しない分高速。
+    :x (np.array)      時系列データ。2次元配列(サンプル数, チャネル数)も可
+    :fs (int)          サンプリング周波数(Hz)
+    :low               下限周波数
+    :high              上限周波数
+    :axis (int)        時間軸
+    :return  numpy.array   バンドパス後の時系列データ
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = x.shape[axis]
+    shape = [1] * x.ndim
+    shape[axis] = -1
+    s = np.fft.rfft(x, axis=axis)
+    s *= _rfft_band_mask(n, float(fs), low, high).reshape(shape)
+
+    return np.fft.irfft(s, n=n, axis=axis)
+
+
+@functools.lru_cache(maxsize=32)
+def _butter_sos(fs, low, high, order):
+    """Butterworthフィルタの係数(second-order sections)。下限0以下はローパス、上限がナイキスト周波数以上はハイパスとする"""
+    nyquist = fs / 2
+    if low <= 0 and high >= nyquist:
+        return None
+    if low <= 0:
+        return signal.butter(order, high, btype="lowpass", fs=fs, output="sos")
+    if high >= nyquist:
+        return signal.butter(order, low, btype="highpass", fs=fs, output="sos")
+    return signal.butter(order, [low, high], btype="bandpass", fs=fs, output="sos")
+
+
+def bandpass_sosfiltfilt(x, fs, low, high, order=4, axis=0):
+    """Butterworth IIRフィルタを前後両方向に適用(sosfiltfilt)してバンドパスする。
+    bandpass_rfft()と同じく位相ズレは発生しない。FFTと異なり波形の両端が循環しないため、端の影響が小さい。
+    ただし減衰特性はFFTによる矩形の遮断とは異なるため、結果は一致しない。
+    :x (np.array)      時系列データ。2次元配列(サンプル数, チャネル数)も可
+    :fs (int)          サンプリング周波数(Hz)
+    :low               下限周波数
+    :high              上限周波数
+    :order (int)       フィルタ次数
+    :axis (int)        時間軸
+    :return  numpy.array   バンドパス後の時系列データ
+    """
+    x = np.asarray(x, dtype=np.float64)
+    sos = _butter_sos(float(fs), low, high, order)
+    if sos is None:
+        return x.copy()
+
+    return signal.sosfiltfilt(sos, x, axis=axis)
+
+
+def batch_bandpass(waveforms, fs, low, high, method="fft", pad=False, order=4):
+    """複数ショットの波形をまとめてバンドパスする。
+    サンプル数が同じ波形を1つの2次元ブロック(サンプル数, 波形数)にまとめ、時間軸方向に一括でフィルタする。
+    pad=Trueの場合は全波形の末尾を0で埋めて最長のサンプル数(FFTが高速な長さに切り上げ)に揃え、1ブロックで処理する。
+    0埋めにより波形端の循環の影響が変わるため、pad=Trueの結果は波形ごとに処理した結果と一致しない。
+    :waveforms (list)  1次元(サンプル数)または2次元(サンプル数, チャネル数)の配列のリスト
+    :fs (int)          サンプリング周波数(Hz)
+    :low               下限周波数
+    :high              上限周波数
+    :method (str)      "fft"(bandpass_rfft) または "sosfiltfilt"(bandpass_sosfiltfilt)
+    :pad (bool)        0埋めで長さを揃えるか否か
+    :order (int)       sosfiltfiltのフィルタ次数
+    :return  list      バンドパス後の波形のリスト。形状はwaveformsと同じ
+    """
+    if method == "fft":
+        func = functools.partial(bandpass_rfft, fs=fs, low=low, high=high, axis=0)
+    elif method == "sosfiltfilt":
+        func = functools.partial(bandpass_sosfiltfilt, fs=fs, low=low, high=high, order=order, axis=0)
+    else:
+        raise ValueError(f"Unknown method: {method}")
+
+    blocks = [np.asarray(w, dtype=np.float64).reshape(len(w), -1) for w in waveforms]
+    results = [None] * len(blocks)
+    if len(blocks) == 0:
+        return results
+
+    # 同じ長さでまとめる波形のindex
+    groups = {}
+    if pad:
+        n = scipy.fft.next_fast_len(max(len(b) for b in blocks), real=True)
+        groups[n] = list(range(len(blocks)))
+    else:
+        for i, b in enumerate(blocks):
+            groups.setdefault(len(b), []).append(i)
+
+    for n, indices in groups.items():
+        block = np.zeros((n, sum(blocks[i].shape[1] for i in indices)))
+        col = 0
+        for i in indices:
+            block[: len(blocks[i]), col : col + blocks[i].shape[1]] = blocks[i]
+            col += blocks[i].shape[1]
+
+        filtered = func(block)
+
+        col = 0
+        for i in indices:
+            result = filtered[: len(blocks[i]), col : col + blocks[i].shape[1]]
+            results[i] = result.reshape(np.shape(waveforms[i]))
+            col += blocks[i].shape[1]
+
+    return results
@@ -0,0 +1,137 @@
+"""
+ ==================================
+  shared_shot_frame.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from backend.common.common_logger import logger
+from pandas.core.frame import DataFrame
+
+OFFSETS_NAME: str = "__offsets__"
+
+
+class SharedShotFrame:
+    """ショットデータを列ごとにshared_memoryに配置し、プロセス間でコピーせずに共有する。
+    親プロセスでcreate()し、子プロセスには本オブジェクトをそのまま渡す。
+    使用後はclose()するか、with文で使用して共有メモリを解放すること。pickleされるのは共有メモリ名と形状のみで、
+    子プロセスは共有メモリに対するNumPyのビューを参照するため、プロセス数に関わらずデータは1つだけとなる。
+
+    ショット番号ごとの行範囲(offsets)も共有メモリに配置する。
+    数値、日時、文字列の列のみ共有し、それ以外(tagsなどのリスト)は含めない。
+    """
+
+    def __init__(self, columns: Dict[str, Tuple[str, str, Tuple[int, ...]]], owner: bool = False):
+        self.__columns: Dict[str, Tuple[str, str, Tuple[int, ...]]] = columns  # 列名 -> (共有メモリ名, dtype, 形状)
+        self.__owner: bool = owner  # 共有メモリを作成したプロセスか否か
+        self.__shms: Dict[str, shared_memory.SharedMemory] = {}
+        self.__arrays: Optional[Dict[str, np.ndarray]] = None
+        self.__ranges: Optional[Dict[int, Tuple[int, int]]] = None
+
+    @classmethod
+    def create(cls, shots_df: DataFrame) -> "SharedShotFrame":
+        """ショット番号順に並べたデータを共有メモリにコピーする"""
+
+        arrays: Dict[str, np.ndarray] = {}
+
+        if "shot_number" in shots_df.columns and len(shots_df) > 0:
+            shot_numbers: np.ndarray = shots_df.shot_number.to_numpy()
+            order: np.ndarray = np.argsort(shot_numbers, kind="stable")
+            is_sorted: bool = bool(np.all(order == np.arange(len(order))))
+
+            for column in shots_df.columns:
+                values: Optional[np.ndarray] = cls._to_shareable(shots_df[column])
+                if values is None:
+                    logger.debug(f"column: {column} is not shared.")
+                    continue
+                arrays[column] = values if is_sorted else values[order]
+
+            numbers, starts, counts = np.unique(arrays["shot_number"], return_index=True, return_counts=True)
+            arrays[OFFSETS_NAME] = np.stack([numbers, starts, starts + counts], axis=1).astype(np.int64)
+
+        shared: SharedShotFrame = cls({}, owner=True)
+        for name, values in arrays.items():
+            shm: shared_memory.SharedMemory = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[...] = values
+            shared.__shms[name] = shm
+            shared.__columns[name] = (shm.name, values.dtype.str, values.shape)
+
+        return shared
+
+    @staticmethod
+    def _to_shareable(series: pd.Series) -> Optional[np.ndarray]:
+        """共有メモリに配置できる固定長の配列に変換する。変換できない列はNone"""
+
+        values: np.ndarray = series.to_numpy()
+        if values.dtype.kind in "biufmM":
+            return np.ascontiguousarray(values)
+        if pd.api.types.infer_dtype(series, skipna=False) == "string":
+            return np.array(values, dtype=str)
+
+        return None
+
+    def __enter__(self) -> "SharedShotFrame":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        # 共有メモリのハンドルは渡さず、子プロセスで名前から接続する
+        return {"columns": self.__columns}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["columns"])  # type: ignore
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        """共有メモリに対するビュー。初回参照時に接続する"""
+
+        if self.__arrays is None:
+            arrays: Dict[str, np.ndarray] = {}
+            for column, (name, dtype, shape) in self.__columns.items():
+                if column not in self.__shms:
+                    self.__shms[column] = shared_memory.SharedMemory(name=name)
+                arrays[column] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.__shms[column].buf)
+            self.__arrays = arrays
+            # ショットデータがない場合は共有メモリを作成しない
+            offsets: np.ndarray = arrays.get(OFFSETS_NAME, np.empty((0, 3), dtype=np.int64))
+            self.__ranges = {int(n): (int(s), int(e)) for n, s, e in offsets}
+
+        return self.__arrays
+
+    def shot_numbers(self) -> List[int]:
+        """データのあるショット番号(昇順)"""
+
+        self._arrays()
+        return list(self.__ranges.keys())  # type: ignore
+
+    def shot(self, shot_number: int) -> Optional[DataFrame]:
+        """ショットのデータ。ショットのデータがない場合はNone"""
+
+        arrays: Dict[str, np.ndarray] = self._arrays()
+        shot_range: Optional[Tuple[int, int]] = self.__ranges.get(shot_number)  # type: ignore
+        if shot_range is None:
+            return None
+
+        start, end = shot_range
+        return pd.DataFrame({column: values[start:end] for column, values in arrays.items() if column != OFFSETS_NAME})
+
+    def close(self) -> None:
+        """共有メモリから切断する。共有メモリを作成したプロセスでは、共有メモリを解放する"""
+
+        self.__arrays = None
+        self.__ranges = None
+        for shm in self.__shms.values():
+            shm.close()
+            if self.__owner:
+                shm.unlink()
+        self.__shms = {}
@@ -1,5 +1,6 @@
 import json
-from typing import Any, Dict, List, Optional, Union
+import os
+from typing import Any, Dict, Final, List, Optional, Union
 
 from backend.app.api.deps import get_db
 from backend.app.crud.crud_celery_task import CRUDCeleryTask
@@ -84,9 +85,13 @@ def fetch_shots(
     machine_id: str = Query(..., max_length=255, regex=common.ID_PATTERN),
     target_date_str: str = Query(...),  # yyyyMMddHHMMSS文字列
     page: int = Query(...),
+    offset: int = Query(0, ge=0),  # ファイル内の読み込み開始位置
+    stride: Optional[int] = Query(None, ge=1),  # 間引き間隔。未指定の場合は10kHz換算となる間隔
     db: Session = Depends(get_db),
 ):
-    """対象区間の最初のpklファイルを読み込み、ストローク変位値をリサンプリングして返す"""
+    """対象区間の生データを読み込み、間引いたストローク変位値を返す。datファイルがあればメモリマップで必要な行のみ読み込む"""
+
+    PREVIEW_LIMIT: Final[int] = 1000
 
     history: DataCollectHistory = CRUDDataCollectHistory.select_by_machine_id_started_at(db, machine_id, target_date_str)
     cut_out_target_handlers: List[DataCollectHistoryHandler] = CRUDDataCollectHistory.select_cut_out_target_handlers_by_hisotry_id(
@@ -109,23 +114,31 @@ def fetch_shots(
     if page > len(files_info) - 1:
         raise HTTPException(status_code=400, detail="データがありません")
 
-    df: DataFrame = CutOutShotService.fetch_df(files_info[page].file_path)
+    sensors: List[DataCollectHistorySensor] = []
+    for cut_out_target_handler in cut_out_target_handlers:
+        sensors.append(cut_out_target_handler.data_collect_history_sensors)
+    sensors = [x for sensor in sensors for x in sensor]  # flatten
 
-    # リサンプリング
+    # 既定は10kHz換算の間隔で間引く
     sampling_frequency: int = handler.sampling_frequency
-    resampled_df: DataFrame = CutOutShotService.resample_df(df, sampling_frequency)
+    if stride is None:
+        stride = max(1, int(sampling_frequency / 10_000))
 
-    # データ数が1,000件を超える場合は先頭1,000件のみ取得
-    if len(resampled_df) > 1000:
-        resampled_df = resampled_df.head(1000)
+    # 生データファイルに対応するdatファイル
+    dat_files: List[str] = [os.path.splitext(x.file_path)[0] + ".dat" for x in files_info[: page + 1]]
 
-    sensors: List[DataCollectHistorySensor] = []
-    for handler in cut_out_target_handlers:
-        sensors.append(handler.data_collect_history_sensors)
-    sensors = [x for sensor in sensors for x in sensor]  # flatten
+    if all(os.path.exists(f) for f in dat_files):
+        df: DataFrame = CutOutShotService.fetch_dat_df(
+            dat_files, page, sensors, common.datetime_to_epoch_ns(history.started_at), sampling_frequency, offset, stride, PREVIEW_LIMIT
+        )
+    else:
+        # 表示に必要な列のみ読み込む
+        columns: List[str] = ["sequential_number", "timestamp"] + [s.sensor_id for s in sensors]
+        df = CutOutShotService.fetch_df(files_info[page].file_path, columns=columns)
+        df = df.iloc[offset::stride].head(PREVIEW_LIMIT)
 
     # センサー値を物理変換
-    converted_df: DataFrame = CutOutShotService.physical_convert_df(resampled_df, sensors)
+    converted_df: DataFrame = CutOutShotService.physical_convert_df(df, sensors)
     # NOTE: nanはJSON解釈できないので変換しておく
     converted_df = converted_df.fillna("")
 
@@ -55,7 +55,7 @@ def fetch_rawdata_list():
 def fetch_number_of_shots(machine_id: str, target_dir: str):
     index = f"shots-{machine_id}-{target_dir}-data"
     query = {"aggs": {"shot_numbers": {"terms": {"field": "shot_number", "size": 1000}}}}
-    docs = ElasticManager.es.search(index=index, body=query, size=0)
+    docs = ElasticManager.get_client().search(index=index, body=query, size=0)
 
     shots = [d["key"] for d in docs["aggregations"]["shot_numbers"]["buckets"]]
 
@@ -226,7 +226,7 @@ def predict_label(predict: model.Predict):
     data = {}
     for ind in indices:
         query = {"query": {"match": {"shot_number": predict.shot}}}
-        docs = ElasticManager.es.search(index=ind, body=query)
+        docs = ElasticManager.get_client().search(index=ind, body=query)
         feature_name = ind.split("-")[-2]
         data.update({f"{d['_source']['load']}_{feature_name}-point": d["_source"]["value"] for d in docs["hits"]["hits"]})
 
@@ -237,7 +237,7 @@ def predict_label(predict: model.Predict):
     insert_index = f"shots-{predict.machine_id}-{predict.target_dir}-predict"
     body = {"shot_number": predict.shot, "model": predict.model, "version": predict.version, **data, "label": result[0]}
 
-    ElasticManager.es.index(index=insert_index, body=body, refresh=True)  # type: ignore
+    ElasticManager.get_client().index(index=insert_index, body=body, refresh=True)  # type: ignore
 
     return {"data": data, "label": result}
 
@@ -1,11 +1,15 @@
 from datetime import datetime
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.app.models.sensor import Sensor
+from backend.common import common
 from backend.common.common_logger import logger
 from backend.data_converter.data_converter import DataConverter
+from backend.file_manager.dat_file_reader import DatFileReader
+from backend.file_manager.file_manager import FileManager
 from pandas.core.frame import DataFrame
 
 
@@ -21,13 +25,48 @@ class CutOutShotService:
         return target_date_str
 
     @staticmethod
-    def fetch_df(target_file: str) -> DataFrame:
-        """引数で指定したファイル名のpklファイルを読み込みDataFrameで返す"""
+    def fetch_df(target_file: str, columns: Optional[List[str]] = None) -> DataFrame:
+        """引数で指定したファイル名の生データファイルを読み込みDataFrameで返す。columns指定時はその列のみ読み込む"""
 
-        df = pd.read_pickle(target_file)
+        df = FileManager.read_rawdata(target_file, columns=columns)
 
         return df
 
+    @staticmethod
+    def fetch_dat_df(
+        dat_files: List[str],
+        page: int,
+        sensors: List[DataCollectHistorySensor],
+        started_timestamp_ns: int,
+        sampling_frequency: int,
+        offset: int,
+        stride: int,
+        limit: int,
+    ) -> DataFrame:
+        """page番目のdatファイルをメモリマップし、offset行目からstride行ごとに最大limit行を読み込みDataFrameで返す。
+        連番と時刻はそれ以前のファイルのサンプル数から算出する。時刻はデータ記録(decode_binary_file)と同じく整数演算で求める。
+        """
+
+        num_of_channels: int = len(sensors)
+        sensor_ids: List[str] = common.get_sensor_ids_in_channel_order(sensors)
+
+        base_sequential_number: int = DatFileReader.count_preceding_samples(dat_files[: page + 1], num_of_channels)[page]
+        reader: DatFileReader = DatFileReader(dat_files[page], num_of_channels)
+        rows: np.ndarray = common.round_like_builtin(reader.read(offset, limit, stride), common.RAWDATA_ROUND_DIGITS)
+
+        sequential_numbers: np.ndarray = base_sequential_number + offset + np.arange(len(rows), dtype=np.int64) * stride
+
+        columns: Dict[str, np.ndarray] = {
+            "sequential_number": sequential_numbers,
+            "timestamp": common.epoch_ns_to_timestamp(
+                common.sampling_timestamps_ns(started_timestamp_ns, sequential_numbers, sampling_frequency)
+            ),
+        }
+        for i, sensor_id in enumerate(sensor_ids):
+            columns[sensor_id] = rows[:, i]
+
+        return pd.DataFrame(columns)
+
     @staticmethod
     def resample_df(df: DataFrame, sampling_frequency: int, convert_frequency: int = 10_000) -> DataFrame:
         """引数のDataFrameについて、convert_frequency(既定10kHz)の間隔でデータ取得して返却する"""
@@ -46,8 +85,4 @@ class CutOutShotService:
     def physical_convert_df(df: DataFrame, sensors: List[Union[Sensor, DataCollectHistorySensor]]) -> DataFrame:
         """引数のDataFrameを物理変換して返却する"""
 
-        for sensor in sensors:
-            func = DataConverter.get_physical_conversion_formula(sensor)
-            df.loc[:, sensor.sensor_id] = df[sensor.sensor_id].map(func)
-
-        return df
+        return DataConverter.physical_convert_df(df, sensors)
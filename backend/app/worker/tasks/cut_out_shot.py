@@ -1,9 +1,8 @@
 import json
 import os
 import sys
-import time
 import traceback
-from typing import Final, List, Union
+from typing import Final, List, Optional, Union
 
 from backend.app.crud.crud_data_collect_history import CRUDDataCollectHistory
 from backend.app.crud.crud_machine import CRUDMachine
@@ -19,7 +18,10 @@ from backend.cut_out_shot.cut_out_shot import CutOutShot
 from backend.cut_out_shot.pulse_cutter import PulseCutter
 from backend.cut_out_shot.stroke_displacement_cutter import StrokeDisplacementCutter
 from backend.elastic_manager.elastic_manager import ElasticManager
-from backend.file_manager.file_manager import FileManager
+from backend.file_manager.file_manager import RAWDATA_EXTENSIONS, FileManager
+from backend.file_manager.file_watcher import FileWatcher
+from backend.file_manager.rawdata_merger import RawdataMerger
+from backend.file_manager.rawdata_stream import RawdataBlock, RawdataStream
 from celery import current_task
 from sqlalchemy.orm.session import Session
 
@@ -169,62 +171,77 @@ def auto_cut_out_shot_task(machine_id: str, sensor_type: str, debug_mode: bool =
     )
 
     INTERVAL: Final[int] = 5
-    has_been_processed: List[str] = []  # 処理済みファイルパスリスト
-    retry_count: int = 0
-    MAX_RETRY_COUNT: Final[int] = 3
     loop_count: int = 0
 
-    while True:
-        if retry_count >= MAX_RETRY_COUNT:
-            logger.error("Over max retry count. File index numbers may not be equal between handlers.")
-            sys.exit(1)
+    # 環境変数RAWDATA_STREAM_URL設定時は、データ記録からストリームで生データを受け取る。
+    # 未設定の場合は、退避ディレクトリへの生データファイル(pkl/parquet)の書き込み完了を監視する。
+    # 処理済みファイルはFileWatcher/RawdataStreamが集合で管理するため、同じファイルを2度処理することはない。
+    # NOTE: ショットのインデックスはタスク開始時に再作成するため、処理済みファイルは永続化せず、再起動時はすべて処理し直す。
+    source: Union[RawdataStream, FileWatcher]
+    stream: Optional[RawdataStream] = RawdataStream.from_env(history.processed_dir_path, machine_id)
+    if stream is not None:
+        source = stream
+    else:
+        source = FileWatcher(history.processed_dir_path, [f"{machine_id}_*.{extension}" for extension in RAWDATA_EXTENSIONS])
 
-        time.sleep(INTERVAL)
+    # 生データを出力するハンドラーが複数ある場合は、代表ハンドラーのファイルごとに全ハンドラーのデータを時刻で揃えて結合する。
+    # NOTE: 複数ハンドラー構成(is_multi)でプライマリーでないハンドラーは、生データを出力しない。
+    merger: Optional[RawdataMerger] = create_rawdata_merger(cut_out_target_handlers, handler)
 
-        loop_count += 1
+    with source:
+        while True:
+            loop_count += 1
 
-        # 退避ディレクトリに存在するすべてのpklファイルパスリスト
-        try:
-            # logger.info(f"history.processed_dir_path: {history.processed_dir_path}")
-            files: List[str] = FileManager.get_files(dir_path=history.processed_dir_path, pattern=f"{machine_id}_*.pkl")
-        except Exception:
-            logger.error(traceback.format_exc())
-            retry_count += 1
-            continue
+            # ループ毎の処理対象。同名で複数形式のファイルがある場合は優先する形式のみ対象とする。
+            received: List[Union[RawdataBlock, str]]
+            if isinstance(source, RawdataStream):
+                received = source.get_batch(timeout=INTERVAL)
+            else:
+                received = list(FileManager._exclude_duplicated_rawdata_files(source.get_batch(timeout=INTERVAL)))
 
-        retry_count = 0
+            # NOTE: 毎度DBにアクセスするのは非効率なため、対象ファイルが存在しないときのみDBから収集ステータスを確認し、停止判断を行う。
+            is_recorded: bool = len(received) == 0 and get_collect_status(machine_id) == common.COLLECT_STATUS.RECORDED.value
 
-        if len(files) == 0:
-            continue
+            target_files: List[Union[RawdataBlock, str]] = received
+            if merger is not None:
+                # 収集終了時は、他ハンドラーのデータが揃っていない保留中のブロックも切り出す
+                target_files = list(merger.flush() if is_recorded else merger.add(received))
 
-        # ループ毎の処理対象。未処理のもののみ対象とする。
-        target_files: List[str] = [x for x in files if x not in has_been_processed]
+            if len(target_files) > 0:
+                # 切り出し処理
+                logger.info(f"cut_out_shot processing (loop_count: {loop_count}). machine_id: {machine_id}, targets: {len(target_files)}")
+                cut_out_shot.auto_cut_out_shot(target_files, shots_index, shots_meta_index, debug_mode=debug_mode)
+                logger.info(f"cut_out_shot finished (loop_count: {loop_count}). machine_id: {machine_id}, targets: {len(target_files)}")
 
-        # NOTE: 毎度DBにアクセスするのは非効率なため、対象ファイルが存在しないときのみDBから収集ステータスを確認し、停止判断を行う。
-        if len(target_files) == 0:
-            collect_status = get_collect_status(machine_id)
+            source.mark_processed(received)  # type: ignore
 
-            if collect_status == common.COLLECT_STATUS.RECORDED.value:
+            if is_recorded:
                 logger.info(f"auto_cut_out_shot process stopped. machine_id: {machine_id}")
                 break
-            # 記録が完了していなければ継続
-            continue
-
-        # 切り出し処理
-        logger.info(f"cut_out_shot processing (loop_count: {loop_count}). machine_id: {machine_id}, targets: {len(target_files)}")
-        cut_out_shot.auto_cut_out_shot(target_files, shots_index, shots_meta_index, debug_mode=debug_mode)
-        logger.info(f"cut_out_shot finished (loop_count: {loop_count}). machine_id: {machine_id}, targets: {len(target_files)}")
-
-        has_been_processed.extend(target_files)
 
-        if debug_mode:
-            break
+            if debug_mode and len(target_files) > 0:
+                break
 
     db.close()
 
     return f"auto_cut_out_shot task finished. machine_id: {machine_id}"
 
 
+def create_rawdata_merger(
+    handlers: List[DataCollectHistoryHandler], main_handler: DataCollectHistoryHandler
+) -> Optional[RawdataMerger]:
+    """生データを出力するハンドラーが複数ある場合、ハンドラー間でデータを結合するRawdataMergerを生成する"""
+
+    rawdata_handlers: List[DataCollectHistoryHandler] = [h for h in handlers if not h.is_multi or h.is_primary]
+    if len(rawdata_handlers) <= 1:
+        return None
+
+    def handler_key(handler: DataCollectHistoryHandler) -> str:
+        return f"{handler.data_collect_history_gateway.gateway_id}_{handler.handler_id}"
+
+    return RawdataMerger([handler_key(h) for h in rawdata_handlers], handler_key(main_handler))
+
+
 def create_shots_index_set(shots_index: str, shots_meta_index: str) -> None:
     """Elasticsearchインデックスを作成する"""
     ElasticManager.delete_exists_index(index=shots_index)
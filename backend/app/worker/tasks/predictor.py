@@ -1,7 +1,8 @@
 import os
 import re
+import threading
 import time
-from typing import Final, List, Match, Optional, Pattern, Union
+from typing import Any, Dict, Final, List, Match, Optional, Pattern, Tuple, Union
 
 import mlflow  # type: ignore
 import pandas as pd
@@ -16,11 +17,97 @@ from backend.common import common
 from backend.common.common_logger import logger
 from backend.data_reader.data_reader import DataReader
 from backend.elastic_manager.elastic_manager import ElasticManager
-from backend.utils.extract_features_by_shot import eval_dsl, extract_features
+from backend.utils.extract_features_by_shot import extract_features_by_dsls
 from celery import current_task
 from pandas.core.frame import DataFrame
 from pandas.core.series import Series
 
+# まとめてデータ取得、特徴抽出、予測するショット数
+PREDICT_BATCH_SIZE: Final[int] = 10
+# 特徴抽出に必要なフィールド。これに加えて、DSLが設定されたセンサーのチャネルを取得する
+SHOT_FIELDS: Final[List[str]] = ["timestamp", "sequential_number_by_shot"]
+
+
+class ModelCache:
+    """MLFlowから取得したモデルのプロセス単位のキャッシュ。(モデル名, バージョン)をキーとする。
+    同じモデル名で異なるバージョンが要求された場合は、古いバージョンを破棄する。
+    """
+
+    __lock: threading.Lock = threading.Lock()
+    __models: Dict[Tuple[str, str], Any] = {}
+    __metrics: Dict[str, float] = {}
+
+    @classmethod
+    def get(cls, model_name: str, model_version: str) -> Any:
+        """モデルを返す。キャッシュにない場合はMLFlowから取得する"""
+
+        key: Tuple[str, str] = (model_name, str(model_version))
+
+        with cls.__lock:
+            if key in cls.__models:
+                cls._count("hits")
+                return cls.__models[key]
+
+            # モデルのバージョンが変更された場合は、古いバージョンを破棄する
+            for old_key in [k for k in cls.__models if k[0] == model_name]:
+                logger.info(f"[predictor] model version changed. {old_key[0]}: {old_key[1]} -> {key[1]}")
+                del cls.__models[old_key]
+
+            start: float = time.perf_counter()
+            mlflow.set_tracking_uri(os.environ["MLFLOW_SERVER_URI"])
+            model = mlflow.sklearn.load_model(model_uri=f"models:/{model_name}/{model_version}")
+            load_sec: float = time.perf_counter() - start
+
+            cls.__models[key] = model
+            cls._count("loads")
+            cls._count("load_sec", load_sec)
+            cls.__metrics["last_load_sec"] = load_sec
+
+        logger.info(f"[predictor] model loaded. {model_name}: {model_version}, {load_sec:.3f} sec")
+
+        return model
+
+    @classmethod
+    def warm_up(cls, model_name: Optional[str], model_version: Optional[str]) -> None:
+        """タスク開始時にモデルを取得しておき、予測時はモデル取得を待たないようにする"""
+
+        if model_name is None or model_version is None:
+            return
+
+        try:
+            cls.get(model_name, model_version)
+        except Exception:
+            logger.exception(f"[predictor] failed to load model. {model_name}: {model_version}")
+
+    @classmethod
+    def invalidate(cls, model_name: Optional[str] = None) -> None:
+        """キャッシュを破棄する。model_nameを指定した場合は、そのモデルの全バージョンのみを破棄する"""
+
+        with cls.__lock:
+            for key in [k for k in cls.__models if model_name is None or k[0] == model_name]:
+                del cls.__models[key]
+
+    @classmethod
+    def record_inference(cls, inference_sec: float, num_of_shots: int) -> None:
+        """推論時間を記録する"""
+
+        with cls.__lock:
+            cls._count("inferences")
+            cls._count("inference_sec", inference_sec)
+            cls._count("inferred_shots", num_of_shots)
+            cls.__metrics["last_inference_sec"] = inference_sec
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        """モデル取得回数と時間、キャッシュのヒット数、推論回数と時間、推論したショット数"""
+
+        with cls.__lock:
+            return dict(cls.__metrics)
+
+    @classmethod
+    def _count(cls, key: str, value: float = 1) -> None:
+        cls.__metrics[key] = cls.__metrics.get(key, 0) + value
+
 
 @celery_app.task()
 def predictor_task(machine_id: str, debug_mode: bool = False):
@@ -52,6 +139,9 @@ def predictor_task(machine_id: str, debug_mode: bool = False):
 
     meta_index = f"shots-{machine_id}-{target_dir}-meta"
 
+    # 予測前にモデルを取得しておく
+    ModelCache.warm_up(machine.predict_model, machine.model_version)
+
     INTERVAL: Final[int] = 5
     RETRY_THRESHOLD: Final[int] = 3
     retry_count: int = 0
@@ -76,20 +166,15 @@ def predictor_task(machine_id: str, debug_mode: bool = False):
 
         logger.info("[predictor] Fetch shot meta data completed.")
 
-        # 1ショットずつデータを取得し、特徴抽出
-        dr = DataReader()
+        # PREDICT_BATCH_SIZEショットずつまとめてデータ取得、特徴抽出、予測する
         data_index = f"shots-{machine_id}-{target_dir}-data"
-        features_df = pd.DataFrame()
-        for shot_meta in unpredicted_shots_meta:
-            shot_df = dr.read_shot(data_index, shot_meta["shot_number"])
-            features = feature_extract(machine, target_dir, shot_df)
-            features = features.rename(shot_meta["shot_number"])
-            features_df = features_df.append(features)
-            logger.info(f"[predictor] feature extracted by shot_number: {shot_meta['shot_number']}")
-
-        if not features_df.empty:
-            predict(machine, features_df, target_dir, unpredicted_shots_meta, meta_index)
-            logger.info("[predictor] predict by loop finished.")
+        # 記録中にモデルのバージョンが変更された場合に備え、最新の設定を参照する
+        model_name, model_version = get_model_setting(machine_id)
+        for i in range(0, len(unpredicted_shots_meta), PREDICT_BATCH_SIZE):
+            predict_batch(
+                machine, target_dir, data_index, meta_index, unpredicted_shots_meta[i : i + PREDICT_BATCH_SIZE], model_name, model_version
+            )
+        logger.info(f"[predictor] predict by loop finished. {ModelCache.stats()}")
 
     db.close()
     return f"preditor task finished. machine_id: {machine_id}"
@@ -109,70 +194,140 @@ def fetch_unpredicted_shots_meta(meta_index: str) -> List[dict]:
     return metas
 
 
-def feature_extract(machine: Machine, target_dir: str, shot_df: DataFrame) -> Series:
-    """ショットデータから特徴量抽出"""
+def predict_batch(
+    machine: Machine,
+    target_dir: str,
+    data_index: str,
+    meta_index: str,
+    shots_meta: List[dict],
+    model_name: Optional[str] = None,
+    model_version: Optional[str] = None,
+) -> None:
+    """複数ショットのデータをまとめて取得し、特徴抽出、特徴点の登録、予測を行う"""
+
+    dr = DataReader()
+    fields: List[str] = SHOT_FIELDS + feature_channels(machine)
+    shots: Dict[int, DataFrame] = dr.read_shots_by_number(data_index, [meta["shot_number"] for meta in shots_meta], fields=fields)
+
+    features_list: List[Series] = []
+    point_docs: Dict[str, List[dict]] = {}
+    for shot_meta in shots_meta:
+        shot_df: Optional[DataFrame] = shots.get(shot_meta["shot_number"])
+        if shot_df is None:
+            logger.error(f"[predictor] shot data not found. shot_number: {shot_meta['shot_number']}")
+            continue
 
-    # DSLの取得
-    sensors: List[Sensor] = machine.sensors
+        features, shot_point_docs = feature_extract(machine, target_dir, shot_df)
+        features_list.append(features.rename(shot_meta["shot_number"]))
+        for index, docs in shot_point_docs.items():
+            point_docs.setdefault(index, []).extend(docs)
 
-    feature_entry: dict = {}
-    for sensor in sensors:
+        logger.info(f"[predictor] feature extracted by shot_number: {shot_meta['shot_number']}")
+
+    # 特徴点はインデックスごとにまとめて登録する
+    for index, docs in point_docs.items():
+        if not ElasticManager.exists_index(index):
+            ElasticManager.create_index(index)
+        ElasticManager.bulk_insert(docs, index)
+
+    if len(features_list) > 0:
+        predict(machine, pd.DataFrame(features_list), target_dir, shots_meta, meta_index, model_name, model_version)
+
+
+def dsl_targets(machine: Machine) -> List[Tuple[Sensor, str, str]]:
+    """DSLが設定されたセンサーと、特徴名、DSLの組"""
+
+    targets: List[Tuple[Sensor, str, str]] = []
+    for sensor in machine.sensors:
         dsl_names: List[str] = [key for key in vars(sensor).keys() if "_dsl" in key]
-        # DSLの適用
         for dsl_name in dsl_names:
-            feature_name: str = dsl_name.split("_")[0]
-            dsl: str = getattr(sensor, dsl_name)
+            dsl: Optional[str] = getattr(sensor, dsl_name)
             if dsl is None:
                 continue
-            # TODO: extract_featuresが対象をload01-04に固定しているため変更する必要有
-            arg, val, _ = extract_features(shot_df, 80.0, eval_dsl, sub_func=None, dslstr=dsl)
-            sensor_index_dict: dict = {k: i for i, k in enumerate(["load01", "load02", "load03", "load04"])}
-            sensor_index: int = sensor_index_dict[sensor.sensor_name]
-            # ELSに格納
-            els_entry: dict = {
-                "shot_number": shot_df.shot_number[0],
-                "load": sensor.sensor_name,
-                "sequential_number_by_shot": shot_df.sequential_number_by_shot[arg[sensor_index]],
-                "timestamp": shot_df.timestamp[arg[sensor_index]],
-                "value": val[sensor_index],
-                "sequential_number": shot_df.sequential_number[arg[sensor_index]],
-            }
-            ind: str = f"shots-{machine.machine_id}-{target_dir}-{feature_name}-point"
-            if not ElasticManager.exists_index(ind):
-                ElasticManager.create_index(ind)
-            ElasticManager.create_doc(ind, els_entry)
-            # 予測用の特徴量
-            feature_entry[f"{sensor.sensor_name}_{feature_name}-point"] = val[sensor_index]
-
-    return pd.Series(feature_entry)
-    # return pd.DataFrame.from_dict(feature_entry, orient="index").T
-
-
-def predict(machine: Machine, features_df: DataFrame, target_dir: str, shot_metas: List[dict], meta_index: str) -> Optional[List[bool]]:
-    """予測"""
-
-    MLFLOW_SERVER_URI: str = os.environ["MLFLOW_SERVER_URI"]
-    mlflow.set_tracking_uri(MLFLOW_SERVER_URI)
+            targets.append((sensor, dsl_name.split("_")[0], dsl))
+
+    return targets
+
+
+def feature_channels(machine: Machine) -> List[str]:
+    """特徴抽出の対象チャネル。DSLが設定されたセンサーのチャネルを、センサーの順に重複なく返す"""
+
+    return list(dict.fromkeys(sensor.sensor_name for sensor, _, _ in dsl_targets(machine)))
+
+
+def feature_extract(machine: Machine, target_dir: str, shot_df: DataFrame) -> Tuple[Series, Dict[str, List[dict]]]:
+    """ショットデータから特徴量抽出。予測用の特徴量と、インデックスごとの特徴点ドキュメントを返す。
+    全センサーのDSLをまとめて評価し、チャネルごとの微分系列と同じDSLの結果は再利用する。
+    """
+
+    targets: List[Tuple[Sensor, str, str]] = dsl_targets(machine)
+    channels: List[str] = feature_channels(machine)
+
+    # DSLの適用
+    extracted: Dict[str, Tuple[list, list]] = extract_features_by_dsls(
+        shot_df, list(dict.fromkeys(dsl for _, _, dsl in targets)), channels=channels
+    )
+
+    feature_entry: dict = {}
+    point_docs: Dict[str, List[dict]] = {}
+    channel_index: Dict[str, int] = {ch: i for i, ch in enumerate(channels)}
+    for sensor, feature_name, dsl in targets:
+        arg, val = extracted[dsl]
+        sensor_index: int = channel_index[sensor.sensor_name]
+        # ELSに格納
+        els_entry: dict = {
+            "shot_number": shot_df.shot_number[0],
+            "load": sensor.sensor_name,
+            "sequential_number_by_shot": shot_df.sequential_number_by_shot[arg[sensor_index]],
+            "timestamp": shot_df.timestamp[arg[sensor_index]],
+            "value": val[sensor_index],
+            "sequential_number": shot_df.sequential_number[arg[sensor_index]],
+        }
+        ind: str = f"shots-{machine.machine_id}-{target_dir}-{feature_name}-point"
+        point_docs.setdefault(ind, []).append(els_entry)
+        # 予測用の特徴量
+        feature_entry[f"{sensor.sensor_name}_{feature_name}-point"] = val[sensor_index]
+
+    return pd.Series(feature_entry), point_docs
+
+
+def predict(
+    machine: Machine,
+    features_df: DataFrame,
+    target_dir: str,
+    shot_metas: List[dict],
+    meta_index: str,
+    model_name: Optional[str] = None,
+    model_version: Optional[str] = None,
+) -> Optional[List[bool]]:
+    """予測。モデルとバージョンを指定しない場合は、machineの設定を使う"""
+
     # machineテーブルの参照
     # モデルとバージョンの取得
-    model_name: str = machine.predict_model
+    if model_name is None:
+        model_name = machine.predict_model
     if model_name is None:
         logger.error("model_name required.")
-        return
+        return None
 
-    model_version: str = machine.model_version
+    if model_version is None:
+        model_version = machine.model_version
     if model_version is None:
         logger.error("model_version required.")
         return None
 
-    # MLFlowからモデルの取得
-    model = mlflow.sklearn.load_model(model_uri=f"models:/{model_name}/{model_version}")
+    # MLFlowからモデルの取得（プロセス内でキャッシュする）
+    model = ModelCache.get(model_name, model_version)
 
     # 予測の実行
     if not all(map(lambda x: x in features_df.columns, model.feature_names_in_)):
         return None
     features_df = features_df.reindex(columns=model.feature_names_in_)
+    start: float = time.perf_counter()
     results: List[bool] = model.predict(features_df)
+    inference_sec: float = time.perf_counter() - start
+    ModelCache.record_inference(inference_sec, len(features_df))
+    logger.info(f"[predictor] {len(features_df)} shots predicted. {inference_sec:.3f} sec")
 
     els_entries = []
     for [df_index, feature], result in zip(features_df.iterrows(), results):
@@ -187,15 +342,27 @@ def predict(machine: Machine, features_df: DataFrame, target_dir: str, shot_meta
         ElasticManager.create_index(predict_index)
     ElasticManager.bulk_insert(els_entries, predict_index)
 
-    # MetaのPredictedを更新
-    for target_shot in features_df.index:
-        shot_ids = [meta["id"] for meta in shot_metas if meta["shot_number"] == target_shot]
-        if shot_ids:
-            ElasticManager.update_doc(meta_index, shot_ids[0], {"predicted": True})
+    # MetaのPredictedをまとめて更新
+    shot_ids: Dict[int, str] = {meta["shot_number"]: meta["id"] for meta in shot_metas}
+    doc_ids: List[str] = [shot_ids[target_shot] for target_shot in features_df.index if target_shot in shot_ids]
+    ElasticManager.update_docs(meta_index, doc_ids, {"predicted": True})
 
     return results
 
 
+def get_model_setting(machine_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """予測に使うモデルとバージョンを取得する"""
+
+    # NOTE: DBセッションを使いまわすと更新データが得られないため、新しいセッション作成
+    db = SessionLocal()
+    machine: Machine = CRUDMachine.select_by_id(db, machine_id)
+    model_name: Optional[str] = machine.predict_model
+    model_version: Optional[str] = machine.model_version
+    db.close()
+
+    return model_name, model_version
+
+
 def get_collect_status(machine_id) -> str:
     """データ収集ステータスを取得する"""
 
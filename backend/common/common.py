@@ -16,10 +16,14 @@ from datetime import datetime, timedelta
 from enum import Enum
 from typing import Final, List, Optional, Tuple, Union
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
 from backend.app.models.data_collect_history_handler import DataCollectHistoryHandler
 from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.app.models.sensor import Sensor
 from backend.common.common_logger import logger
+from dateutil import tz
 from pytz import timezone
 
 # グローバル定数
@@ -32,6 +36,8 @@ CUT_OUT_SHOT_SENSOR_TYPES: Final[Tuple[str, ...]] = ("stroke_displacement", "pul
 INT_MAX: Final[int] = 2_147_483_647
 CSV_PATTERN: Final[str] = r"\.csv$"
 DATETIME_STR_LENGTH = 14
+RAWDATA_ROUND_DIGITS: Final[int] = 3  # 生データのセンサー値の丸め桁数
+NANOSECONDS_PER_SECOND: Final[int] = 1_000_000_000
 
 
 class Severity(str, Enum):
@@ -119,3 +125,98 @@ def get_main_handler(handlers: List[DataCollectHistoryHandler]) -> DataCollectHi
         handler = [x for x in handlers if x.is_primary][0]
 
     return handler
+
+
+def get_sensor_ids_in_channel_order(sensors: Union[List[Sensor], List[DataCollectHistorySensor]]) -> List[str]:
+    """バイナリファイルのチャネル順（切り出し対象センサーが先頭、以降はそれ以外のセンサー）にセンサーIDを並べる"""
+
+    cut_out_sensor: Optional[Union[Sensor, DataCollectHistorySensor]] = get_cut_out_shot_sensor(sensors)
+    sensor_ids: List[str] = [] if cut_out_sensor is None else [cut_out_sensor.sensor_id]
+    sensor_ids.extend(s.sensor_id for s in sensors if s.sensor_type_id not in CUT_OUT_SHOT_SENSOR_TYPES)
+
+    return sensor_ids
+
+
+def round_like_builtin(values: np.ndarray, digits: int) -> np.ndarray:
+    """組み込みのround()と同じ結果になるようNumPy配列を丸める。
+    np.round()は10**digits倍した値を丸めるため誤差が出うる。端数が0.5近傍の要素のみround()で再計算する。
+    """
+
+    scaled: np.ndarray = values * 10.0 ** digits
+    rounded: np.ndarray = np.round(values, digits)
+
+    with np.errstate(invalid="ignore"):
+        fraction: np.ndarray = np.abs(scaled - np.trunc(scaled))
+        ambiguous: np.ndarray = np.abs(fraction - 0.5) < 1e-6 + np.abs(scaled) * 1e-15
+
+    if ambiguous.any():
+        rounded[ambiguous] = [round(float(v), digits) for v in values[ambiguous]]
+
+    return rounded
+
+
+def fromtimestamp_like_builtin(timestamps: np.ndarray) -> np.ndarray:
+    """datetime.fromtimestamp()と同じ結果（ローカル時刻、マイクロ秒単位に丸め）になるよう、UNIX時間の配列をdatetime64[us]に変換する。
+    fromtimestamp()と同様に、小数部のみをマイクロ秒にして偶数丸めする。
+    """
+
+    fraction, seconds = np.modf(np.asarray(timestamps, dtype=np.float64))
+    epoch_us: np.ndarray = seconds.astype(np.int64) * 1_000_000 + np.round(fraction * 1e6).astype(np.int64)
+
+    local_datetimes: pd.DatetimeIndex = pd.to_datetime(epoch_us, unit="us", utc=True).tz_convert(tz.tzlocal()).tz_localize(None)
+
+    local_timestamps: np.ndarray = local_datetimes.to_numpy(dtype="datetime64[us]")
+
+    return local_timestamps
+
+
+def datetime_to_epoch_ns(dt: datetime) -> int:
+    """datetime.timestamp()と同じ基準(naiveの場合はローカル時刻)のUNIX時間を、整数のナノ秒で誤差なく返す"""
+
+    return int(dt.replace(microsecond=0).timestamp()) * NANOSECONDS_PER_SECOND + dt.microsecond * 1_000
+
+
+def sampling_timestamps_ns(started_timestamp_ns: int, sequential_numbers: np.ndarray, sampling_frequency: int) -> np.ndarray:
+    """連番に対応するサンプルの時刻(UNIX時間のナノ秒、int64)を、開始時刻 + 連番 / サンプリング周波数(ナノ秒未満切り捨て)で求める。
+    サンプルごとに間隔を加算せず連番から直接求めるため、累積誤差がなく、ファイルやプロセスをまたいでも同じ値となる。
+    連番 * 10**9 のint64の桁あふれを避けるため、秒と1秒未満のサンプル数に分けて計算する。
+    """
+
+    seconds, remainder = np.divmod(np.asarray(sequential_numbers, dtype=np.int64), sampling_frequency)
+    timestamps_ns: np.ndarray = np.asarray(
+        started_timestamp_ns + seconds * NANOSECONDS_PER_SECOND + remainder * NANOSECONDS_PER_SECOND // sampling_frequency, dtype=np.int64
+    )
+
+    return timestamps_ns
+
+
+def epoch_ns_to_timestamp(timestamps_ns: np.ndarray) -> np.ndarray:
+    """UNIX時間のナノ秒(int64)の配列を、生データファイルの時刻の形式であるUNIX時間の秒(float64)の配列にする"""
+
+    seconds, nanoseconds = np.divmod(np.asarray(timestamps_ns, dtype=np.int64), NANOSECONDS_PER_SECOND)
+
+    return seconds.astype(np.float64) + nanoseconds / NANOSECONDS_PER_SECOND
+
+
+def timestamp_to_epoch_ns(timestamps: np.ndarray) -> np.ndarray:
+    """UNIX時間の秒(float64、従来のpkl形式のDecimalも可)の配列を、時刻の比較用にUNIX時間のナノ秒(int64)の配列にする。
+    float64のUNIX時間の分解能は約0.2マイクロ秒のため、fromtimestamp_like_builtin()と同じくマイクロ秒単位に丸める。
+    """
+
+    fraction, seconds = np.modf(np.asarray(timestamps, dtype=np.float64))
+
+    return seconds.astype(np.int64) * NANOSECONDS_PER_SECOND + np.round(fraction * 1e6).astype(np.int64) * 1_000
+
+
+def arrow_table_to_df(table: pa.Table) -> pd.DataFrame:
+    """Arrowのテーブルを、ドキュメントのリストからDataFrameを作成した場合と同じ形式のDataFrameに変換する。
+    リスト等の入れ子の列は、numpy配列ではなくPythonのオブジェクトとする。
+    """
+
+    df: pd.DataFrame = table.to_pandas()
+
+    for field in table.schema:
+        if pa.types.is_nested(field.type):
+            df[field.name] = pd.Series(table.column(field.name).to_pylist(), dtype=object)
+
+    return df
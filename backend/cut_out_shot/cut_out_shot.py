@@ -9,13 +9,14 @@
 
 """
 
-import multiprocessing
+import itertools
 import os
 import sys
 import traceback
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from datetime import datetime
-from decimal import Decimal
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -26,8 +27,10 @@ from backend.app.models.data_collect_history_sensor import DataCollectHistorySen
 from backend.common import common
 from backend.common.common_logger import logger
 from backend.data_converter.data_converter import DataConverter
+from backend.elastic_manager.bulk_indexer import BulkIndexer
 from backend.elastic_manager.elastic_manager import ElasticManager
 from backend.file_manager.file_manager import FileManager
+from backend.file_manager.rawdata_stream import RawdataBlock
 from celery import current_task
 from pandas.core.frame import DataFrame
 
@@ -47,16 +50,27 @@ class CutOutShot:
         min_spm: int = 15,
         num_of_process: int = common.NUM_OF_PROCESS,
         chunk_size: int = 5_000,
+        num_of_prefetch: int = 2,
+        queue_size: int = 4,
     ):
         self.__machine_id = machine_id
         self.__rawdata_dir_name = machine_id + "_" + target
         self.__min_spm: int = min_spm
         self.__num_of_process: int = num_of_process
         self.__chunk_size: int = chunk_size
+        self.__num_of_prefetch: int = num_of_prefetch  # 先読みする生データファイル数
+        self.__queue_size: int = queue_size  # Elasticsearch格納待ちの切り出し結果（ファイル単位）の上限
         self.__shots_meta_df: DataFrame = pd.DataFrame(columns=("timestamp", "shot_number", "spm", "num_of_samples_in_cut_out"))
         self.__data_collect_history: DataCollectHistory = data_collect_history
         self.__sensors: List[DataCollectHistorySensor] = sensors
+        # 切り出し対象センサーは切り出し前、それ以外のセンサーは切り出し後に物理変換する
+        self.__cut_out_sensors: List[DataCollectHistorySensor] = [
+            s for s in sensors if s.sensor_type_id in common.CUT_OUT_SHOT_SENSOR_TYPES
+        ]
+        self.__non_cut_out_sensors: List[DataCollectHistorySensor] = [s for s in sensors if s not in self.__cut_out_sensors]
         self.__max_samples_per_shot: int = int(60 / self.__min_spm * sampling_frequency)
+        # 生データファイルから読み込む列
+        self.__rawdata_columns: List[str] = ["sequential_number", "timestamp"] + [s.sensor_id for s in sensors]
         self.cutter: Union[StrokeDisplacementCutter, PulseCutter] = cutter
 
     # テスト用の公開プロパティ
@@ -99,50 +113,60 @@ class CutOutShot:
         return df[(start_sequential_number <= df["sequential_number"]) & (df["sequential_number"] <= end_sequential_number)]
 
     @staticmethod
-    def _exclude_setup_interval(df: DataFrame, collect_start_time: Decimal) -> DataFrame:
-        """収集開始前(段取中)のデータを除外"""
+    def _exclude_setup_interval(df: DataFrame, collect_start_time_ns: int) -> DataFrame:
+        """収集開始前(段取中)のデータを除外。時刻はUNIX時間のナノ秒(int64)で比較する"""
 
-        return df[df["timestamp"] >= collect_start_time]
+        timestamps_ns: np.ndarray = common.timestamp_to_epoch_ns(df["timestamp"].to_numpy())
+
+        return df[timestamps_ns >= collect_start_time_ns]
 
     @staticmethod
-    def _exclude_pause_interval(df: DataFrame, pause_events: List[DataCollectHistoryEvent]) -> DataFrame:
-        """中断区間のデータを除外"""
+    def _exclude_pause_interval(df: DataFrame, pause_intervals_ns: List[Tuple[int, int]]) -> DataFrame:
+        """中断区間(開始、終了時刻のUNIX時間のナノ秒)のデータを除外。全中断区間の判定をまとめて1度だけ抽出する"""
+
+        timestamps_ns: np.ndarray = common.timestamp_to_epoch_ns(df["timestamp"].to_numpy())
+        is_target: np.ndarray = np.ones(len(df), dtype=bool)
+        for start_time_ns, end_time_ns in pause_intervals_ns:
+            is_target &= (timestamps_ns < start_time_ns) | (end_time_ns < timestamps_ns)
+
+        return df[is_target]
 
-        for pause_event in pause_events:
-            start_time: Decimal = Decimal(pause_event.occurred_at.timestamp())
-            end_time: Decimal = Decimal(pause_event.ended_at.timestamp())
-            df = df[(df["timestamp"] < start_time) | (end_time < df["timestamp"])]
+    @staticmethod
+    def _to_pause_intervals_ns(pause_events: List[DataCollectHistoryEvent]) -> List[Tuple[int, int]]:
+        """中断イベントから、中断区間の開始、終了時刻(UNIX時間のナノ秒)のリストを作成する"""
 
-        return df
+        return [(common.datetime_to_epoch_ns(e.occurred_at), common.datetime_to_epoch_ns(e.ended_at)) for e in pause_events]
 
     def _set_to_none_for_low_spm(self) -> DataFrame:
         """切り出したショットの内、最低spmを下回るショットのspmはNoneに設定する"""
 
         self.__shots_meta_df["spm"] = self.__shots_meta_df["spm"].where(self.__shots_meta_df["spm"] >= self.__min_spm, np.nan)
 
-    def _exclude_over_sample(self, df: DataFrame) -> DataFrame:
-        """切り出したショットの内、最大サンプル数を上回るショットを除外したDataFrameを返す"""
+    def _exclude_over_sample(self, cut_out_targets: Dict[str, Any]) -> Dict[str, Any]:
+        """切り出したショットの内、最大サンプル数を上回るショットを除外した列ごとの配列を返す"""
 
         over_sample_df: DataFrame = self.__shots_meta_df[self.__shots_meta_df["num_of_samples_in_cut_out"] > self.__max_samples_per_shot]
 
         if len(over_sample_df) == 0:
-            return df
+            return cut_out_targets
 
         over_sample_shot_numbers: List[float] = list(over_sample_df.shot_number)
 
         logger.debug(f"over_sample_shot detected. shot_numbers: {over_sample_shot_numbers}")
 
-        return df.query("shot_number not in @over_sample_shot_numbers")
+        is_target: np.ndarray = ~np.isin(cut_out_targets["shot_number"], over_sample_shot_numbers)
+
+        return {k: v[is_target] for k, v in cut_out_targets.items()}
+
+    def _apply_physical_conversion_formula(self, df: DataFrame, sensors: Optional[List[DataCollectHistorySensor]] = None) -> DataFrame:
+        """センサー値に対して変換式を適用。sensors未指定の場合は全センサーが対象"""
 
-    def _apply_physical_conversion_formula(self, df: DataFrame) -> DataFrame:
-        """荷重値に対して変換式を適用"""
+        return DataConverter.physical_convert_df(df, self.__sensors if sensors is None else sensors)
 
-        for sensor in self.__sensors:
-            func: Callable[[float], float] = DataConverter.get_physical_conversion_formula(sensor)
-            # NOTE: SettingWithCopyWarning回避のため、locで指定して代入
-            df.loc[:, sensor.sensor_id] = df[sensor.sensor_id].map(func)
+    def _apply_physical_conversion_formula_after_cut_out(self, cut_out_targets: Dict[str, Any]) -> Dict[str, Any]:
+        """切り出し後のデータに対して、切り出し対象センサー以外のセンサー値に変換式を適用"""
 
-        return df
+        return DataConverter.physical_convert_columns(cut_out_targets, self.__non_cut_out_sensors)
 
     def _create_shots_meta_df(self, shots_summary: List[Dict[str, Any]]) -> None:
         """ショットのサマリ情報からショットメタデータDataFrameを作成する"""
@@ -169,16 +193,6 @@ class CutOutShot:
 
         ElasticManager.bulk_insert(shots_meta_data, shots_meta_index)
 
-    @staticmethod
-    def __join_process(procs: List[multiprocessing.context.Process]) -> List:
-        """マルチプロセスの処理待ち"""
-
-        if len(procs) > 0:
-            for p in procs:
-                p.join()
-
-        return []
-
     @staticmethod
     def _set_start_sequential_number(start_sequential_number: Optional[int], rawdata_count: int) -> int:
         """パラメータ start_sequential_number の設定"""
@@ -227,6 +241,133 @@ class CutOutShot:
 
         return end_sequential_number
 
+    def _read_rawdata_file(
+        self,
+        rawdata_file: str,
+        target_interval: Optional[Tuple[int, int]],
+        collect_start_time_ns: int,
+        pause_intervals_ns: List[Tuple[int, int]],
+    ) -> DataFrame:
+        """生データファイルを読み込み、対象外区間の除外と切り出し対象センサーの物理変換を行う。
+        ファイル間で状態を持たないため、複数ファイルを並列に処理できる。全データが除外された場合は空のDataFrameを返す。
+        """
+
+        rawdata_df: DataFrame = FileManager.read_rawdata(rawdata_file, columns=self.__rawdata_columns)
+
+        # パラメータで指定された対象範囲に含まれないデータを除外
+        if target_interval is not None:
+            rawdata_df = self._exclude_non_target_interval(rawdata_df, *target_interval)
+
+        if len(rawdata_df) == 0:
+            logger.info(f"All data was excluded by non-target interval. {rawdata_file}")
+            return rawdata_df
+
+        # 段取区間の除外
+        rawdata_df = self._exclude_setup_interval(rawdata_df, collect_start_time_ns)
+
+        if len(rawdata_df) == 0:
+            logger.info(f"All data was excluded by setup interval. {rawdata_file}")
+            return rawdata_df
+
+        # 中断区間の除外
+        if len(pause_intervals_ns) > 0:
+            rawdata_df = self._exclude_pause_interval(rawdata_df, pause_intervals_ns)
+
+        if len(rawdata_df) == 0:
+            logger.info(f"All data was excluded by pause interval. {rawdata_file}")
+            return rawdata_df
+
+        # 変換式適用。切り出し判定に使う切り出し対象センサーのみ変換し、それ以外は切り出し後に変換する。
+        return self._apply_physical_conversion_formula(rawdata_df, self.__cut_out_sensors)
+
+    @staticmethod
+    def _prefetch(
+        executor: Executor, func: Callable[[str], DataFrame], rawdata_files: List[str], num_of_prefetch: int
+    ) -> Iterator[Tuple[str, DataFrame]]:
+        """num_of_prefetch件先のファイルまで先行してexecutorで処理し、結果をファイル順に返す"""
+
+        futures: Deque[Tuple[str, Future]] = deque()
+        files: Iterator[str] = iter(rawdata_files)
+
+        for rawdata_file in itertools.islice(files, max(1, num_of_prefetch)):
+            futures.append((rawdata_file, executor.submit(func, rawdata_file)))
+
+        while len(futures) > 0:
+            rawdata_file, future = futures.popleft()
+
+            next_file: Optional[str] = next(files, None)
+            if next_file is not None:
+                futures.append((next_file, executor.submit(func, next_file)))
+
+            yield rawdata_file, future.result()
+
+    def _cut_out_rawdata_files(
+        self,
+        rawdata_files: List[str],
+        shots_index: str,
+        read_rawdata_file: Callable[[str], DataFrame],
+        is_called_by_task: bool = False,
+    ) -> None:
+        """生データファイルを順に切り出し、shotsインデックスに格納する。
+        * 読み込みと前処理はスレッドプールで先読みする
+        * 切り出しはファイル間で状態を引き継ぐため、ファイル順に1スレッドで行う
+        * Elasticsearchへの格納は上限付きキューを介して別スレッドで行い、次ファイルの切り出しと並行させる
+        * 格納に失敗したドキュメントがある場合はBulkInsertErrorを送出し、ショットメタデータは出力しない
+        NOTE: celeryのワーカー(daemonic process)は子プロセスを生成できないため、並列化はすべてスレッドで行う。
+        """
+
+        with ThreadPoolExecutor(max_workers=max(1, self.__num_of_prefetch)) as executor, BulkIndexer(
+            shots_index,
+            num_of_threads=self.__num_of_process,
+            queue_size=self.__queue_size,
+            chunk_size=self.__chunk_size,
+            raise_on_error=True,
+        ) as indexer:
+            rawdata_dfs: Iterator[Tuple[str, DataFrame]] = self._prefetch(
+                executor, read_rawdata_file, rawdata_files, self.__num_of_prefetch
+            )
+
+            for processed_count, (rawdata_file, rawdata_df) in enumerate(rawdata_dfs):
+                if len(rawdata_df) == 0:
+                    continue
+
+                # ショット切り出し。切り出し結果は列ごとの配列で受け取り、Elasticsearchへの格納まで列のまま扱う。
+                cut_out_targets: Dict[str, Any] = self.cutter.cut_out_shot(rawdata_df)
+                # cutter.cut_out_targetは以降使わないためクリア
+                self.cutter.cut_out_targets = {}
+
+                # 進捗率を計算して記録
+                if is_called_by_task:
+                    progress = round(processed_count / len(rawdata_files) * 100.0, 1)
+                    current_task.update_state(
+                        state="PROGRESS",
+                        meta={"message": f"cut_out_shot processing. machine_id: {self.__machine_id}", "progress": progress},
+                    )
+
+                # ショットがなければ以降の処理はスキップ
+                if len(cut_out_targets["timestamp"]) == 0:
+                    logger.info(f"Shot is not detected in {rawdata_file}")
+                    continue
+
+                # 最大サンプル数を超えたショットの削除
+                cut_out_targets = self._exclude_over_sample(cut_out_targets)
+
+                if len(cut_out_targets["timestamp"]) == 0:
+                    logger.info(f"Shot is not detected in {rawdata_file} by over_sample_filter.")
+                    continue
+
+                # 切り出し対象センサー以外の変換式適用
+                cut_out_targets = self._apply_physical_conversion_formula_after_cut_out(cut_out_targets)
+
+                # timestampをdatetimeに変換する
+                cut_out_targets["timestamp"] = common.fromtimestamp_like_builtin(cut_out_targets["timestamp"])
+
+                # indexフィールドにmachine_id追加
+                cut_out_targets["machine_id"] = self.__machine_id
+
+                # Elasticsearchに出力。キューが満杯の場合は格納が進むまで待機する
+                indexer.put(cut_out_targets)
+
     def cut_out_shot(
         self,
         start_sequential_number: Optional[int] = None,
@@ -290,109 +431,29 @@ class CutOutShot:
         start_event: DataCollectHistoryEvent = [e for e in events if e.event_name == common.COLLECT_STATUS.START.value][0]
 
         # NOTE: DBから取得した時刻はUTCなので、timezone指定なくtimestampに変換可能
-        collect_start_time: Decimal = Decimal(start_event.occurred_at.timestamp())
+        collect_start_time_ns: int = common.datetime_to_epoch_ns(start_event.occurred_at)
 
         pause_events: List[DataCollectHistoryEvent] = [e for e in events if e.event_name == common.COLLECT_STATUS.PAUSE.value]
-
-        procs: List[multiprocessing.context.Process] = []
-
-        pickle_files: List[str] = FileManager.get_files(dir_path=rawdata_dir_path, pattern=f"{self.__machine_id}_*.pkl")
-
-        # main loop
-        for processed_count, pickle_file in enumerate(pickle_files):
-            rawdata_df: DataFrame = pd.read_pickle(pickle_file)
-
-            # パラメータで指定された対象範囲に含まれないデータを除外
-            if has_target_interval:
-                if start_sequential_number is None:
-                    logger.error("start_sequential_number should not be None.")
-                    sys.exit(1)
-                if end_sequential_number is None:
-                    logger.error("end_sequential_number should not be None.")
-                    sys.exit(1)
-                rawdata_df = self._exclude_non_target_interval(rawdata_df, start_sequential_number, end_sequential_number)
-
-            if len(rawdata_df) == 0:
-                logger.info(f"All data was excluded by non-target interval. {pickle_file}")
-                continue
-
-            # 段取区間の除外
-            rawdata_df = self._exclude_setup_interval(rawdata_df, collect_start_time)
-
-            if len(rawdata_df) == 0:
-                logger.info(f"All data was excluded by setup interval. {pickle_file}")
-                continue
-
-            # 中断区間の除外
-            if len(pause_events) > 0:
-                rawdata_df = self._exclude_pause_interval(rawdata_df, pause_events)
-
-            if len(rawdata_df) == 0:
-                logger.info(f"All data was excluded by pause interval. {pickle_file}")
-                continue
-
-            # NOTE: 変換式適用.パフォーマンス的にはストローク変位値のみ変換し、切り出し後に荷重値を変換したほうがよい。
-            # コードのシンプルさを優先し、全列まとめて物理変換している。
-            rawdata_df = self._apply_physical_conversion_formula(rawdata_df)
-
-            # ショット切り出し
-            self.cutter.cut_out_shot(rawdata_df)
-
-            # 進捗率を計算して記録
-            if is_called_by_task:
-                progress = round(processed_count / len(pickle_files) * 100.0, 1)
-                current_task.update_state(
-                    state="PROGRESS",
-                    meta={"message": f"cut_out_shot processing. machine_id: {self.__machine_id}", "progress": progress},
-                )
-
-            # ショットがなければ以降の処理はスキップ
-            if len(self.cutter.cut_out_targets) == 0:
-                logger.info(f"Shot is not detected in {pickle_file}")
-                continue
-
-            # NOTE: 以下処理のため一時的にDataFrameに変換している。
-            cut_out_df: DataFrame = pd.DataFrame(self.cutter.cut_out_targets)
-            # cutter.cut_out_targetは以降使わないためクリア
-            self.cutter.cut_out_targets = []
-
-            # 最大サンプル数を超えたショットの削除
-            cut_out_df = self._exclude_over_sample(cut_out_df)
-
-            if len(cut_out_df) == 0:
-                logger.info(f"Shot is not detected in {pickle_file } by over_sample_filter.")
-                continue
-
-            # timestampをdatetimeに変換する
-            cut_out_df["timestamp"] = cut_out_df["timestamp"].astype(float).map(lambda x: datetime.fromtimestamp(x))
-
-            # indexフィールドにmachine_id追加
-            cut_out_df["machine_id"] = self.__machine_id
-
-            # Elasticsearchに格納するため、dictに戻す
-            cut_out_targets = cut_out_df.to_dict(orient="records")
-
-            # NOTE: celeryからmultiprocess実行すると以下エラーになるため、シングルプロセス実行
-            # daemonic processes are not allowed to have children
-            if is_called_by_task:
-                ElasticManager.bulk_insert(cut_out_targets, shots_index)
-            else:
-                # 子プロセスのjoin
-                procs = self.__join_process(procs)
-
-                # Elasticsearchに出力
-                procs = ElasticManager.multi_process_bulk_lazy_join(
-                    data=cut_out_targets,
-                    index_to_import=shots_index,
-                    num_of_process=self.__num_of_process,
-                    chunk_size=self.__chunk_size,
-                )
-
-            cut_out_targets = []
-
-        if not is_called_by_task:
-            # 全ファイル走査後、子プロセスが残っていればjoin
-            procs = self.__join_process(procs)
+        pause_intervals_ns: List[Tuple[int, int]] = self._to_pause_intervals_ns(pause_events)
+
+        rawdata_files: List[str] = FileManager.get_rawdata_files(rawdata_dir_path, self.__machine_id)
+
+        target_interval: Optional[Tuple[int, int]] = None
+        if has_target_interval:
+            if start_sequential_number is None:
+                logger.error("start_sequential_number should not be None.")
+                sys.exit(1)
+            if end_sequential_number is None:
+                logger.error("end_sequential_number should not be None.")
+                sys.exit(1)
+            target_interval = (start_sequential_number, end_sequential_number)
+
+        self._cut_out_rawdata_files(
+            rawdata_files,
+            shots_index,
+            lambda rawdata_file: self._read_rawdata_file(rawdata_file, target_interval, collect_start_time_ns, pause_intervals_ns),
+            is_called_by_task,
+        )
 
         if len(self.cutter.shots_summary) == 0:
             logger.info("Shot is not detected.")
@@ -409,9 +470,17 @@ class CutOutShot:
 
         logger.info("Cut out shot finished.")
 
+    def _read_auto_rawdata(self, rawdata: Union[str, RawdataBlock]) -> Tuple[str, DataFrame]:
+        """生データファイルまたはストリームで受け取ったブロックから、切り出しに使う列を取得する"""
+
+        if isinstance(rawdata, RawdataBlock):
+            return rawdata.file_name, rawdata.df[[c for c in self.__rawdata_columns if c in rawdata.df.columns]]
+
+        return rawdata, FileManager.read_rawdata(rawdata, columns=self.__rawdata_columns)
+
     def auto_cut_out_shot(
         self,
-        pickle_files: List[str],
+        rawdata_files: Sequence[Union[str, RawdataBlock]],
         shots_index: str,
         shots_meta_index: str,
         debug_mode: bool = False,
@@ -419,58 +488,51 @@ class CutOutShot:
         """
         自動ショット切り出し（celeryタスク実行）
         自動の場合は以下が異なる。
-        * 切り出し対象のファイルリストは呼び出し元から取得する
+        * 切り出し対象のファイルリスト（またはストリームで受け取った生データ）は呼び出し元から取得する
         * Elasticsearchインデックスは呼び出し元で作成する
         """
 
-        logger.info(f"Cut out shot start. number of pickle_files: {len(pickle_files)}")
+        logger.info(f"Cut out shot start. number of rawdata_files: {len(rawdata_files)}")
 
         # main loop
-        for processed_count, pickle_file in enumerate(pickle_files):
-            rawdata_df: DataFrame = pd.read_pickle(pickle_file)
+        for processed_count, rawdata in enumerate(rawdata_files):
+            rawdata_file, rawdata_df = self._read_auto_rawdata(rawdata)
 
             if len(rawdata_df) == 0:
-                logger.info(f"All data was excluded by non-target interval. {pickle_file}")
+                logger.info(f"All data was excluded by non-target interval. {rawdata_file}")
                 continue
 
-            # NOTE: 変換式適用.パフォーマンス的にはストローク変位値のみ変換し、切り出し後に荷重値を変換したほうがよい。
-            # コードのシンプルさを優先し、全列まとめて物理変換している。
-            rawdata_df = self._apply_physical_conversion_formula(rawdata_df)
+            # 変換式適用。切り出し判定に使う切り出し対象センサーのみ変換し、それ以外は切り出し後に変換する。
+            rawdata_df = self._apply_physical_conversion_formula(rawdata_df, self.__cut_out_sensors)
 
-            # ショット切り出し
-            self.cutter.cut_out_shot(rawdata_df)
+            # ショット切り出し。切り出し結果は列ごとの配列で受け取り、Elasticsearchへの格納まで列のまま扱う。
+            cut_out_targets: Dict[str, Any] = self.cutter.cut_out_shot(rawdata_df)
+            # cutter.cut_out_targetは以降使わないためクリア
+            self.cutter.cut_out_targets = {}
 
             # ショットがなければ以降の処理はスキップ
-            if len(self.cutter.cut_out_targets) == 0:
-                logger.info(f"Shot is not detected in {pickle_file}")
+            if len(cut_out_targets["timestamp"]) == 0:
+                logger.info(f"Shot is not detected in {rawdata_file}")
                 continue
 
-            # NOTE: 以下処理のため一時的にDataFrameに変換している。
-            cut_out_df: DataFrame = pd.DataFrame(self.cutter.cut_out_targets)
-            # cutter.cut_out_targetは以降使わないためクリア
-            self.cutter.cut_out_targets = []
-
-            if len(cut_out_df) == 0:
-                logger.info(f"Shot is not detected in {pickle_file} by over_sample_filter.")
-                continue
+            # 切り出し対象センサー以外の変換式適用
+            cut_out_targets = self._apply_physical_conversion_formula_after_cut_out(cut_out_targets)
 
             # timestampをdatetimeに変換する
-            cut_out_df["timestamp"] = cut_out_df["timestamp"].astype(float).map(lambda x: datetime.fromtimestamp(x))
+            cut_out_targets["timestamp"] = common.fromtimestamp_like_builtin(cut_out_targets["timestamp"])
 
             # indexフィールドにmachine_id追加
-            cut_out_df["machine_id"] = self.__machine_id
-
-            # Elasticsearchに格納するため、dictに戻す
-            cut_out_targets = cut_out_df.to_dict(orient="records")
+            cut_out_targets["machine_id"] = self.__machine_id
 
             # NOTE: celeryからmultiprocess実行すると以下エラーになるため、シングルプロセス実行
             # daemonic processes are not allowed to have children
-            ElasticManager.bulk_insert(cut_out_targets, shots_index)
+            # 格納に失敗したドキュメントがある場合はBulkInsertErrorを送出し、タスクを失敗させる
+            ElasticManager.bulk_insert_columns(cut_out_targets, shots_index, raise_on_error=True)
 
-            cut_out_targets = []
+            cut_out_targets = {}
 
             # 進捗率を計算して記録
-            progress = round(processed_count / len(pickle_files) * 100.0, 1)
+            progress = round(processed_count / len(rawdata_files) * 100.0, 1)
             if not debug_mode:
                 current_task.update_state(
                     state="PROGRESS",
@@ -1,5 +1,6 @@
-from typing import List
+from typing import Dict, List
 
+import numpy as np
 from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.common.common_logger import logger
 from pandas.core.frame import DataFrame
@@ -13,64 +14,104 @@ class PulseCutter:
         self.__sequential_number_by_shot: int = 0
         self.__is_shot_section: bool = False  # ショット内か否かを判別する
         self.__sensors: List[DataCollectHistorySensor] = sensors
-        self.cut_out_targets: List[dict] = []
+        self.cut_out_targets: Dict[str, np.ndarray] = {}
         self.shots_summary: List[dict] = []
 
-    def _detect_pulse_shot_start(self, pulse: float) -> bool:
-        """ショット開始検知。ショットが未検出かつパルスがしきい値以上の場合、ショット開始とみなす。"""
-
-        return (not self.__is_shot_section) and (pulse >= self.__threshold)
+    def _detect_shot_section(self, pulse: np.ndarray) -> np.ndarray:
+        """ショット区間検知。パルスがしきい値以上のサンプルをショット区間とみなす。
+        パルスが欠損(NaN)のサンプルではショット区間の開始も終了もせず、直前のサンプル（ファイル先頭では前ファイル末尾）の状態を引き継ぐ。
+        """
 
-    def _detect_pulse_shot_end(self, pulse: float) -> bool:
-        """ショット終了検知。ショットが検出されている状態かつパルスがしきい値を下回ったとき、ショット終了とみなす。"""
+        is_shot_section: np.ndarray = pulse >= self.__threshold
+        is_valid: np.ndarray = ~np.isnan(pulse)
+        if is_valid.all():
+            return is_shot_section
 
-        return self.__is_shot_section and (pulse < self.__threshold)
+        # 欠損サンプルは直前の欠損でないサンプルの位置に置き換える。先頭から欠損が続く場合は-1
+        last_valid_positions: np.ndarray = np.maximum.accumulate(np.where(is_valid, np.arange(len(pulse)), -1))
+        return np.where(last_valid_positions >= 0, is_shot_section[last_valid_positions], self.__is_shot_section)
 
-    def _add_cut_out_target(self, rawdata) -> None:
-        """切り出し対象としてデータを追加
-        TODO: 共通化
+    def _detect_pulse_edges(self, is_shot_section: np.ndarray) -> np.ndarray:
+        """ショット区間の変化点。1: ショット開始, -1: ショット終了, 0: 変化なし。
+        ファイル先頭は前ファイル末尾のショット区間状態との比較となる。
         """
 
-        cut_out_target: dict = {
-            "timestamp": rawdata.timestamp,
-            "sequential_number": self.__sequential_number,
-            "sequential_number_by_shot": self.__sequential_number_by_shot,
-            "rawdata_sequential_number": int(rawdata.sequential_number),
-            "shot_number": self.__shot_number,
-            "tags": [],
-        }
-
-        for sensor in self.__sensors:
-            cut_out_target[sensor.sensor_id] = getattr(rawdata, sensor.sensor_id)
+        return np.diff(is_shot_section.astype(np.int8), prepend=np.int8(self.__is_shot_section))
 
-        self.cut_out_targets.append(cut_out_target)
-
-    def cut_out_shot(self, rawdata_df: DataFrame) -> None:
+    def cut_out_shot(self, rawdata_df: DataFrame) -> Dict[str, np.ndarray]:
         """パルス信号によるショット切り出し
-        パルス値がしきい値を超えたタイミングでショット区間開始
-        以降、ループごとにパルス値を確認し、しきい値を下回っていたらショット区間終了
+        パルス値がしきい値以上となったタイミングでショット区間開始、しきい値を下回ったタイミングでショット区間終了。
+        ショット区間のデータのみを列ごとの配列にして返す。ショット区間の状態はファイルを跨いで引き継ぐ。
         """
 
-        for rawdata in rawdata_df.itertuples():
-            # pulseがしきい値以上のとき、ショットとして記録開始
-            if self._detect_pulse_shot_start(rawdata.pulse):
-                self.__is_shot_section = True  # ショット開始
-                self.__shot_number += 1
-                self.__sequential_number_by_shot = 0
-
-                self.shots_summary.append({"shot_number": self.__shot_number, "timestamp": rawdata.timestamp})
-
-            # ショット区間終了検知
-            if self._detect_pulse_shot_end(rawdata.pulse):
-                logger.info(f"{self.__sequential_number_by_shot} samples cutted out in shot_number: {self.__shot_number}")
-                self.shots_summary[self.__shot_number - 1]["num_of_samples_in_cut_out"] = self.__sequential_number_by_shot
-                self.__is_shot_section = False
-
-            # ショット未開始ならば後続は何もしない
-            if not self.__is_shot_section:
-                continue
-
-            # ここに到達するのはショット区間かつ切り出し区間
-            self._add_cut_out_target(rawdata)
-            self.__sequential_number += 1
-            self.__sequential_number_by_shot += 1
+        pulse: np.ndarray = rawdata_df["pulse"].to_numpy(dtype=np.float64)
+        num_of_samples: int = len(pulse)
+
+        is_shot_section: np.ndarray = self._detect_shot_section(pulse)
+        edges: np.ndarray = self._detect_pulse_edges(is_shot_section)
+        shot_starts: np.ndarray = np.flatnonzero(edges == 1)
+        shot_ends: np.ndarray = np.flatnonzero(edges == -1)
+
+        # ショット区間の開始位置と終了位置。開始と終了は交互に現れる。
+        # 前ファイルから続くショット区間はファイル先頭から開始したものとみなす（先頭で終了する場合は0サンプル）
+        is_carried_over: bool = self.__is_shot_section and num_of_samples > 0
+        section_starts: np.ndarray = np.concatenate(([0], shot_starts)).astype(np.int64) if is_carried_over else shot_starts
+        section_ends: np.ndarray = np.append(shot_ends, num_of_samples)[: len(section_starts)]
+
+        # 前ファイルから続くショット区間は、ショット番号とショット内連番を引き継ぐ
+        offsets: np.ndarray = np.zeros(len(section_starts), dtype=np.int64)
+        shot_numbers: np.ndarray = self.__shot_number + np.arange(1, len(section_starts) + 1, dtype=np.int64)
+        if is_carried_over:
+            offsets[0] = self.__sequential_number_by_shot
+            shot_numbers -= 1
+
+        # ショット区間ごとのサンプル数
+        lengths: np.ndarray = section_ends - section_starts
+        num_of_targets: int = int(lengths.sum())
+
+        # 切り出し対象サンプルの位置、ショット内連番、ショット番号
+        section_index: np.ndarray = np.repeat(np.arange(len(section_starts)), lengths)
+        positions: np.ndarray = np.flatnonzero(is_shot_section)
+        position_in_section: np.ndarray = positions - section_starts[section_index]
+
+        timestamps: np.ndarray = rawdata_df["timestamp"].to_numpy()
+        rawdata_sequential_numbers: np.ndarray = rawdata_df["sequential_number"].to_numpy()
+
+        tags: np.ndarray = np.empty(num_of_targets, dtype=object)
+        tags[:] = [[] for _ in range(num_of_targets)]
+
+        cut_out_targets: Dict[str, np.ndarray] = {
+            "timestamp": timestamps[positions],
+            "sequential_number": self.__sequential_number + np.arange(num_of_targets, dtype=np.int64),
+            "sequential_number_by_shot": offsets[section_index] + position_in_section,
+            "rawdata_sequential_number": rawdata_sequential_numbers[positions].astype(np.int64),
+            "shot_number": shot_numbers[section_index],
+            "tags": tags,
+        }
+
+        for sensor in self.__sensors:
+            cut_out_targets[sensor.sensor_id] = rawdata_df[sensor.sensor_id].to_numpy()[positions]
+
+        # ショットのサマリ情報
+        self.shots_summary.extend(
+            {"shot_number": self.__shot_number + i + 1, "timestamp": timestamp}
+            for i, timestamp in enumerate(timestamps[shot_starts].tolist())
+        )
+
+        # ファイル内でショット区間が終了したショットのサンプル数
+        for i in np.flatnonzero(section_ends < num_of_samples):
+            num_of_samples_in_cut_out: int = int(offsets[i] + lengths[i])
+            logger.info(f"{num_of_samples_in_cut_out} samples cutted out in shot_number: {shot_numbers[i]}")
+            self.shots_summary[shot_numbers[i] - 1]["num_of_samples_in_cut_out"] = num_of_samples_in_cut_out
+
+        # 次ファイルに引き継ぐ状態
+        if num_of_samples > 0:
+            self.__is_shot_section = bool(is_shot_section[-1])
+        if len(section_starts):
+            self.__sequential_number_by_shot = int(offsets[-1] + lengths[-1])
+        self.__shot_number += len(shot_starts)
+        self.__sequential_number += num_of_targets
+
+        self.cut_out_targets = cut_out_targets
+
+        return cut_out_targets
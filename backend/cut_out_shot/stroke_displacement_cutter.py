@@ -1,5 +1,6 @@
-from typing import List
+from typing import Dict, List
 
+import numpy as np
 from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.common.common_logger import logger
 from pandas.core.frame import DataFrame
@@ -22,77 +23,157 @@ class StrokeDisplacementCutter:
         self.__is_shot_section: bool = False  # ショット内か否かを判別する
         self.__is_target_of_cut_out: bool = False  # ショットの内、切り出し対象かを判別する
         self.__sensors: List[DataCollectHistorySensor] = sensors
-        self.cut_out_targets: List[dict] = []
+        self.cut_out_targets: Dict[str, np.ndarray] = {}
         self.shots_summary: List[dict] = []
 
-    def _detect_shot_start(self, stroke_displacement: float) -> bool:
-        """ショット開始検知。ショットが未検出かつストローク変位値が終了しきい値以上開始しきい値以下の場合、ショット開始とみなす。"""
+    def _detect_shot_start(self, stroke_displacement: np.ndarray) -> np.ndarray:
+        """ショット開始候補。ストローク変位値が終了しきい値以上開始しきい値以下のサンプル。
+        ショットが未検出の状態でこの条件を満たした場合、ショット開始とみなす。
+        """
 
-        return (not self.__is_shot_section) and (self.__end_stroke_displacement <= stroke_displacement <= self.__start_stroke_displacement)
+        return (self.__end_stroke_displacement <= stroke_displacement) & (stroke_displacement <= self.__start_stroke_displacement)
 
-    def _detect_shot_end(self, stroke_displacement: float) -> bool:
-        """ショット終了検知。ショットが検出されている状態かつストローク変位値が開始しきい値+マージンより大きい場合、ショット終了とみなす。
+    def _detect_shot_end(self, stroke_displacement: np.ndarray) -> np.ndarray:
+        """ショット終了候補。ストローク変位値が開始しきい値+マージンより大きいサンプル。
+        ショットが検出されている状態でこの条件を満たした場合、ショット終了とみなす。
 
         margin: ノイズの影響等でストローク変位値が単調減少しなかった場合、ショット区間がすぐに終わってしまうことを防ぐためのマージン
         """
 
-        return self.__is_shot_section and (stroke_displacement > self.__start_stroke_displacement + self.__margin)
+        return stroke_displacement > self.__start_stroke_displacement + self.__margin
 
-    def _detect_cut_out_end(self, stroke_displacement: float) -> bool:
-        """切り出し終了検知。切り出し区間として検知されており、かつストローク変位値が終了しきい値以下の場合、切り出し終了とみなす。"""
+    def _detect_cut_out_end(self, stroke_displacement: np.ndarray) -> np.ndarray:
+        """切り出し終了候補。ストローク変位値が終了しきい値以下のサンプル。
+        切り出し区間として検知されている状態でこの条件を満たした場合、切り出し終了とみなす。
+        """
 
-        return self.__is_target_of_cut_out and (stroke_displacement <= self.__end_stroke_displacement)
+        return stroke_displacement <= self.__end_stroke_displacement
 
-    def _add_cut_out_target(self, rawdata) -> None:
-        """切り出し対象としてデータを追加
-        TODO: 共通化
+    def _detect_shot_section(self, is_start: np.ndarray, is_end: np.ndarray) -> np.ndarray:
+        """各サンプル処理後のショット区間状態を求める。終了条件を満たせば区間外、開始条件のみを満たせば区間内、
+        いずれも満たさなければ直前の状態を引き継ぐ。ファイル先頭は前ファイルの状態を引き継ぐ。
         """
 
-        cut_out_target: dict = {
-            "timestamp": rawdata.timestamp,
-            "sequential_number": self.__sequential_number,
-            "sequential_number_by_shot": self.__sequential_number_by_shot,
-            "rawdata_sequential_number": int(rawdata.sequential_number),
-            "shot_number": self.__shot_number,
-            "tags": [],
-        }
+        # 状態が確定するサンプル（1: 区間内, 0: 区間外）とその位置
+        state: np.ndarray = np.where(is_end, 0, np.where(is_start, 1, -1))
+        positions: np.ndarray = np.where(state >= 0, np.arange(len(state)), -1)
+        last_positions: np.ndarray = np.maximum.accumulate(positions)
 
-        for sensor in self.__sensors:
-            cut_out_target[sensor.sensor_id] = getattr(rawdata, sensor.sensor_id)
+        return np.where(last_positions >= 0, state[last_positions] == 1, self.__is_shot_section)
 
-        self.cut_out_targets.append(cut_out_target)
+    def cut_out_shot(self, rawdata_df: DataFrame) -> Dict[str, np.ndarray]:
+        """ショット切り出し処理。生データのストローク変位値を参照し、ショット対象となるデータのみを列ごとの配列にして返す。
+        ショット区間、切り出し区間の状態はファイルを跨いで引き継ぐ。
+        """
 
-    def cut_out_shot(self, rawdata_df: DataFrame) -> None:
-        """ショット切り出し処理。生データのストローク変位値を参照し、ショット対象となるデータのみをリストに含めて返す。"""
+        stroke_displacement: np.ndarray = rawdata_df["stroke_displacement"].to_numpy(dtype=np.float64)
+        num_of_samples: int = len(stroke_displacement)
+
+        # 各サンプル処理後および処理前のショット区間状態
+        is_shot_section: np.ndarray = self._detect_shot_section(
+            self._detect_shot_start(stroke_displacement), self._detect_shot_end(stroke_displacement)
+        )
+        was_shot_section: np.ndarray = np.concatenate(([self.__is_shot_section], is_shot_section[:-1]))[:num_of_samples]
+
+        # ショット開始：ショット区間外で開始条件を満たしたサンプル
+        shot_starts: np.ndarray = np.flatnonzero(self._detect_shot_start(stroke_displacement) & ~was_shot_section)
+
+        # ショット区間の開始位置。ファイル先頭が前ファイルから続くショット区間の場合も含む
+        section_starts: np.ndarray = np.flatnonzero(is_shot_section & ~was_shot_section)
+        is_carried_over: bool = bool(self.__is_shot_section and num_of_samples > 0 and is_shot_section[0])
+        if is_carried_over:
+            section_starts = np.concatenate(([0], section_starts))
+        section_ends: np.ndarray = np.flatnonzero(is_shot_section & ~np.append(is_shot_section[1:], False)) + 1
+
+        # ショット区間ごとに、最初に切り出し終了条件を満たす位置（満たさなければ区間終端）を求める
+        cut_out_end_positions: np.ndarray = np.flatnonzero(self._detect_cut_out_end(stroke_displacement) & is_shot_section)
+        first_cut_out_ends: np.ndarray = np.append(cut_out_end_positions, num_of_samples)[
+            np.searchsorted(cut_out_end_positions, section_starts)
+        ]
+        has_cut_out_end: np.ndarray = first_cut_out_ends < section_ends
+        cut_out_stops: np.ndarray = np.where(has_cut_out_end, first_cut_out_ends, section_ends)
+
+        # 前ファイルから続くショット区間は、切り出し区間の状態と連番を引き継ぐ
+        is_target: np.ndarray = np.ones(len(section_starts), dtype=bool)
+        offsets: np.ndarray = np.zeros(len(section_starts), dtype=np.int64)
+        shot_numbers: np.ndarray = self.__shot_number + np.searchsorted(shot_starts, section_starts, side="right")
+        if is_carried_over:
+            is_target[0] = self.__is_target_of_cut_out
+            offsets[0] = self.__sequential_number_by_shot
+
+        # ショット区間ごとの切り出し対象サンプル数
+        lengths: np.ndarray = np.where(is_target, cut_out_stops - section_starts, 0)
+        num_of_targets: int = int(lengths.sum())
+
+        # 切り出し対象サンプルの位置、ショット内連番、ショット番号
+        section_index: np.ndarray = np.repeat(np.arange(len(section_starts)), lengths)
+        position_in_section: np.ndarray = np.arange(num_of_targets) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions: np.ndarray = section_starts[section_index] + position_in_section
+
+        timestamps: np.ndarray = rawdata_df["timestamp"].to_numpy()
+        rawdata_sequential_numbers: np.ndarray = rawdata_df["sequential_number"].to_numpy()
+
+        tags: np.ndarray = np.empty(num_of_targets, dtype=object)
+        tags[:] = [[] for _ in range(num_of_targets)]
+
+        cut_out_targets: Dict[str, np.ndarray] = {
+            "timestamp": timestamps[positions],
+            "sequential_number": self.__sequential_number + np.arange(num_of_targets, dtype=np.int64),
+            "sequential_number_by_shot": offsets[section_index] + position_in_section,
+            "rawdata_sequential_number": rawdata_sequential_numbers[positions].astype(np.int64),
+            "shot_number": shot_numbers[section_index],
+            "tags": tags,
+        }
 
-        for rawdata in rawdata_df.itertuples():
-            if self._detect_shot_start(rawdata.stroke_displacement):
-                self.__is_shot_section = True  # ショット開始
-                self.__is_target_of_cut_out = True  # ショット開始 = 切り出し区間開始
-                self.__shot_number += 1
-                self.__sequential_number_by_shot = 0
+        for sensor in self.__sensors:
+            cut_out_targets[sensor.sensor_id] = rawdata_df[sensor.sensor_id].to_numpy()[positions]
 
-                self.shots_summary.append({"shot_number": self.__shot_number, "timestamp": rawdata.timestamp})
+        # ショットのサマリ情報
+        for i, timestamp in enumerate(timestamps[shot_starts].tolist()):
+            self.shots_summary.append({"shot_number": self.__shot_number + i + 1, "timestamp": timestamp})
 
-            # ショット区間終了判定
-            if self._detect_shot_end(rawdata.stroke_displacement):
-                self.__is_shot_section = False
+        cut_out_end_sections: np.ndarray = np.flatnonzero(has_cut_out_end & is_target)
+        for i in cut_out_end_sections:
+            num_of_samples_in_cut_out: int = int(offsets[i] + lengths[i])
+            logger.info(f"{num_of_samples_in_cut_out} samples cutted out in shot_number: {shot_numbers[i]}")
+            self.shots_summary[shot_numbers[i] - 1]["num_of_samples_in_cut_out"] = num_of_samples_in_cut_out
 
-            # ショット未開始ならば後続は何もしない
-            if not self.__is_shot_section:
-                continue
+        # 次ファイルに引き継ぐ状態
+        self._update_state(is_shot_section, shot_starts, first_cut_out_ends[has_cut_out_end & is_target], shot_numbers, offsets + lengths)
+        self.__sequential_number += num_of_targets
 
-            # 切り出し区間終了判定
-            if self._detect_cut_out_end(rawdata.stroke_displacement):
-                logger.info(f"{self.__sequential_number_by_shot} samples cutted out in shot_number: {self.__shot_number}")
-                self.shots_summary[self.__shot_number - 1]["num_of_samples_in_cut_out"] = self.__sequential_number_by_shot
-                self.__is_target_of_cut_out = False
+        self.cut_out_targets = cut_out_targets
 
-            # 切り出し区間でなければ後続は何もしない
-            if not self.__is_target_of_cut_out:
-                continue
+        return cut_out_targets
 
-            # ここに到達するのはショット区間かつ切り出し区間
-            self._add_cut_out_target(rawdata)
-            self.__sequential_number += 1
-            self.__sequential_number_by_shot += 1
+    def _update_state(
+        self,
+        is_shot_section: np.ndarray,
+        shot_starts: np.ndarray,
+        cut_out_ends: np.ndarray,
+        section_shot_numbers: np.ndarray,
+        section_sequential_numbers_by_shot: np.ndarray,
+    ) -> None:
+        """ファイル末尾時点のショット区間、切り出し区間、ショット番号、ショット内連番を保持する"""
+
+        if len(is_shot_section) == 0:
+            return
+
+        self.__is_shot_section = bool(is_shot_section[-1])
+
+        last_shot_start: int = int(shot_starts[-1]) if len(shot_starts) else -1
+        last_cut_out_end: int = int(cut_out_ends[-1]) if len(cut_out_ends) else -1
+
+        # ショット開始で切り出し区間開始、切り出し終了で切り出し区間終了。同一サンプルでは切り出し終了が後に判定される
+        if last_cut_out_end >= 0 and last_cut_out_end >= last_shot_start:
+            self.__is_target_of_cut_out = False
+        elif last_shot_start >= 0:
+            self.__is_target_of_cut_out = True
+
+        if len(shot_starts):
+            self.__shot_number += len(shot_starts)
+            self.__sequential_number_by_shot = 0
+
+        # 最後のショット区間が最新のショットであれば、そのショット内連番を引き継ぐ
+        if len(section_shot_numbers) and section_shot_numbers[-1] == self.__shot_number:
+            self.__sequential_number_by_shot = int(section_sequential_numbers_by_shot[-1])
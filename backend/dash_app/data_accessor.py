@@ -14,6 +14,7 @@ from typing import List
 
 import pandas as pd
 from backend.elastic_manager.elastic_manager import ElasticManager
+from backend.elastic_manager.shot_cache import ShotCache
 
 
 class ElasticDataAccessor:
@@ -23,12 +24,25 @@ class ElasticDataAccessor:
 
     @staticmethod
     def get_shot_df(index, shot_number, size=10_000):
-        """elasticsearch indexからショットデータを取得し、DataFrameとして返す"""
+        """elasticsearch indexからショットデータを取得し、DataFrameとして返す。
+        キャッシュにあるショットはElasticsearchから取得しない。
+        """
+
+        cached_df = ShotCache.get(index, shot_number)
+        if cached_df is not None:
+            return cached_df.head(size)
 
         query: dict = {"query": {"term": {"shot_number": {"value": shot_number}}}, "sort": {"sequential_number": {"order": "asc"}}}
 
+        generation: str = ShotCache.generation(index)
         result = ElasticManager.get_docs(index=index, query=query, size=size)
         shot_df = pd.DataFrame(result)
+
+        # 切り出しが完了したショットの全サンプルを取得できた場合のみキャッシュする
+        num_of_samples = ElasticManager.get_num_of_samples_in_cut_out(index, [shot_number]).get(shot_number)
+        if len(result) < size and len(result) == num_of_samples:
+            ShotCache.put(index, shot_number, shot_df, generation)
+
         return shot_df
 
     @staticmethod
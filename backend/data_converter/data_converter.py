@@ -1,35 +1,93 @@
 from datetime import datetime
-from typing import Callable
+from typing import Any, Callable, Dict, Final, List, Sequence, Tuple, Union
 
+import numpy as np
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.app.models.sensor import Sensor
 from backend.common.common_logger import logger
 from pandas.core.frame import DataFrame
 
+# 物理変換式が slope * v + intercept となるセンサー種別。それ以外は恒等変換（非線形変換が登録されていればその変換）となる。
+LINEAR_SENSOR_TYPES: Final[Tuple[str, ...]] = ("load", "bolt", "stroke_displacement")
+
+SensorType = Union[Sensor, DataCollectHistorySensor]
+# 非線形の物理変換。センサー1列分の配列とセンサー情報を受け取り、変換後の配列を返す
+NonLinearConversion = Callable[[np.ndarray, Any], np.ndarray]
+
 
 class DataConverter:
+    # センサー種別ごとの非線形の物理変換
+    __non_linear_conversions: Dict[str, NonLinearConversion] = {}
+
+    @classmethod
+    def register_non_linear_conversion(cls, sensor_type_id: str, conversion: NonLinearConversion) -> None:
+        """線形変換で表せないセンサー種別の物理変換を登録する。変換は配列単位で行うこと。"""
+
+        if sensor_type_id in LINEAR_SENSOR_TYPES:
+            logger.error(f"sensor_type_id: {sensor_type_id} is linear. Non-linear conversion can not be registered.")
+            raise ValueError(f"Linear sensor type: {sensor_type_id}")
+
+        cls.__non_linear_conversions[sensor_type_id] = conversion
+
+    @classmethod
+    def unregister_non_linear_conversion(cls, sensor_type_id: str) -> None:
+        """登録した非線形の物理変換を削除する"""
+
+        cls.__non_linear_conversions.pop(sensor_type_id, None)
+
     @staticmethod
-    def get_physical_conversion_formula(sensor: Sensor) -> Callable[[float], float]:
-        """センサー種別に応じた物理変換式を返却する"""
+    def get_linear_coefficients(sensors: Sequence[SensorType]) -> Tuple[np.ndarray, np.ndarray]:
+        """センサーごとの物理変換式の傾きと切片を配列で返す。線形変換でないセンサーは傾き1、切片0とする。"""
+
+        slopes: np.ndarray = np.array([s.slope if s.sensor_type_id in LINEAR_SENSOR_TYPES else 1.0 for s in sensors], dtype=np.float64)
+        intercepts: np.ndarray = np.array(
+            [s.intercept if s.sensor_type_id in LINEAR_SENSOR_TYPES else 0.0 for s in sensors], dtype=np.float64
+        )
 
-        slope: float = sensor.slope
-        intercept: float = sensor.intercept
+        return slopes, intercepts
 
-        if sensor.sensor_type_id == "load":
-            return lambda v: slope * v + intercept
+    @classmethod
+    def convert_physical_values(cls, values: np.ndarray, sensors: Sequence[SensorType]) -> np.ndarray:
+        """(サンプル数, センサー数)の2次元配列を物理変換する。列の並びはsensorsの並びと一致していること。
+        線形変換は全列まとめて1回の演算で行い、非線形変換が登録されたセンサーの列のみ個別に変換する。
+        """
 
-        elif sensor.sensor_type_id == "bolt":
-            return lambda v: slope * v + intercept
+        slopes, intercepts = cls.get_linear_coefficients(sensors)
+        converted: np.ndarray = np.asarray(values, dtype=np.float64) * slopes + intercepts
 
-        elif sensor.sensor_type_id == "stroke_displacement":
-            # -8.75 * v + 87.5
-            # return lambda v: 70.0 - (v - 2.0) * 70.0 / 8.0
-            return lambda v: slope * v + intercept
+        for i, sensor in enumerate(sensors):
+            conversion = cls.__non_linear_conversions.get(sensor.sensor_type_id)
+            if conversion is not None:
+                converted[:, i] = conversion(converted[:, i], sensor)
 
-        elif sensor.sensor_type_id == "pulse":
-            return lambda v: v
+        return converted
 
-        else:
-            return lambda v: v
+    @staticmethod
+    def physical_convert_df(df: DataFrame, sensors: Sequence[SensorType]) -> DataFrame:
+        """DataFrameのセンサー列を物理変換する"""
+
+        if len(sensors) == 0:
+            return df
+
+        sensor_ids: List[str] = [s.sensor_id for s in sensors]
+        df[sensor_ids] = DataConverter.convert_physical_values(df[sensor_ids].to_numpy(dtype=np.float64), sensors)
+
+        return df
+
+    @staticmethod
+    def physical_convert_columns(columns: Dict[str, Any], sensors: Sequence[SensorType]) -> Dict[str, Any]:
+        """列ごとの配列のセンサー列を物理変換する"""
+
+        if len(sensors) == 0:
+            return columns
+
+        block: np.ndarray = np.column_stack([columns[s.sensor_id] for s in sensors])
+        converted: np.ndarray = DataConverter.convert_physical_values(block, sensors)
+
+        for i, sensor in enumerate(sensors):
+            columns[sensor.sensor_id] = converted[:, i]
+
+        return columns
 
     @staticmethod
     def down_sampling_df(df: DataFrame, sampling_frequency: int, rate: int) -> DataFrame:
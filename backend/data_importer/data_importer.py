@@ -15,7 +15,7 @@ import glob
 import os
 import sys
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Generator, List, Optional
 
 import numpy as np
 import pandas as pd
@@ -203,37 +203,41 @@ class DataImporter:
         shots_index = "shots-" + target + "-data"
 
         shots_meta_records = []
-        shot_number = 1
-        start = 0
+
+        def generate_shots_docs() -> Generator[dict, None, None]:
+            """ファイルを1つずつ読み込み、ショットデータのドキュメントを逐次生成する。ショットメタデータも合わせて記録する。"""
+
+            shot_number = 1
+            start = 0
+            for file in files:
+                logger.info(f"import {file} starting...")
+                df = pd.read_pickle(file)
+                df["shot_number"] = shot_number
+                df["sequential_number_by_shot"] = pd.RangeIndex(0, len(df), 1)
+                df["rawdata_sequential_number"] = pd.RangeIndex(start, start + len(df), 1)
+                # df["tags"] = pd.Series([[] for _ in range(len(df))])  # tagsは[]で初期化
+                df["machine_id"] = machine_id
+
+                timestamp = df.timestamp.iloc[0]
+                shots_meta_records.append(
+                    {
+                        "timestamp": datetime.utcfromtimestamp(timestamp),
+                        "shot_number": shot_number,
+                        "num_of_samples_in_cut_out": len(df),
+                        "predicted": False,
+                    }
+                )
+
+                df["timestamp"] = df["timestamp"].apply(lambda x: datetime.utcfromtimestamp(x))
+
+                yield from ElasticManager.generate_docs_from_df(df)
+
+                shot_number += 1
+                start += len(df)
 
         logger.info("shots_index bulk insert starting...")
-        for file in files:
-            logger.info(f"import {file} starting...")
-            df = pd.read_pickle(file)
-            df["shot_number"] = shot_number
-            df["sequential_number_by_shot"] = pd.RangeIndex(0, len(df), 1)
-            df["rawdata_sequential_number"] = pd.RangeIndex(start, start + len(df), 1)
-            # df["tags"] = pd.Series([[] for _ in range(len(df))])  # tagsは[]で初期化
-            df["machine_id"] = machine_id
-
-            timestamp = df.timestamp.iloc[0]
-            shots_meta_records.append(
-                {
-                    "timestamp": datetime.utcfromtimestamp(timestamp),
-                    "shot_number": shot_number,
-                    "num_of_samples_in_cut_out": len(df),
-                    "predicted": False,
-                }
-            )
-
-            df["timestamp"] = df["timestamp"].apply(lambda x: datetime.utcfromtimestamp(x))
-            shots_dict = df.to_dict(orient="records")
-
-            # NOTE: 並列化すると遅かったため、シングルプロセス
-            ElasticManager.bulk_insert(shots_dict, shots_index)
-
-            shot_number += 1
-            start += len(df)
+        # NOTE: 全ファイルのドキュメントを1本のストリームとして並列にbulk insertする。読み込み済みのファイルのみメモリに保持する。
+        ElasticManager.parallel_bulk_insert(generate_shots_docs(), shots_index)
 
         logger.info("shots_index bulk insert finished.")
 
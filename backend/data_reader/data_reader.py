@@ -10,35 +10,37 @@
 """
 
 import glob
+import itertools
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from backend.common import common
 from backend.common.common_logger import logger
 from backend.elastic_manager.elastic_manager import ElasticManager
+from backend.elastic_manager.shot_cache import ShotCache
 from dateutil import tz
 from pandas.core.frame import DataFrame
 
 
 class DataReader:
-    def read_shot(self, index: str, shot_number: int) -> DataFrame:
-        """特定ショットのデータを取得し、連番の昇順にソートして返却する"""
-
-        query: dict = {"query": {"term": {"shot_number": {"value": shot_number}}}}
+    def read_shot(self, index: str, shot_number: int, fields: Optional[List[str]] = None) -> DataFrame:
+        """特定ショットのデータを取得し、連番の昇順にソートして返却する。
+        fieldsを指定した場合は、そのフィールドとショット番号、連番のみを取得する。
+        """
 
-        result: List[dict] = ElasticManager.scan_docs(index=index, query=query)
+        shots: Dict[int, DataFrame] = self.read_shots_by_number(index, [shot_number], fields)
 
-        if len(result) == 0:
+        if shot_number not in shots:
             logger.error("No data.")
             return
 
-        result.sort(key=lambda x: x["sequential_number"])  # type: ignore
-
-        df: DataFrame = pd.DataFrame(result)
-        return df
+        return shots[shot_number]
 
     def read_shots(self, index: str, start_shot_number: int, end_shot_number: int) -> DataFrame:
         """複数ショット分のデータを取得し、連番の昇順にソートして返却する。
@@ -47,19 +49,77 @@ class DataReader:
 
         query: dict = {"query": {"range": {"shot_number": {"gte": start_shot_number, "lte": end_shot_number - 1}}}}
 
-        result: List[dict] = ElasticManager.scan_docs(index=index, query=query)
+        table: pa.Table = DataReader._docs_to_table(ElasticManager.search_after_scan(index=index, query=query, sort=["sequential_number"]))
 
-        if len(result) == 0:
+        if table.num_rows == 0:
             logger.error("No data.")
             return
 
-        result.sort(key=lambda x: x["sequential_number"])  # type: ignore
-
-        df: DataFrame = pd.DataFrame(result)
+        df: DataFrame = common.arrow_table_to_df(table)
         return df
 
-    def multi_process_read_all(self, index: str) -> DataFrame:
+    def read_shots_by_number(self, index: str, shot_numbers: List[int], fields: Optional[List[str]] = None) -> Dict[int, DataFrame]:
+        """指定した複数ショットのデータを取得し、ショット番号をキーとしたショットごとのDataFrameで返す。
+        キャッシュにないショットは1回のクエリでまとめて取得する。データがないショットは含まれない。
+        """
+
+        shots: Dict[int, DataFrame] = {}
+        targets: List[int] = []
+
+        for shot_number in shot_numbers:
+            cached: Optional[DataFrame] = ShotCache.get(index, shot_number, fields)
+            if cached is None:
+                targets.append(shot_number)
+            else:
+                shots[shot_number] = cached
+
+        if len(targets) > 0:
+            generation: str = ShotCache.generation(index)
+            fetched: Dict[int, DataFrame] = self._fetch_shots_by_number(index, targets, fields)
+
+            # 一部のフィールドのみを取得したショット、切り出し中で全サンプルが登録されていないショットはキャッシュしない
+            if fields is None:
+                num_of_samples: Dict[int, int] = ElasticManager.get_num_of_samples_in_cut_out(index, list(fetched))
+                for shot_number, shot_df in fetched.items():
+                    if len(shot_df) == num_of_samples.get(shot_number):
+                        ShotCache.put(index, shot_number, shot_df, generation)
+
+            shots.update(fetched)
+
+        return {shot_number: shots[shot_number] for shot_number in sorted(shots)}
+
+    def _fetch_shots_by_number(self, index: str, shot_numbers: List[int], fields: Optional[List[str]] = None) -> Dict[int, DataFrame]:
+        """指定した複数ショットのデータを1回のクエリで取得し、ショット番号をキーとしたショットごとのDataFrameで返す。
+        ショット番号、連番の順にサーバー側でソートして取得するため、クライアント側ではショットの境界で分割するのみ。
+        """
+
+        if len(shot_numbers) == 0:
+            return {}
+
+        query: dict = {"query": {"terms": {"shot_number": list(shot_numbers)}}}
+        source: Optional[List[str]] = None if fields is None else list(dict.fromkeys(["shot_number", "sequential_number", *fields]))
+
+        table: pa.Table = DataReader._docs_to_table(
+            ElasticManager.search_after_scan(index=index, query=query, sort=["shot_number", "sequential_number"], source=source)
+        )
+
+        if table.num_rows == 0:
+            return {}
+
+        df: DataFrame = common.arrow_table_to_df(table)
+
+        # ショット番号が切り替わる位置で分割する
+        shot_number_array: np.ndarray = df["shot_number"].to_numpy()
+        boundaries: np.ndarray = np.flatnonzero(np.diff(shot_number_array)) + 1
+        starts: np.ndarray = np.concatenate(([0], boundaries))
+        ends: np.ndarray = np.append(boundaries, len(df))
+
+        return {int(shot_number_array[start]): df.iloc[start:end].reset_index(drop=True) for start, end in zip(starts, ends)}
+
+    def multi_process_read_all(self, index: str, num_of_process: int = common.NUM_OF_PROCESS) -> DataFrame:
         """マルチプロセスで全件取得し、連番の昇順ソート結果を返す。
+        sliced scrollで各プロセスがデータを分担して取得し、列形式のArrow IPCストリームにして返す。
+        結合とソートは全プロセスの取得完了後に一度だけ行う。
         本関数が利用可能なインデックスは連番(sequential_number)フィールドを持つインデックスだけであることに注意。
         """
 
@@ -67,40 +127,100 @@ class DataReader:
 
         num_of_data: int = ElasticManager.count(index=index)
 
-        # 100万件毎のバッチに分割
-        # ex) 2_500_000 -> [1_000_000, 1_000_000, 500_000]
-        batch_size: int = 1_000_000
-        remain_num_of_data = num_of_data
-        num_of_data_by_batch: List[int] = []
-        while True:
-            if remain_num_of_data >= batch_size:
-                num_of_data_by_batch.append(batch_size)
-            else:
-                num_of_data_by_batch.append(remain_num_of_data)
-                break
-            remain_num_of_data -= batch_size
-
-        results: DataFrame = pd.DataFrame([])
-        start_index: int = 0
-        for num_of_data in num_of_data_by_batch:
-            result: List[dict] = ElasticManager.multi_process_range_scan(
-                index=index,
-                start_index=start_index,
-                num_of_data=num_of_data,
-                num_of_process=common.NUM_OF_PROCESS,
-            )
+        logger.info(f"データ件数: {num_of_data}")
 
-            result.sort(key=lambda x: x["sequential_number"])  # type: ignore
-            df: DataFrame = pd.DataFrame(result)
-            results = pd.concat([results, df], axis=0, ignore_index=True)
+        with ProcessPoolExecutor(max_workers=num_of_process) as executor:
+            blocks: List[bytes] = list(
+                executor.map(DataReader._read_slice, itertools.repeat(index), range(num_of_process), itertools.repeat(num_of_process))
+            )
 
-            start_index += num_of_data
+        dfs: List[DataFrame] = [df for df in map(DataReader._arrow_ipc_to_df, blocks) if len(df) > 0]
 
-        if len(results) == 0:
+        if len(dfs) == 0:
             logger.error("No data.")
             return
 
-        return results
+        df: DataFrame = pd.concat(dfs, axis=0, ignore_index=True)
+        df = DataReader._sort_by_sequential_number(df)
+
+        logger.info("Data reading has finished.")
+
+        return df
+
+    @staticmethod
+    def _read_slice(index: str, slice_id: int, num_of_slices: int) -> bytes:
+        """sliced scrollで担当sliceのデータを取得し、列形式のArrow IPCストリームに変換して返す。
+        プロセス間ではドキュメントのリストではなく、列ごとの配列をまとめたバイト列のみを受け渡す。
+        """
+
+        table: pa.Table = DataReader._docs_to_table(ElasticManager.sliced_scan(index=index, slice_id=slice_id, num_of_slices=num_of_slices))
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        block: bytes = sink.getvalue().to_pybytes()
+
+        logger.info(f"slice {slice_id}/{num_of_slices}: {table.num_rows} docs read.")
+
+        return block
+
+    @staticmethod
+    def _docs_to_table(docs: Iterable[dict], page_size: int = common.ELASTIC_MAX_DOC_SIZE) -> pa.Table:
+        """ドキュメントを列形式のArrowのテーブルに変換する。
+        page_size件ごとに、フィールドごとの型付きの配列にまとめる。ドキュメントに含まれないフィールドは欠損値(null)とする。
+        """
+
+        chunks: Dict[str, List[pa.Array]] = {}
+        num_of_docs_by_page: List[int] = []
+        doc_iterator: Iterator[dict] = iter(docs)
+
+        while True:
+            page: List[dict] = list(itertools.islice(doc_iterator, page_size))
+            if len(page) == 0:
+                break
+
+            for key in dict.fromkeys(itertools.chain.from_iterable(page)):
+                # 途中のページから現れたフィールドは、それまでのページを欠損値とする
+                if key not in chunks:
+                    chunks[key] = [pa.nulls(num_of_docs) for num_of_docs in num_of_docs_by_page]
+                chunks[key].append(pa.array([doc.get(key) for doc in page]))
+
+            # このページに含まれないフィールドは欠損値とする
+            for arrays in chunks.values():
+                if len(arrays) == len(num_of_docs_by_page):
+                    arrays.append(pa.nulls(len(page)))
+
+            num_of_docs_by_page.append(len(page))
+
+        return pa.table({key: DataReader._concat_arrays(arrays) for key, arrays in chunks.items()})
+
+    @staticmethod
+    def _concat_arrays(arrays: List[pa.Array]) -> pa.ChunkedArray:
+        """ページごとの配列を1列にまとめる。全て欠損値のページは他のページの型に揃え、ページ間で型が異なる場合は全ページの値から型を推定し直す"""
+
+        types: Set[pa.DataType] = {array.type for array in arrays if array.type != pa.null()}
+
+        if len(types) > 1:
+            return pa.chunked_array([pa.array(list(itertools.chain.from_iterable(array.to_pylist() for array in arrays)))])
+
+        column_type: pa.DataType = types.pop() if len(types) == 1 else pa.null()
+
+        return pa.chunked_array([array.cast(column_type) for array in arrays], type=column_type)
+
+    @staticmethod
+    def _arrow_ipc_to_df(block: bytes) -> DataFrame:
+        """Arrow IPCストリームをDataFrameに変換する"""
+
+        return common.arrow_table_to_df(pa.ipc.open_stream(block).read_all())
+
+    @staticmethod
+    def _sort_by_sequential_number(df: DataFrame) -> DataFrame:
+        """連番の昇順にソートする"""
+
+        order: np.ndarray = np.argsort(df["sequential_number"].to_numpy(), kind="stable")
+
+        return df.take(order).reset_index(drop=True)
 
     def read_all(self, index: str) -> DataFrame:
         """シングルプロセスで全件取得し、連番の昇順ソート結果を返す"""
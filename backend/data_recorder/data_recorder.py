@@ -11,15 +11,17 @@
 
 import argparse
 import glob
+import itertools
 import os
 import shutil
 import struct
 import sys
-import time
 import traceback
-from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
 from typing import Any, Dict, Final, List, Optional, Tuple
 
+import numpy as np
+import pandas as pd
 from backend.app.crud.crud_data_collect_history import CRUDDataCollectHistory
 from backend.app.models.data_collect_history import DataCollectHistory
 from backend.app.models.data_collect_history_gateway import DataCollectHistoryGateway
@@ -28,15 +30,22 @@ from backend.app.models.data_collect_history_sensor import DataCollectHistorySen
 from backend.app.services.data_recorder_service import DataRecorderService
 from backend.common import common
 from backend.common.common_logger import data_recorder_logger as logger
-from backend.file_manager.file_manager import FileInfo, FileManager
+from backend.file_manager.file_manager import RAWDATA_EXTENSIONS, FileInfo, FileManager
+from backend.file_manager.file_watcher import FileWatcher
+from backend.file_manager.rawdata_stream import RawdataStream
+from pandas.core.frame import DataFrame
 from sqlalchemy.orm.session import Session
 
+BYTE_SIZE: Final[int] = 8
+ROUND_DIGITS: Final[int] = common.RAWDATA_ROUND_DIGITS
+
 
 class DataRecorder:
     @staticmethod
-    def manual_record(db: Session, machine_id: str, target_dir: str):
+    def manual_record(db: Session, machine_id: str, target_dir: str, num_of_process: int = 1):
         """手動での生データ取り込み。前提条件は以下。
         * 取り込むデータディレクトリはdataフォルダ配下に配置すること。
+        num_of_processが2以上の場合は、ファイルのデコードと出力をプロセスプールで並列に行う。
         """
 
         try:
@@ -59,17 +68,19 @@ class DataRecorder:
             logger.error(f"Latest event should be '{common.COLLECT_STATUS.RECORDED.value}'.")
             sys.exit(1)
 
-        # 既存のpickleファイルは削除する
-        pickle_files: List[str] = glob.glob(os.path.join(target_dir_full_path, "*.pkl"))
-        if len(pickle_files):
+        # 既存の生データファイル(pkl/parquet)は削除する
+        rawdata_files: List[str] = [
+            f for extension in RAWDATA_EXTENSIONS for f in glob.glob(os.path.join(target_dir_full_path, f"*.{extension}"))
+        ]
+        if len(rawdata_files):
             while True:
-                choice = input("The pickle files already exist. Do you want to delete it? 'yes' or 'no' [y/N]: ").lower()
+                choice = input("The rawdata files already exist. Do you want to delete it? 'yes' or 'no' [y/N]: ").lower()
                 if choice in ["y", "yes"]:
                     break
                 elif choice in ["n", "no"]:
                     logger.info("実行をキャンセルしました")
                     sys.exit(1)
-            for file in pickle_files:
+            for file in rawdata_files:
                 os.remove(file)
 
         for gateway in data_collect_history.data_collect_history_gateways:
@@ -78,17 +89,27 @@ class DataRecorder:
                 if handler.is_multi and not handler.is_primary:
                     continue
 
-                started_timestamp: float = data_collect_history.started_at.timestamp()
+                started_timestamp_ns: int = common.datetime_to_epoch_ns(data_collect_history.started_at)
                 num_of_records: int = 0
 
-                num_of_records = DataRecorder.data_record(
-                    handler,
-                    files_info,
-                    Decimal(started_timestamp),
-                    num_of_records,
-                    sensors=sensors,
-                    is_manual=True,
-                )
+                if num_of_process > 1:
+                    num_of_records = DataRecorder.data_record_parallel(
+                        handler,
+                        files_info,
+                        started_timestamp_ns,
+                        num_of_records,
+                        sensors=sensors,
+                        num_of_process=num_of_process,
+                    )
+                else:
+                    num_of_records = DataRecorder.data_record(
+                        handler,
+                        files_info,
+                        started_timestamp_ns,
+                        num_of_records,
+                        sensors=sensors,
+                        is_manual=True,
+                    )
 
                 logger.info(f"handler: {handler.handler_id} was recorded.")
             logger.info(f"gateway: {gateway.gateway_id} was recorded.")
@@ -97,7 +118,7 @@ class DataRecorder:
 
     @staticmethod
     def record(db: Session, machine_id: str, gateway_id: str, handler_id: str) -> None:
-        """バイナリデータをpklに変換して出力する。celeryタスクから実行。"""
+        """バイナリデータを生データファイルに変換して出力する。celeryタスクから実行。"""
 
         logger.info(f"data recording process started. target: {machine_id}_{gateway_id}_{handler_id}")
 
@@ -125,70 +146,77 @@ class DataRecorder:
         else:
             sensors = latest_data_collect_history_handler.data_collect_history_sensors
 
-        started_timestamp: float = (
-            latest_data_collect_history_handler.data_collect_history_gateway.data_collect_history.started_at.timestamp()
+        started_timestamp_ns: int = common.datetime_to_epoch_ns(
+            latest_data_collect_history_handler.data_collect_history_gateway.data_collect_history.started_at
         )
 
         num_of_records: int = 0
         INTERVAL: Final[int] = 1
         data_dir: str = os.environ["DATA_DIR"]
 
-        # データ収集が停止されるまで一定間隔で無限ループ実行。
-        while True:
-            time.sleep(INTERVAL)
+        # 対象機器のファイルの書き込み完了を監視し、完了したファイルから順に記録する。
+        # NOTE: 書き込み中のファイルはclose_writeイベントまたはサイズ安定確認で除外されるため、安全バッファの待機は不要。
+        # 環境変数RAWDATA_STREAM_URL設定時は、出力した生データをショット切り出しへストリームでも受け渡す。
+        processed_dir_path: str = latest_data_collect_history_handler.data_collect_history_gateway.data_collect_history.processed_dir_path
+        stream: Optional[RawdataStream] = RawdataStream.from_env(processed_dir_path, machine_id)
 
-            collect_status = DataRecorderService.get_collect_status(machine_id)
+        with FileWatcher(data_dir, [f"{machine_id}_{gateway_id}_{handler_id}_*.dat"]) as watcher:
+            # データ収集が停止されるまで無限ループ実行。
+            while True:
+                target_files: List[str] = watcher.get_batch(timeout=INTERVAL)
 
-            # collect_statusがRECORDEDになるのは、停止ボタン押下後全てのバイナリファイルが捌けたとき。
-            if collect_status == common.COLLECT_STATUS.RECORDED.value:
-                logger.info(f"data recording process stopped. machine_id: {machine_id}")
-                break
+                # バイナリファイルが未生成のタイミングはあり得る（例えばネットワーク遅延等）。
+                # NOTE: 毎度DBにアクセスするのは非効率なため、対象ファイルが存在しないときのみ収集ステータスを確認し、停止判断を行う。
+                if len(target_files) == 0:
+                    collect_status = DataRecorderService.get_collect_status(machine_id)
 
-            # 対象機器のファイルリストを作成
-            files_info: List[FileInfo] = FileManager.create_files_info(data_dir, machine_id, gateway_id, handler_id, "dat")
+                    # collect_statusがRECORDEDになるのは、停止ボタン押下後全てのバイナリファイルが捌けたとき。
+                    if collect_status == common.COLLECT_STATUS.RECORDED.value:
+                        logger.info(f"data recording process stopped. machine_id: {machine_id}")
+                        break
+                    continue
 
-            # バイナリファイルが未生成のタイミングはあり得る（例えばネットワーク遅延等）
-            if len(files_info) == 0:
-                logger.debug(f"No files in {data_dir}")
-                continue
+                files_info: List[FileInfo] = FileManager.create_files_info_by_paths(target_files)
 
-            # NOTE: 生成中のファイルを読み込まないよう、安全バッファとして3秒待つ
-            time.sleep(3)
+                num_of_records = DataRecorder.data_record(
+                    latest_data_collect_history_handler, files_info, started_timestamp_ns, num_of_records, sensors, stream=stream
+                )
 
-            num_of_records = DataRecorder.data_record(
-                latest_data_collect_history_handler, files_info, Decimal(started_timestamp), num_of_records, sensors
-            )
+        if stream is not None:
+            stream.close()
 
     @staticmethod
     def data_record(
         data_collect_history_handler: DataCollectHistoryHandler,
         target_files: List[FileInfo],
-        started_timestamp: Decimal,
+        started_timestamp_ns: int,
         num_of_records: int,
         sensors: List[DataCollectHistorySensor],
         is_manual: bool = False,
+        stream: Optional[RawdataStream] = None,
     ) -> int:
-        """バイナリファイル読み取りおよびES/pkl出力"""
+        """バイナリファイル読み取りおよび生データファイル出力。streamを指定した場合は出力した生データをストリームにも追加する"""
 
         sequential_number: int = num_of_records
-        # プロセス跨ぎを考慮した時刻付け
-        sampling_interval: Decimal = Decimal(1.0 / data_collect_history_handler.sampling_frequency)
-        timestamp: Decimal = started_timestamp + sequential_number * sampling_interval
+        # プロセス跨ぎを考慮した時刻付け。時刻は収集開始時刻と連番から求めるため、引き継ぐのは連番のみ
+        sampling_frequency: int = data_collect_history_handler.sampling_frequency
 
         for file in target_files:
-            # バイナリファイルを読み取り、データリストを取得
-            samples: List[Dict[str, Any]]
-            samples, sequential_number, timestamp = DataRecorder.read_binary_files(
+            # バイナリファイルを読み取り、列指向のDataFrameを取得
+            samples: DataFrame
+            samples, sequential_number = DataRecorder.decode_binary_file(
                 file,
                 sequential_number,
-                timestamp,
+                started_timestamp_ns,
                 sensors,
-                sampling_interval,
+                sampling_frequency,
             )
 
-            # pklファイルに出力
+            # 生データファイル(既定はparquet)に出力
             processed_dir_path = data_collect_history_handler.data_collect_history_gateway.data_collect_history.processed_dir_path
-            FileManager.export_to_pickle(samples, file, processed_dir_path)
+            rawdata_file: str = FileManager.export_rawdata(samples, file, processed_dir_path)
+            if stream is not None:
+                stream.publish(rawdata_file, samples)
 
             # 手動インポートでないとき（スケジュール実行のとき）、ファイルを退避する
             if not is_manual:
@@ -199,18 +227,101 @@ class DataRecorder:
         # 記録した件数
         return sequential_number
 
+    @staticmethod
+    def data_record_parallel(
+        data_collect_history_handler: DataCollectHistoryHandler,
+        target_files: List[FileInfo],
+        started_timestamp_ns: int,
+        num_of_records: int,
+        sensors: List[DataCollectHistorySensor],
+        num_of_process: int = common.NUM_OF_PROCESS,
+    ) -> int:
+        """手動インポート用のバイナリファイル読み取りおよび生データファイル出力。
+        ファイルごとの連番の開始値をファイルサイズから事前に求め、デコードと出力をプロセスプールで並列に行う。
+        出力はdata_record(is_manual=True)と同一。
+        """
+
+        if len(target_files) == 0:
+            return num_of_records
+
+        sampling_frequency: int = data_collect_history_handler.sampling_frequency
+        processed_dir_path: str = data_collect_history_handler.data_collect_history_gateway.data_collect_history.processed_dir_path
+        offsets: List[int] = DataRecorder._file_offsets(target_files, len(sensors), num_of_records)
+
+        # SQLAlchemyのモデルはセッションに紐づくため、デコードに必要な属性のみ複製して子プロセスに渡す
+        sensors = [DataCollectHistorySensor(sensor_id=s.sensor_id, sensor_type_id=s.sensor_type_id) for s in sensors]
+
+        with ProcessPoolExecutor(max_workers=num_of_process) as executor:
+            results: List[int] = list(
+                executor.map(
+                    DataRecorder._record_file,
+                    target_files,
+                    offsets,
+                    itertools.repeat(started_timestamp_ns),
+                    itertools.repeat(sensors),
+                    itertools.repeat(sampling_frequency),
+                    itertools.repeat(processed_dir_path),
+                )
+            )
+
+        for i, result in enumerate(results[:-1]):
+            # 事前に求めた開始値が前のファイルの終了値と一致しない場合は、以降のファイルを逐次処理し直す
+            if result != offsets[i + 1]:
+                logger.warning(f"Offsets mismatched, re-record sequentially from {target_files[i + 1].file_path}")
+                sequential_number: int = result
+                for file in target_files[i + 1 :]:
+                    sequential_number = DataRecorder._record_file(
+                        file, sequential_number, started_timestamp_ns, sensors, sampling_frequency, processed_dir_path
+                    )
+                return sequential_number
+
+        return results[-1]
+
+    @staticmethod
+    def _file_offsets(target_files: List[FileInfo], num_of_channels: int, num_of_records: int) -> List[int]:
+        """ファイルごとの連番の開始値。サンプル数はファイルサイズ / (8 byte * チャネル数)。
+        時刻は連番から求めるため、連番が一致すれば逐次処理と同じ値となる。
+        """
+
+        offsets: List[int] = []
+        num_of_samples: int = 0
+        for file in target_files:
+            offsets.append(num_of_records + num_of_samples)
+            num_of_samples += os.path.getsize(file.file_path) // (BYTE_SIZE * num_of_channels)
+
+        return offsets
+
+    @staticmethod
+    def _record_file(
+        file: FileInfo,
+        sequential_number: int,
+        started_timestamp_ns: int,
+        sensors: List[DataCollectHistorySensor],
+        sampling_frequency: int,
+        processed_dir_path: str,
+    ) -> int:
+        """1ファイルをデコードして生データファイルに出力し、次のファイルの連番の開始値を返す"""
+
+        samples: DataFrame
+        samples, sequential_number = DataRecorder.decode_binary_file(
+            file, sequential_number, started_timestamp_ns, sensors, sampling_frequency
+        )
+        FileManager.export_rawdata(samples, file, processed_dir_path)
+
+        return sequential_number
+
     @staticmethod
     def read_binary_files(
         file: FileInfo,
         sequential_number: int,
-        timestamp: Decimal,
+        started_timestamp_ns: int,
         sensors: List[DataCollectHistorySensor],
-        sampling_interval: Decimal,
-    ) -> Tuple[List[Dict[str, Any]], int, Decimal]:
-        """バイナリファイルを読んで、そのデータをリストにして返す"""
+        sampling_frequency: int,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """バイナリファイルを読んで、そのデータをリストにして返す。
+        1行ずつunpackする実装。decode_binary_fileの検証およびベンチマークの基準として残している。
+        """
 
-        BYTE_SIZE: Final[int] = 8
-        ROUND_DIGITS: Final[int] = 3
         SAMPLING_CH_NUM: Final[int] = len(sensors)
         ROW_BYTE_SIZE: Final[int] = BYTE_SIZE * SAMPLING_CH_NUM  # 8 byte * チャネル数
         UNPACK_FORMAT: Final[str] = "<" + "d" * SAMPLING_CH_NUM  # 5chの場合 "<ddddd"
@@ -240,9 +351,12 @@ class DataRecorder:
             dataset: Tuple[Any, ...] = struct.unpack(UNPACK_FORMAT, binary_dataset)
             logger.debug(dataset)
 
+            # NOTE: 100kサンプリングの場合10μ秒(=0.00001秒=1e-5秒)間隔。連番から求めるため累積誤差はない
+            timestamp_ns: int = started_timestamp_ns + sequential_number * common.NANOSECONDS_PER_SECOND // sampling_frequency
+
             sample: Dict[str, Any] = {
                 "sequential_number": sequential_number,
-                "timestamp": timestamp,
+                "timestamp": float(common.epoch_ns_to_timestamp(np.asarray(timestamp_ns, dtype=np.int64))),
             }
 
             if displacement_sensor_id is not None:
@@ -259,10 +373,52 @@ class DataRecorder:
             dataset_number += 1
             sequential_number += 1
 
-            # NOTE: 100kサンプリングの場合10μ秒(=0.00001秒=1e-5秒)
-            timestamp += sampling_interval
+        return samples, sequential_number
+
+    @staticmethod
+    def decode_binary_file(
+        file: FileInfo,
+        sequential_number: int,
+        started_timestamp_ns: int,
+        sensors: List[DataCollectHistorySensor],
+        sampling_frequency: int,
+    ) -> Tuple[DataFrame, int]:
+        """バイナリファイルを(サンプル数, チャネル数)のNumPy配列として一括デコードし、列指向のDataFrameで返す。
+        時刻は収集開始時刻(UNIX時間のナノ秒)と連番から整数演算で求め、float64のUNIX時間の列とする。
+        結果はread_binary_filesの戻り値をDataFrame化したものと同一。
+        """
+
+        SAMPLING_CH_NUM: Final[int] = len(sensors)
+        sensor_ids: List[str] = common.get_sensor_ids_in_channel_order(sensors)
+
+        with open(file.file_path, "rb") as f:
+            binary: bytes = f.read()
+
+        values: np.ndarray = np.frombuffer(binary, dtype="<f8", count=len(binary) // BYTE_SIZE)
+        num_of_samples: int = values.size // SAMPLING_CH_NUM
+
+        if values.size % SAMPLING_CH_NUM != 0:
+            logger.warning(f"Incomplete record was truncated. file: {file.file_path}, size: {len(binary)} bytes")
+
+        if num_of_samples == 0:
+            return pd.DataFrame(), sequential_number
+
+        dataset: np.ndarray = values[: num_of_samples * SAMPLING_CH_NUM].reshape(num_of_samples, SAMPLING_CH_NUM)
+        dataset = common.round_like_builtin(dataset, ROUND_DIGITS)
+
+        sequential_numbers: np.ndarray = np.arange(sequential_number, sequential_number + num_of_samples, dtype=np.int64)
+        timestamps_ns: np.ndarray = common.sampling_timestamps_ns(started_timestamp_ns, sequential_numbers, sampling_frequency)
+
+        columns: Dict[str, Any] = {
+            "sequential_number": sequential_numbers,
+            "timestamp": common.epoch_ns_to_timestamp(timestamps_ns),
+        }
+        for i, sensor_id in enumerate(sensor_ids):
+            columns[sensor_id] = dataset[:, i]
+
+        samples: DataFrame = pd.DataFrame(columns)
 
-        return samples, sequential_number, timestamp
+        return samples, sequential_number + num_of_samples
 
 
 # manual record
@@ -273,10 +429,11 @@ if __name__ == "__main__":
     parser.add_argument("-d", "--dir", help="set import directory (manual import)", required=True)
     # NOTE: 未使用
     parser.add_argument("--debug", action="store_true", help="debug mode")
+    parser.add_argument("-p", "--process", help="number of processes (parallel import)", type=int, default=1)
     args = parser.parse_args()
 
     machine_id, target_dir = args.dir.split("_")
 
     db: Session = SessionLocal()
-    DataRecorder.manual_record(db, machine_id, target_dir)
+    DataRecorder.manual_record(db, machine_id, target_dir, num_of_process=args.process)
     db.close()
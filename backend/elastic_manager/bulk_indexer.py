@@ -0,0 +1,125 @@
+"""
+ ==================================
+  bulk_indexer.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import queue
+import threading
+from typing import Any, Dict, Generator, Optional
+
+from backend.common.common_logger import logger
+from backend.elastic_manager.elastic_manager import ELASTIC_BULK_THREADS, BulkInsertResult, ElasticManager
+
+
+class BulkIndexer:
+    """列ごとの配列をキュー経由で受け取り、バックグラウンドのスレッドでElasticsearchに格納する。
+    キューから取り出した配列は1本のドキュメントストリームとしてparallel_bulkに渡し、num_of_threads本のリクエストを並列に送信する。
+    キューには上限があり、格納が追いつかない場合はputが待機する。
+    スレッドで動作するため、celeryのワーカープロセス(daemonic)からも利用できる。
+    raise_on_errorの場合、投入に失敗したドキュメントがあればclose時にBulkInsertErrorを送出する。
+    """
+
+    def __init__(
+        self,
+        index: str,
+        num_of_threads: int = ELASTIC_BULK_THREADS,
+        queue_size: int = 4,
+        chunk_size: int = 5_000,
+        raise_on_error: bool = False,
+    ):
+        self.__index: str = index
+        self.__num_of_threads: int = max(1, num_of_threads)
+        self.__chunk_size: int = chunk_size
+        self.__raise_on_error: bool = raise_on_error
+        self.__queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.__thread: Optional[threading.Thread] = None
+        self.__error: Optional[BaseException] = None
+        self.__is_aborted: bool = False
+        self.__is_queue_closed: bool = False  # 終了指示(None)を受け取ったか
+        self.result: Optional[BulkInsertResult] = None
+
+    def __enter__(self) -> "BulkIndexer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # 呼び出し元で例外が発生した場合、未格納のデータは破棄し、呼び出し元の例外を優先する
+        if exc_type is not None:
+            self.__is_aborted = True
+            self._join()
+            return
+
+        self.close()
+
+    def start(self) -> None:
+        """格納スレッドを開始する"""
+
+        self.__thread = threading.Thread(target=self._run, name="bulk-indexer", daemon=True)
+        self.__thread.start()
+
+    def put(self, columns: Dict[str, Any]) -> None:
+        """格納対象をキューに追加する。格納スレッドで例外が発生していればその例外を送出する。"""
+
+        self._raise_if_failed()
+        self.__queue.put(columns)
+
+    def close(self) -> Optional[BulkInsertResult]:
+        """キューに残ったデータの格納完了を待ってスレッドを終了し、格納結果を返す。
+        格納スレッドで例外が発生していればその例外を送出する。
+        """
+
+        self._join()
+        self._raise_if_failed()
+
+        return self.result
+
+    def _join(self) -> None:
+        """終了指示をキューに追加し、スレッドの終了を待つ"""
+
+        if self.__thread is None:
+            return
+
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+
+    def _run(self) -> None:
+        try:
+            self.result = ElasticManager.parallel_bulk_insert(
+                self._generate_docs(),
+                self.__index,
+                chunk_size=self.__chunk_size,
+                thread_count=self.__num_of_threads,
+                raise_on_error=self.__raise_on_error,
+            )
+        except Exception as e:
+            logger.exception(f"Bulk insert failed. index: {self.__index}")
+            self.__error = e
+            # putが待機し続けないよう、終了指示までキューを読み捨てる
+            while not self.__is_queue_closed:
+                self.__is_queue_closed = self.__queue.get() is None
+
+    def _generate_docs(self) -> Generator[dict, None, None]:
+        """キューから取り出した配列を1件ずつのドキュメントにして返す。終了指示(None)を受け取るまで繰り返す。"""
+
+        while True:
+            columns: Optional[Dict[str, Any]] = self.__queue.get()
+            if columns is None:
+                self.__is_queue_closed = True
+                return
+
+            # 中断時はキューを空にするため読み捨てる
+            if self.__is_aborted:
+                continue
+
+            yield from ElasticManager.generate_docs_from_columns(columns, self.__chunk_size)
+
+    def _raise_if_failed(self) -> None:
+        if self.__error is not None:
+            raise self.__error
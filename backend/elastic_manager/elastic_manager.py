@@ -9,32 +9,112 @@
 
 """
 
+import dataclasses
+import itertools
 import json
-import multiprocessing
 import os
-from typing import Any, Collection, Dict, Final, Generator, Iterable, List, Optional, Tuple
+import threading
+import time
+from typing import Any, Dict, Final, Generator, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from backend.common import common
 from backend.common.common_logger import logger
+from backend.elastic_manager.shot_cache import ShotCache
 from elasticsearch import Elasticsearch, exceptions, helpers
 from pandas.core.frame import DataFrame
 
 ELASTIC_URL: Final[str] = os.environ["ELASTIC_URL"]
 ELASTIC_USER: Final[str] = os.environ["ELASTIC_USER"]
 ELASTIC_PASSWORD: Final[str] = os.environ["ELASTIC_PASSWORD"]
+# コネクションプール設定
+ELASTIC_MAXSIZE: Final[int] = int(os.getenv("ELASTIC_MAXSIZE", "25"))  # ノードごとのコネクション数上限
+ELASTIC_KEEP_ALIVE: Final[bool] = os.getenv("ELASTIC_KEEP_ALIVE", "true").lower() == "true"  # falseの場合、リクエストごとに切断
+ELASTIC_TIMEOUT: Final[int] = int(os.getenv("ELASTIC_TIMEOUT", "50000"))
+ELASTIC_MAX_RETRIES: Final[int] = int(os.getenv("ELASTIC_MAX_RETRIES", "3"))
+ELASTIC_RETRY_ON_TIMEOUT: Final[bool] = os.getenv("ELASTIC_RETRY_ON_TIMEOUT", "true").lower() == "true"
+# bulk insert設定
+ELASTIC_BULK_THREADS: Final[int] = int(os.getenv("ELASTIC_BULK_THREADS", "4"))  # 並列に送信するリクエスト数
+ELASTIC_BULK_MAX_CHUNK_BYTES: Final[int] = int(os.getenv("ELASTIC_BULK_MAX_CHUNK_BYTES", str(10 * 1024 * 1024)))  # 1リクエストの上限
+ELASTIC_BULK_QUEUE_SIZE: Final[int] = int(os.getenv("ELASTIC_BULK_QUEUE_SIZE", "4"))  # 送信待ちチャンク数の上限
+BULK_ERRORS_TO_KEEP: Final[int] = 100  # 結果に保持する失敗ドキュメントのエラー数
+
+
+@dataclasses.dataclass
+class BulkInsertResult:
+    """bulk insertの結果"""
+
+    success: int = 0
+    failed: int = 0
+    elapsed_sec: float = 0.0
+    errors: List[dict] = dataclasses.field(default_factory=list)  # 失敗したドキュメントのエラー（先頭BULK_ERRORS_TO_KEEP件）
+
+    @property
+    def docs_per_sec(self) -> float:
+        return (self.success + self.failed) / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+class BulkInsertError(Exception):
+    """bulk insertで投入に失敗したドキュメントがある"""
+
+    def __init__(self, result: BulkInsertResult):
+        super().__init__(f"{result.failed} documents failed. errors: {result.errors[:5]}")
+        self.result: BulkInsertResult = result
 
 
 class ElasticManager:
     """Elasticsearchへの各種処理を行うwrapperクラス"""
 
-    es = Elasticsearch(hosts=ELASTIC_URL, http_auth=(ELASTIC_USER, ELASTIC_PASSWORD), timeout=50000)
+    # プロセスごとのクライアント。fork後の子プロセスが親のコネクションを共有しないよう、PIDをキーとする
+    __clients: Dict[int, Elasticsearch] = {}
+    __clients_lock: threading.Lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls) -> Elasticsearch:
+        """現在のプロセスのクライアントを返す。初回呼び出し時に生成し、以降はコネクションプールを再利用する。
+        スレッド間で共有できる。
+        """
+
+        pid: int = os.getpid()
+        client: Optional[Elasticsearch] = cls.__clients.get(pid)
+        if client is not None:
+            return client
+
+        with cls.__clients_lock:
+            if pid not in cls.__clients:
+                # fork元プロセスのクライアントは、親とソケットを共有しているため破棄のみ行う（closeしない）
+                cls.__clients = {pid: cls.create_client()}
+                logger.debug(f"Elasticsearch client created. pid: {pid}")
+
+            return cls.__clients[pid]
+
+    @staticmethod
+    def create_client(maxsize: int = ELASTIC_MAXSIZE, keep_alive: bool = ELASTIC_KEEP_ALIVE) -> Elasticsearch:
+        """コネクションプール、リトライの設定を行ったクライアントを生成する"""
+
+        return Elasticsearch(
+            hosts=ELASTIC_URL,
+            http_auth=(ELASTIC_USER, ELASTIC_PASSWORD),
+            timeout=ELASTIC_TIMEOUT,
+            maxsize=maxsize,
+            headers=None if keep_alive else {"connection": "close"},
+            max_retries=ELASTIC_MAX_RETRIES,
+            retry_on_timeout=ELASTIC_RETRY_ON_TIMEOUT,
+        )
+
+    @classmethod
+    def _reset_clients_after_fork(cls) -> None:
+        """fork直後の子プロセスで、親プロセスのクライアントとロックを破棄する"""
+
+        cls.__clients = {}
+        cls.__clients_lock = threading.Lock()
 
     @classmethod
     def show_indices(cls, index: str = "*") -> pd.DataFrame:
         """インデックス一覧のDataFrameを返す"""
 
-        indices = cls.es.cat.indices(index=index, v=True, h=["index", "docs.count", "store.size"], bytes="kb")
+        indices = cls.get_client().cat.indices(index=index, v=True, h=["index", "docs.count", "store.size"], bytes="kb")
 
         if isinstance(indices, str):
             _indices: List[str] = indices.splitlines()
@@ -48,7 +128,7 @@ class ElasticManager:
     def get_latest_index(cls, index) -> Optional[str]:
         """引数で指定したindexに一致する最新のインデックス名を返す"""
 
-        indices = cls.es.cat.indices(index=index, s="index", h="index")
+        indices = cls.get_client().cat.indices(index=index, s="index", h="index")
 
         if isinstance(indices, str):
             _indices: List[str] = indices.splitlines()
@@ -65,16 +145,40 @@ class ElasticManager:
         取得件数はデフォルトで10,000件。
         """
 
-        result = cls.es.search(index=index, body=query, size=size)
+        result = cls.get_client().search(index=index, body=query, size=size)
         return [x["_source"] for x in result["hits"]["hits"]]
 
+    @classmethod
+    def get_num_of_samples_in_cut_out(cls, index: str, shot_numbers: List[int]) -> Dict[int, int]:
+        """ショットデータインデックス(shots-*-data)に対応するショットメタデータインデックスから、切り出したショットのサンプル数を取得する。
+        ショットメタデータは切り出したデータを全て登録した後に登録されるため、サンプル数が取得できたショットは全サンプルが登録済みである。
+        ショットメタデータがない、またはサンプル数がない（切り出し中の）ショットは含まれない。
+        """
+
+        if not index.endswith("-data") or len(shot_numbers) == 0:
+            return {}
+
+        meta_index: str = index[: -len("-data")] + "-meta"
+        if not cls.exists_index(meta_index):
+            return {}
+
+        query: dict = {
+            "query": {"terms": {"shot_number": list(shot_numbers)}},
+            "_source": ["shot_number", "num_of_samples_in_cut_out"],
+        }
+        docs: List[dict] = cls.get_docs(index=meta_index, query=query, size=min(len(shot_numbers), common.ELASTIC_MAX_DOC_SIZE))
+
+        return {
+            int(doc["shot_number"]): int(doc["num_of_samples_in_cut_out"]) for doc in docs if pd.notna(doc.get("num_of_samples_in_cut_out"))
+        }
+
     @classmethod
     def get_docs_with_id(cls, index: str, query: dict, size: int = common.ELASTIC_MAX_DOC_SIZE) -> List[dict]:
         """対象インデックスのdocumentをdocument_id付きで返す。documentがない場合は空のリストを返す。
         取得件数はデフォルトで10,000件。
         """
 
-        result = cls.es.search(index=index, body=query, size=size)
+        result = cls.get_client().search(index=index, body=query, size=size)
 
         ret_list = []
         for x in result["hits"]["hits"]:
@@ -96,7 +200,8 @@ class ElasticManager:
             logger.error(message)
             return
 
-        result: dict = cls.es.indices.delete(index=index)
+        result: dict = cls.get_client().indices.delete(index=index)
+        ShotCache.invalidate(index)
 
         if result["acknowledged"]:
             logger.info(f"{index} deleted.")
@@ -125,7 +230,8 @@ class ElasticManager:
 
         body: dict = {"query": {"range": {"sequential_number": {"gte": start, "lte": end}}}}
 
-        result: dict = cls.es.delete_by_query(index=index, body=body, refresh=True)
+        result: dict = cls.get_client().delete_by_query(index=index, body=body, refresh=True)
+        ShotCache.invalidate(index)
 
         if len(result["failures"]) != 0:
             logger.error("Failed to delete data.")
@@ -153,7 +259,8 @@ class ElasticManager:
 
         body: dict = {"query": {"term": {"shot_number": shot_number}}}
 
-        result: dict = cls.es.delete_by_query(index=index, body=body, refresh=True)
+        result: dict = cls.get_client().delete_by_query(index=index, body=body, refresh=True)
+        ShotCache.invalidate(index)
 
         if len(result["failures"]) != 0:
             logger.error("Failed to delete data.")
@@ -182,13 +289,14 @@ class ElasticManager:
         """既存のインデックスを削除する"""
 
         if cls.exists_index(index):
-            result: dict = cls.es.indices.delete(index=index)
+            result: dict = cls.get_client().indices.delete(index=index)
+            ShotCache.invalidate(index)
             logger.info(f"delete index '{index}' finished. result: {result}")
 
     @classmethod
     def exists_index(cls, index: str) -> bool:
         """インデックスの存在確認"""
-        return cls.es.indices.exists(index=index)
+        return cls.get_client().indices.exists(index=index)
 
     @classmethod
     def create_index(cls, index: str, mapping_file: str = None, setting_file: str = None) -> bool:
@@ -206,7 +314,8 @@ class ElasticManager:
                 d = json.load(f)
                 body["mappings"] = d
 
-        result: dict = cls.es.indices.create(index=index, body=body)
+        result: dict = cls.get_client().indices.create(index=index, body=body)
+        ShotCache.invalidate(index)
 
         if not result["acknowledged"]:
             logger.error(f"create index '{index}' failed. result: {result}")
@@ -224,7 +333,7 @@ class ElasticManager:
             return False
 
         try:
-            cls.es.index(index=index, document=query, refresh=True)
+            cls.get_client().index(index=index, document=query, refresh=True)
             return True
 
         except exceptions.RequestError as e:
@@ -242,13 +351,35 @@ class ElasticManager:
         body: dict = {"doc": query}
 
         try:
-            cls.es.update(index=index, id=doc_id, body=body, refresh=True)
+            cls.get_client().update(index=index, id=doc_id, body=body, refresh=True)
             return True
 
         except exceptions.RequestError as e:
             logger.error(str(e))
             return False
 
+    @classmethod
+    def update_docs(cls, index: str, doc_ids: List[str], query: dict) -> int:
+        """複数documentを1回のbulkリクエストで同じ内容に更新する。更新に成功した件数を返す"""
+
+        if len(doc_ids) == 0:
+            return 0
+
+        if not cls.exists_index(index):
+            logger.error(f"'{index} is not exists.")
+            return 0
+
+        actions: List[dict] = [{"_op_type": "update", "_index": index, "_id": doc_id, "doc": query} for doc_id in doc_ids]
+
+        success: int
+        errors: List[dict]
+        success, errors = helpers.bulk(cls.get_client(), actions, refresh=True, raise_on_error=False)  # type: ignore
+
+        if len(errors) > 0:
+            logger.error(f"{len(errors)} documents failed to be updated in {index}. errors: {errors[:5]}")
+
+        return success
+
     @classmethod
     def delete_doc(cls, index: str, doc_id: str) -> bool:
         """documentの削除"""
@@ -258,7 +389,7 @@ class ElasticManager:
             return False
 
         try:
-            cls.es.delete(index=index, id=doc_id, refresh=True)
+            cls.get_client().delete(index=index, id=doc_id, refresh=True)
             return True
 
         except exceptions.RequestError as e:
@@ -266,125 +397,160 @@ class ElasticManager:
             return False
 
     @classmethod
-    def multi_process_bulk_lazy_join(
-        cls,
-        data: List[dict],
-        index_to_import: str,
-        num_of_process: int = common.NUM_OF_PROCESS,
-        chunk_size: int = 5000,
-    ) -> List[multiprocessing.context.Process]:
-        """マルチプロセスでbulk insertする。processリストを返却し、呼び出し元でjoinする。"""
+    def bulk_insert(cls, data_list: Iterable[dict], index_to_import: str, chunk_size: int = 500) -> "BulkInsertResult":
+        """渡されたデータをもとにElasticsearchにデータ投入する。"""
 
-        num_of_data: int = len(data)
+        return cls.parallel_bulk_insert(data_list, index_to_import, chunk_size=chunk_size)
 
-        # NOTE: データをプロセッサの数に均等分配
-        # ex) 13個のデータを4プロセスに分割すると[3, 3, 3, 4]
-        #     [0:3]の3個, [3:6]の3個, [6:9]の3個, [9:13]の4個をプロセスごとに処理する。
-        data_num_by_proc: List[int] = [(num_of_data + i) // num_of_process for i in range(num_of_process)]
+    @classmethod
+    def bulk_insert_columns(
+        cls, columns: Dict[str, Any], index_to_import: str, chunk_size: int = 500, raise_on_error: bool = False
+    ) -> "BulkInsertResult":
+        """列ごとの配列をもとにElasticsearchにデータ投入する。ドキュメント(dict)はbulk送信時に逐次生成する。"""
 
-        procs: List[multiprocessing.context.Process] = []
-        start_index: int = 0
-        for proc_number, data_num in enumerate(data_num_by_proc):
-            end_index: int = start_index + data_num
-            target_data: list = data[start_index:end_index]
-            start_index = end_index
+        return cls.parallel_bulk_insert(
+            cls.generate_docs_from_columns(columns, chunk_size), index_to_import, chunk_size=chunk_size, raise_on_error=raise_on_error
+        )
 
-            logger.debug(f"process {proc_number} will execute {len(target_data)} data.")
+    @classmethod
+    def parallel_bulk_insert(
+        cls,
+        docs: Iterable[dict],
+        index_to_import: str,
+        chunk_size: int = 500,
+        thread_count: int = ELASTIC_BULK_THREADS,
+        max_chunk_bytes: int = ELASTIC_BULK_MAX_CHUNK_BYTES,
+        queue_size: int = ELASTIC_BULK_QUEUE_SIZE,
+        raise_on_error: bool = False,
+        refresh: bool = False,
+    ) -> "BulkInsertResult":
+        """ドキュメントのイテレータを逐次読み出し、thread_count本のスレッドでbulk insertする。
+        1リクエストはchunk_size件かつmax_chunk_bytes以下とし、送信待ちのチャンクはqueue_size個までとする。
+        そのため、メモリ上に保持するドキュメントはイテレータの長さに依らず一定量に収まる。
+        投入に失敗したドキュメントはエラーログに出力し、結果の件数に含める。raise_on_errorの場合は全件処理後に例外を送出する。
+        refreshの場合は、投入後にインデックスをリフレッシュして直ちに検索可能にする。
+        """
 
-            proc: multiprocessing.context.Process = multiprocessing.Process(
-                target=cls.bulk_insert, args=(target_data, index_to_import, chunk_size)
-            )
-            proc.start()
-            procs.append(proc)
+        actions: Generator[Dict[str, Any], None, None] = ({"_index": index_to_import, "_source": x} for x in docs)
+        result: BulkInsertResult = BulkInsertResult()
+
+        start: float = time.perf_counter()
+        for is_success, item in helpers.parallel_bulk(
+            cls.get_client(),
+            actions,
+            thread_count=thread_count,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            queue_size=queue_size,
+            raise_on_error=False,
+        ):
+            if is_success:
+                result.success += 1
+                continue
+
+            result.failed += 1
+            if len(result.errors) < BULK_ERRORS_TO_KEEP:
+                result.errors.append(item)
+        result.elapsed_sec = time.perf_counter() - start
+        if refresh and result.success > 0:
+            cls.get_client().indices.refresh(index=index_to_import)
+
+        logger.info(
+            f"bulk insert finished. index: {index_to_import}, success: {result.success}, failed: {result.failed}, "
+            f"{result.docs_per_sec:,.0f} docs/sec"
+        )
+
+        if result.failed > 0:
+            logger.error(f"{result.failed} documents failed to be inserted into {index_to_import}. errors: {result.errors[:5]}")
+            if raise_on_error:
+                raise BulkInsertError(result)
 
-        return procs
+        return result
 
-    @classmethod
-    def bulk_insert(cls, data_list: List[dict], index_to_import: str, chunk_size: int = 500) -> None:
+    @staticmethod
+    def generate_docs_from_columns(columns: Dict[str, Any], block_size: int = 500) -> Generator[dict, None, None]:
+        """列ごとの配列（同じ長さ）から1件ずつドキュメントを生成する。配列でない値は全ドキュメント共通の値とする。
+        numpyの値はJSONシリアライズ時の型判定を避けるため、block_size件ごとにPythonの型に変換する。
         """
-        マルチプロセスで実行する処理。渡されたデータをもとにElasticsearchにデータ投入する。
+
+        keys: List[str] = list(columns.keys())
+        num_of_docs: int = ElasticManager._count_columnar_docs(columns)
+
+        for start in range(0, num_of_docs, block_size):
+            end: int = start + block_size
+            block: List[Iterable[Any]] = [
+                v[start:end].tolist() if isinstance(v, np.ndarray) else itertools.repeat(v) for v in columns.values()
+            ]
+            for values in zip(*block):
+                yield dict(zip(keys, values))
+
+    @staticmethod
+    def generate_docs_from_df(df: DataFrame, block_size: int = 500) -> Generator[dict, None, None]:
+        """DataFrameから1件ずつドキュメントを生成する。to_dict(orient="records")と異なり、全行分のdictを一度に生成しない。
+        日時の列はto_dictと同様にTimestampとして扱う（datetime64のままではtolist()で整数になるため）。
         """
 
-        # プロセスごとにコネクションが必要
-        # https://github.com/elastic/elasticsearch-py/issues/638
-        es = Elasticsearch(hosts=ELASTIC_URL, http_auth=(ELASTIC_USER, ELASTIC_PASSWORD), timeout=50000)
+        columns: Dict[str, Any] = {
+            str(c): df[c].astype(object).to_numpy() if df[c].dtype.kind in "mM" else df[c].to_numpy() for c in df.columns
+        }
+
+        return ElasticManager.generate_docs_from_columns(columns, block_size)
+
+    @staticmethod
+    def _count_columnar_docs(columns: Dict[str, Any]) -> int:
+        """列ごとの配列のドキュメント数"""
 
-        actions: Generator[Dict[str, Collection[Any]], None, None] = ({"_index": index_to_import, "_source": x} for x in data_list)
-        helpers.bulk(es, actions, chunk_size=chunk_size, stats_only=True, raise_on_error=False)
+        return next((len(v) for v in columns.values() if isinstance(v, np.ndarray)), 0)
 
     @classmethod
     def count(cls, index: str) -> int:
-        result: Dict[str, int] = cls.es.count(index=index)
+        result: Dict[str, int] = cls.get_client().count(index=index)
         return result["count"]
 
     @classmethod
-    def multi_process_range_scan(
-        cls,
-        index: str,
-        start_index: int,
-        num_of_data: int,
-        num_of_process: int = common.NUM_OF_PROCESS,
-    ) -> List[dict]:
-        """マルチプロセスでrange scanする。"""
-
-        logger.info(f"Data read start. data_count: {num_of_data}.")
-
-        # データをプロセッサの数に均等分配
-        data_num_by_proc: List[int] = [(num_of_data + i) // num_of_process for i in range(num_of_process)]
-
-        # マルチプロセスの結果格納用
-        manager = multiprocessing.Manager()
-        return_dict: Dict[int, List[dict]] = manager.dict()
-
-        procs: List[multiprocessing.context.Process] = []
-
-        for proc_number, data_num in enumerate(data_num_by_proc):
-            end_index: int = start_index + data_num
-
-            proc: multiprocessing.context.Process = multiprocessing.Process(
-                target=cls.range_scan,
-                args=(index, proc_number, start_index, end_index, return_dict),
-            )
-            proc.start()
-            procs.append(proc)
-
-            start_index = end_index
+    def sliced_scan(
+        cls, index: str, slice_id: int, num_of_slices: int, query: Optional[dict] = None, size: int = 10_000, scroll: str = "5m"
+    ) -> Generator[dict, None, None]:
+        """sliced scrollで、num_of_slices個に分割したうちslice_id番目のドキュメントを逐次返す。
+        各sliceは互いに重複せず、全sliceを合わせると全件となる。順序は保証しないため、必要であれば呼び出し側でソートすること。
+        """
 
-        for proc in procs:
-            proc.join()
+        body: dict = dict(query) if query is not None else {}
+        # NOTE: sliceの最大数は2以上である必要があるため、分割しない場合は指定しない
+        if num_of_slices > 1:
+            body["slice"] = {"id": slice_id, "max": num_of_slices}
 
-        # マルチプロセスの結果をマージする
-        result = []
-        for proc_number in range(num_of_process):
-            for data in return_dict[proc_number]:
-                result.append(data)
-
-        return result
+        for x in helpers.scan(client=cls.get_client(), index=index, query=body, size=size, scroll=scroll):
+            yield x["_source"]
 
     @classmethod
-    def range_scan(cls, index: str, proc_num: int, start: int, end: int, return_dict: list) -> None:
-        """データをレンジスキャンした結果を返す。
-        Pythonのrange関数に合わせ、endはひとつ前までを返す仕様とする。
+    def search_after_scan(
+        cls, index: str, query: dict, sort: List[str], source: Optional[List[str]] = None, size: int = common.ELASTIC_MAX_DOC_SIZE
+    ) -> Generator[dict, None, None]:
+        """sortで指定したフィールドの昇順にサーバー側でソートし、search_afterでページングしながらドキュメントを逐次返す。
+        sortには順序が一意に定まるフィールドの組み合わせを指定すること。sourceを指定した場合は、そのフィールドのみを取得する。
         """
 
-        # プロセスごとにコネクションが必要
-        # https://github.com/elastic/elasticsearch-py/issues/638
-        es = Elasticsearch(hosts=ELASTIC_URL, http_auth=(ELASTIC_USER, ELASTIC_PASSWORD), timeout=50000)
+        body: dict = {**query, "sort": [{field: {"order": "asc"}} for field in sort], "track_total_hits": False}
+        if source is not None:
+            body["_source"] = source
 
-        body: dict = {
-            "query": {"range": {"sequential_number": {"gte": start, "lte": end - 1}}},
-        }
+        while True:
+            hits: List[dict] = cls.get_client().search(index=index, body=body, size=size)["hits"]["hits"]
 
-        data_gen: Iterable = helpers.scan(client=es, index=index, query=body)
-        data: List[dict] = [x["_source"] for x in data_gen]
+            for hit in hits:
+                yield hit["_source"]
+
+            if len(hits) < size:
+                return
 
-        return_dict[proc_num] = data
+            body["search_after"] = hits[-1]["sort"]
 
     @classmethod
     def scan_docs(cls, index: str, query: dict, preserve_order: bool = False) -> List[dict]:
         """ドキュメントの範囲スキャン"""
 
-        es = Elasticsearch(hosts=ELASTIC_URL, http_auth=(ELASTIC_USER, ELASTIC_PASSWORD), timeout=50000)
+        es: Elasticsearch = cls.get_client()
 
         data_gen: Iterable = helpers.scan(client=es, index=index, query=query, preserve_order=preserve_order)
         data: List[dict] = [x["_source"] for x in data_gen]
@@ -393,14 +559,12 @@ class ElasticManager:
 
     @classmethod
     def df_to_els(cls, df: DataFrame, index: str, mapping: str = None, setting: str = None) -> None:
-        """DataFrameをList[dict]に変換し、指定したindex名でElasticsearchに登録する"""
+        """DataFrameを1行ずつドキュメントに変換し、指定したindex名でElasticsearchに登録する"""
 
         if not cls.exists_index(index):
             cls.create_index(index=index, mapping_file=mapping, setting_file=setting)
 
-        data_list: List[dict] = df.to_dict(orient="records")
-
-        cls.bulk_insert(data_list, index)
+        cls.bulk_insert(cls.generate_docs_from_df(df), index)
 
         logger.info(f"{index} created.")
 
@@ -413,3 +577,7 @@ class ElasticManager:
 
 if __name__ == "__main__":
     pass
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=ElasticManager._reset_clients_after_fork)
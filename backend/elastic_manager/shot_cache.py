@@ -0,0 +1,349 @@
+"""
+ ==================================
+  shot_cache.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, Final, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from backend.common import common
+from backend.common.common_logger import logger
+from pandas.core.frame import DataFrame
+
+SHOT_CACHE_ENABLED: Final[bool] = os.getenv("SHOT_CACHE_ENABLED", "true").lower() == "true"
+SHOT_CACHE_MAX_BYTES: Final[int] = int(os.getenv("SHOT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # プロセス内キャッシュの上限
+SHOT_CACHE_DISK_ENABLED: Final[bool] = os.getenv("SHOT_CACHE_DISK_ENABLED", "true").lower() == "true"
+SHOT_CACHE_DISK_MAX_BYTES: Final[int] = int(os.getenv("SHOT_CACHE_DISK_MAX_BYTES", str(10 * 1024 * 1024 * 1024)))  # ディスクキャッシュの上限
+# ディスクキャッシュが上限を超えた場合に、上限のこの割合まで削除する。書き込みのたびに削除が発生しないようにするため
+SHOT_CACHE_DISK_EVICTION_RATIO: Final[float] = 0.8
+SHOT_CACHE_DIR_NAME: Final[str] = "shot_cache"
+GENERATION_FILE_NAME: Final[str] = "generation"
+INITIAL_GENERATION: Final[str] = "0"
+# 部分取得したショットでも必ず含むフィールド
+REQUIRED_FIELDS: Final[Tuple[str, ...]] = ("shot_number", "sequential_number")
+
+
+class ShotCache:
+    """ショットデータのキャッシュ。(インデックス, ショット番号)をキーとし、ショット単位のDataFrameを保持する。
+    プロセス内ではバイト数上限付きのLRUで保持し、DATA_DIR配下にParquet形式でも保存してプロセス間で共有する。
+    ディスクキャッシュもバイト数の上限を超えた場合、インデックスをまたいで最終参照日時(mtime)の古いファイルから削除する。
+
+    キャッシュはインデックスごとの世代で管理し、インデックスの再作成やショットの削除時にinvalidate()で世代を更新する。
+    世代はDATA_DIR配下のファイルに記録するため、他プロセスで更新された場合も次回参照時に古いキャッシュは使われない。
+    """
+
+    __lock: threading.Lock = threading.Lock()
+    __entries: "OrderedDict[Tuple[str, int], Tuple[str, DataFrame, int]]" = OrderedDict()  # キー -> (世代, DataFrame, バイト数)
+    __total_bytes: int = 0
+    __local_generations: Dict[str, str] = {}  # ディスクキャッシュを使わない場合の世代
+    __hits: int = 0
+    __disk_hits: int = 0
+    __misses: int = 0
+    # ディスクキャッシュのバイト数の見積もり。他プロセスの書き込みは含まないため、上限超過時に走査して実際の値に更新する
+    __disk_bytes: Optional[int] = None
+    __disk_lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def _cache_dir() -> Optional[str]:
+        """ディスクキャッシュのディレクトリ。無効な場合はNone"""
+
+        data_dir: Optional[str] = os.getenv("DATA_DIR")
+
+        if not SHOT_CACHE_DISK_ENABLED or data_dir is None:
+            return None
+
+        return os.path.join(data_dir, SHOT_CACHE_DIR_NAME)
+
+    @classmethod
+    def _index_dir(cls, index: str) -> Optional[str]:
+        cache_dir: Optional[str] = cls._cache_dir()
+        return None if cache_dir is None else os.path.join(cache_dir, index)
+
+    @classmethod
+    def _get_generation(cls, index: str) -> str:
+        """インデックスの現在の世代"""
+
+        index_dir: Optional[str] = cls._index_dir(index)
+
+        if index_dir is None:
+            return cls.__local_generations.get(index, INITIAL_GENERATION)
+
+        try:
+            with open(os.path.join(index_dir, GENERATION_FILE_NAME)) as f:
+                return f.read().strip() or INITIAL_GENERATION
+        except FileNotFoundError:
+            return INITIAL_GENERATION
+
+    @classmethod
+    def get(cls, index: str, shot_number: int, fields: Optional[List[str]] = None) -> Optional[DataFrame]:
+        """キャッシュからショットデータを取得する。キャッシュにない場合はNoneを返す。
+        fieldsを指定した場合は、そのフィールドとショット番号、連番のみを返す。
+        """
+
+        if not SHOT_CACHE_ENABLED:
+            return None
+
+        key: Tuple[str, int] = (index, shot_number)
+        generation: str = cls._get_generation(index)
+
+        with cls.__lock:
+            entry: Optional[Tuple[str, DataFrame, int]] = cls.__entries.get(key)
+            if entry is not None and entry[0] != generation:
+                cls._remove_entry(key)
+                entry = None
+            if entry is not None:
+                cls.__entries.move_to_end(key)
+
+        df: Optional[DataFrame] = entry[1] if entry is not None else None
+        is_disk_hit: bool = False
+
+        if df is None:
+            df = cls._read_from_disk(index, generation, shot_number)
+            if df is not None:
+                is_disk_hit = True
+                cls._put_memory(key, generation, df)
+
+        selected: Optional[DataFrame] = None if df is None else cls._select_fields(df, fields)
+
+        with cls.__lock:
+            if selected is None:
+                cls.__misses += 1
+            elif is_disk_hit:
+                cls.__disk_hits += 1
+            else:
+                cls.__hits += 1
+
+        return selected
+
+    @classmethod
+    def put(cls, index: str, shot_number: int, df: DataFrame, generation: Optional[str] = None) -> None:
+        """ショットデータをキャッシュする。切り出しが完了したショットの、全フィールド、全サンプルを取得したもののみを対象とすること。
+        generationには取得前の世代を指定する。取得中に世代が更新された場合、古いデータはキャッシュしない。
+        """
+
+        if not SHOT_CACHE_ENABLED or len(df) == 0:
+            return
+
+        current_generation: str = cls._get_generation(index)
+        if generation is not None and generation != current_generation:
+            return
+
+        # 呼び出し側での変更がキャッシュに影響しないようコピーを保持する
+        df = df.copy()
+        cls._put_memory((index, shot_number), current_generation, df)
+        cls._write_to_disk(index, current_generation, shot_number, df)
+
+    @classmethod
+    def generation(cls, index: str) -> str:
+        """インデックスの現在の世代。putに渡すため、データ取得前に参照する"""
+
+        return cls._get_generation(index)
+
+    @classmethod
+    def invalidate(cls, index: str) -> None:
+        """インデックスのキャッシュを無効化する。世代を更新し、プロセス内とディスクのキャッシュを削除する"""
+
+        new_generation: str = uuid.uuid4().hex
+
+        with cls.__lock:
+            cls.__local_generations[index] = new_generation
+            for key in [k for k in cls.__entries if k[0] == index]:
+                cls._remove_entry(key)
+
+        index_dir: Optional[str] = cls._index_dir(index)
+        if index_dir is None:
+            return
+
+        # 世代ファイルを置き換えてから、古い世代のファイルを削除する
+        try:
+            os.makedirs(index_dir, exist_ok=True)
+            tmp_file: str = os.path.join(index_dir, f".{GENERATION_FILE_NAME}.{new_generation}")
+            with open(tmp_file, "w") as f:
+                f.write(new_generation)
+            os.replace(tmp_file, os.path.join(index_dir, GENERATION_FILE_NAME))
+        except OSError as e:
+            logger.error(f"failed to invalidate shot cache of {index}. {e}")
+            return
+
+        for entry in os.scandir(index_dir):
+            if entry.is_dir() and entry.name != new_generation:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+        with cls.__disk_lock:
+            cls.__disk_bytes = None
+
+        logger.debug(f"shot cache of {index} invalidated.")
+
+    @classmethod
+    def clear(cls) -> None:
+        """プロセス内のキャッシュと統計を初期化する"""
+
+        with cls.__lock:
+            cls.__entries.clear()
+            cls.__total_bytes = 0
+            cls.__local_generations.clear()
+            cls.__hits = cls.__disk_hits = cls.__misses = 0
+
+        with cls.__disk_lock:
+            cls.__disk_bytes = None
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """キャッシュのヒット数、ディスクキャッシュのヒット数、ミス数、プロセス内キャッシュのエントリ数とバイト数"""
+
+        with cls.__lock:
+            return {
+                "hits": cls.__hits,
+                "disk_hits": cls.__disk_hits,
+                "misses": cls.__misses,
+                "entries": len(cls.__entries),
+                "bytes": cls.__total_bytes,
+            }
+
+    @staticmethod
+    def _select_fields(df: DataFrame, fields: Optional[List[str]]) -> Optional[DataFrame]:
+        """指定フィールドを抽出したコピーを返す。キャッシュに指定フィールドがない場合はNone"""
+
+        if fields is None:
+            return df.copy()
+
+        targets = set(REQUIRED_FIELDS) | set(fields)
+        if not targets.issubset(df.columns):
+            return None
+
+        return df[[c for c in df.columns if c in targets]].copy()
+
+    @classmethod
+    def _put_memory(cls, key: Tuple[str, int], generation: str, df: DataFrame) -> None:
+        """プロセス内キャッシュに追加し、上限を超えた分を古い順に破棄する"""
+
+        num_of_bytes: int = int(df.memory_usage(deep=True).sum())
+
+        if num_of_bytes > SHOT_CACHE_MAX_BYTES:
+            return
+
+        with cls.__lock:
+            if key in cls.__entries:
+                cls._remove_entry(key)
+
+            cls.__entries[key] = (generation, df, num_of_bytes)
+            cls.__total_bytes += num_of_bytes
+
+            while cls.__total_bytes > SHOT_CACHE_MAX_BYTES:
+                cls._remove_entry(next(iter(cls.__entries)))
+
+    @classmethod
+    def _remove_entry(cls, key: Tuple[str, int]) -> None:
+        """プロセス内キャッシュから削除する。ロックを取得した状態で呼び出すこと"""
+
+        _, _, num_of_bytes = cls.__entries.pop(key)
+        cls.__total_bytes -= num_of_bytes
+
+    @classmethod
+    def _shot_file(cls, index: str, generation: str, shot_number: int) -> Optional[str]:
+        index_dir: Optional[str] = cls._index_dir(index)
+        return None if index_dir is None else os.path.join(index_dir, generation, f"{shot_number}.parquet")
+
+    @classmethod
+    def _read_from_disk(cls, index: str, generation: str, shot_number: int) -> Optional[DataFrame]:
+        file_path: Optional[str] = cls._shot_file(index, generation, shot_number)
+
+        if file_path is None or not os.path.exists(file_path):
+            return None
+
+        try:
+            df: DataFrame = common.arrow_table_to_df(pq.read_table(file_path))
+            # 上限超過時に最近参照したファイルを残すよう、最終参照日時を更新する
+            os.utime(file_path)
+            return df
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"failed to read shot cache: {file_path}. {e}")
+            return None
+
+    @classmethod
+    def _write_to_disk(cls, index: str, generation: str, shot_number: int, df: DataFrame) -> None:
+        """ディスクキャッシュに保存する。書き込み途中のファイルを読まないよう、一時ファイルに書き込んでから置き換える"""
+
+        file_path: Optional[str] = cls._shot_file(index, generation, shot_number)
+
+        if file_path is None:
+            return
+
+        tmp_file: str = f"{file_path}.{uuid.uuid4().hex}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_file)
+            os.replace(tmp_file, file_path)
+            cls._add_disk_bytes(os.path.getsize(file_path))
+        except (OSError, pa.ArrowException) as e:
+            logger.warning(f"failed to write shot cache: {file_path}. {e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    @classmethod
+    def _add_disk_bytes(cls, num_of_bytes: int) -> None:
+        """ディスクキャッシュのバイト数に加算し、上限を超えた場合は古いファイルから削除する"""
+
+        cache_dir: Optional[str] = cls._cache_dir()
+        if cache_dir is None:
+            return
+
+        with cls.__disk_lock:
+            if cls.__disk_bytes is None:
+                cls.__disk_bytes = sum(size for _, size, _ in cls._list_disk_files(cache_dir))
+            else:
+                cls.__disk_bytes += num_of_bytes
+
+            if cls.__disk_bytes > SHOT_CACHE_DISK_MAX_BYTES:
+                cls.__disk_bytes = cls._evict_disk(cache_dir, int(SHOT_CACHE_DISK_MAX_BYTES * SHOT_CACHE_DISK_EVICTION_RATIO))
+
+    @staticmethod
+    def _list_disk_files(cache_dir: str) -> List[Tuple[float, int, str]]:
+        """ディスクキャッシュのファイルの(最終参照日時, バイト数, パス)のリスト"""
+
+        files: List[Tuple[float, int, str]] = []
+        for dir_path, _, file_names in os.walk(cache_dir):
+            for file_name in file_names:
+                if not file_name.endswith(".parquet"):
+                    continue
+                file_path: str = os.path.join(dir_path, file_name)
+                try:
+                    stat: os.stat_result = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file_path))
+
+        return files
+
+    @classmethod
+    def _evict_disk(cls, cache_dir: str, target_bytes: int) -> int:
+        """最終参照日時の古いファイルから、合計がtarget_bytes以下になるまで削除し、削除後のバイト数を返す"""
+
+        files: List[Tuple[float, int, str]] = sorted(cls._list_disk_files(cache_dir))
+        total_bytes: int = sum(size for _, size, _ in files)
+
+        for _, size, file_path in files:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+        logger.debug(f"shot cache on disk evicted. {total_bytes} bytes remain.")
+
+        return total_bytes
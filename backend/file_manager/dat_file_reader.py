@@ -0,0 +1,60 @@
+"""
+ ==================================
+  dat_file_reader.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import itertools
+import os
+from typing import Final, List, Optional
+
+import numpy as np
+
+BYTE_SIZE: Final[int] = 8
+
+
+class DatFileReader:
+    """datファイル(float64固定長の行)をメモリマップし、範囲指定・間引きで読み込む。
+    読み込んだ行のみがコピーされるため、ファイル全体をデシリアライズする必要がない。
+    """
+
+    def __init__(self, file_path: str, num_of_channels: int):
+        self.file_path: str = file_path
+        self.num_of_channels: int = num_of_channels
+        self.num_of_samples: int = DatFileReader.count_samples(file_path, num_of_channels)
+
+    @staticmethod
+    def count_samples(file_path: str, num_of_channels: int) -> int:
+        """ファイルサイズからサンプル数を求める。末尾の不完全な行は含めない"""
+
+        return os.path.getsize(file_path) // (BYTE_SIZE * num_of_channels)
+
+    @staticmethod
+    def count_preceding_samples(file_paths: List[str], num_of_channels: int) -> List[int]:
+        """各ファイルの先頭サンプルの連番（それ以前のファイルのサンプル数の累計）を返す"""
+
+        counts: List[int] = [DatFileReader.count_samples(f, num_of_channels) for f in file_paths]
+
+        return list(itertools.accumulate(counts[:-1], initial=0)) if len(counts) else []
+
+    def read(self, offset: int = 0, limit: Optional[int] = None, stride: int = 1) -> np.ndarray:
+        """offset行目からstride行ごとに最大limit行を読み込み、(行数, チャネル数)の配列で返す"""
+
+        if offset < 0 or stride < 1:
+            raise ValueError(f"Invalid range. offset: {offset}, stride: {stride}")
+
+        if offset >= self.num_of_samples:
+            return np.empty((0, self.num_of_channels), dtype=np.float64)
+
+        stop: int = self.num_of_samples if limit is None else min(self.num_of_samples, offset + limit * stride)
+
+        mm: np.memmap = np.memmap(self.file_path, dtype="<f8", mode="r", shape=(self.num_of_samples, self.num_of_channels))
+        rows: np.ndarray = np.array(mm[offset:stop:stride], dtype=np.float64)
+        del mm
+
+        return rows
@@ -2,13 +2,18 @@ import dataclasses
 import glob
 import os
 import re
+from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List
+from typing import Dict, Final, List, Optional, Tuple, Union
 
 import pandas as pd
+import pyarrow.parquet as pq
 from backend.common.common_logger import uvicorn_logger as logger
 from pandas.core.frame import DataFrame
 
+# 生データファイルの拡張子。同名のファイルが複数形式で存在する場合は先頭の形式を優先する。
+RAWDATA_EXTENSIONS: Final[Tuple[str, ...]] = ("parquet", "pkl")
+
 
 @dataclasses.dataclass
 class FileInfo:
@@ -20,6 +25,69 @@ class FileInfo:
     timestamp: float
 
 
+class RawdataStorage(ABC):
+    """生データファイルの入出力。保存形式ごとに派生クラスで実装する"""
+
+    extension: str = ""
+
+    @abstractmethod
+    def write(self, df: DataFrame, file_path: str) -> None:
+        pass
+
+    @abstractmethod
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> DataFrame:
+        pass
+
+
+class PickleStorage(RawdataStorage):
+    """pickle形式。既存データ読み込みのために残している"""
+
+    extension = "pkl"
+
+    def write(self, df: DataFrame, file_path: str) -> None:
+        df.to_pickle(file_path)
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> DataFrame:
+        # NOTE: pickleは列単位で読み込めないため、全体を読み込んでから列を絞る
+        df: DataFrame = pd.read_pickle(file_path)
+
+        if columns is None:
+            return df
+
+        return df[[c for c in columns if c in df.columns]]
+
+
+class ParquetStorage(RawdataStorage):
+    """列指向の圧縮形式(parquet)。列の型を固定して出力し、必要な列のみ読み込める"""
+
+    extension = "parquet"
+
+    def __init__(self, sensor_dtype: str = "float64", compression: str = "zstd"):
+        self.sensor_dtype: str = sensor_dtype
+        self.compression: str = compression
+
+    def _to_typed_df(self, df: DataFrame) -> DataFrame:
+        """連番はint64、時刻はfloat64(UNIXTIME)、センサー値はsensor_dtypeに型を揃える"""
+
+        dtypes: Dict[str, str] = {c: self.sensor_dtype for c in df.columns}
+        if "sequential_number" in dtypes:
+            dtypes["sequential_number"] = "int64"
+        if "timestamp" in dtypes:
+            dtypes["timestamp"] = "float64"
+
+        return df.astype(dtypes)
+
+    def write(self, df: DataFrame, file_path: str) -> None:
+        self._to_typed_df(df).to_parquet(file_path, index=False, compression=self.compression)
+
+    def read(self, file_path: str, columns: Optional[List[str]] = None) -> DataFrame:
+        if columns is not None:
+            names: List[str] = pq.read_schema(file_path).names
+            columns = [c for c in columns if c in names]
+
+        return pd.read_parquet(file_path, columns=columns)
+
+
 class FileManager:
     @staticmethod
     def create_files_info(target_dir: str, machine_id: str, gateway_id: str, handler_id: str, extension: str) -> List[FileInfo]:
@@ -27,10 +95,16 @@ class FileManager:
 
         file_list: List[str] = glob.glob(os.path.join(target_dir, f"{machine_id}_{gateway_id}_{handler_id}_*.{extension}"))
 
+        return FileManager.create_files_info_by_paths(file_list)
+
+    @staticmethod
+    def create_files_info_by_paths(file_list: List[str]) -> List[FileInfo]:
+        """ファイルパスリストから、ファイルの情報（パスとファイル名から抽出した日時）リストをパス順に生成"""
+
         if len(file_list) == 0:
             return []
 
-        file_list.sort()
+        file_list = sorted(file_list)
 
         # ファイルリストから時刻データを生成
         files_timestamp: map[float] = map(FileManager._create_file_timestamp, file_list)
@@ -63,7 +137,13 @@ class FileManager:
         data_dir: str = os.environ["DATA_DIR"]
         data_full_path: str = os.path.join(data_dir, target_dir)
 
-        files_info: List[FileInfo] = FileManager.create_files_info(data_full_path, machine_id, gateway_id, handler_id, "pkl")
+        files_info: List[FileInfo] = []
+        for extension in RAWDATA_EXTENSIONS:
+            files_info.extend(FileManager.create_files_info(data_full_path, machine_id, gateway_id, handler_id, extension))
+
+        files_info.sort(key=lambda x: x.file_path)
+        target_files: List[str] = FileManager._exclude_duplicated_rawdata_files([x.file_path for x in files_info])
+        files_info = [x for x in files_info if x.file_path in target_files]
 
         return files_info
 
@@ -95,14 +175,66 @@ class FileManager:
         return list(filter(lambda x: (x.timestamp < start_time or x.timestamp > end_time), files_info))
 
     @staticmethod
-    def export_to_pickle(samples: List[dict], file: FileInfo, processed_dir_path: str) -> None:
-        """サンプリングデータをpickleファイルに出力する"""
+    def get_rawdata_storage(extension: Optional[str] = None) -> RawdataStorage:
+        """拡張子に対応するストレージを返す。拡張子未指定の場合は環境変数RAWDATA_STORAGEの形式（既定はparquet）"""
 
-        df: DataFrame = pd.DataFrame(samples)
+        if extension is None:
+            extension = os.environ.get("RAWDATA_STORAGE", ParquetStorage.extension)
 
-        pickle_filename: str = os.path.splitext(os.path.basename(file.file_path))[0]
-        pickle_filepath: str = os.path.join(processed_dir_path, pickle_filename) + ".pkl"
-        df.to_pickle(pickle_filepath)
+        if extension == PickleStorage.extension:
+            return PickleStorage()
+
+        if extension == ParquetStorage.extension:
+            return ParquetStorage(sensor_dtype=os.environ.get("RAWDATA_SENSOR_DTYPE", "float64"))
+
+        raise ValueError(f"Unsupported rawdata storage: {extension}")
+
+    @staticmethod
+    def export_rawdata(samples: Union[List[dict], DataFrame], file: FileInfo, processed_dir_path: str) -> str:
+        """サンプリングデータを環境変数RAWDATA_STORAGEの形式で出力し、出力先のパスを返す"""
+
+        df: DataFrame = samples if isinstance(samples, DataFrame) else pd.DataFrame(samples)
+        storage: RawdataStorage = FileManager.get_rawdata_storage()
+
+        filename: str = os.path.splitext(os.path.basename(file.file_path))[0]
+        filepath: str = os.path.join(processed_dir_path, filename) + "." + storage.extension
+        storage.write(df, filepath)
+
+        return filepath
+
+    @staticmethod
+    def read_rawdata(file_path: str, columns: Optional[List[str]] = None) -> DataFrame:
+        """拡張子に応じた形式で生データファイルを読み込む。columns指定時は存在する列のみ読み込む"""
+
+        extension: str = os.path.splitext(file_path)[1].lstrip(".")
+        storage: RawdataStorage = FileManager.get_rawdata_storage(extension)
+
+        return storage.read(file_path, columns)
+
+    @staticmethod
+    def get_rawdata_files(dir_path: str, machine_id: str) -> List[str]:
+        """指定したディレクトリから、対象機器の生データファイル名リスト(pkl/parquet)を取得する"""
+
+        files: List[str] = []
+        for extension in RAWDATA_EXTENSIONS:
+            files.extend(glob.glob(os.path.join(dir_path, f"{machine_id}_*.{extension}")))
+
+        files.sort()
+
+        return FileManager._exclude_duplicated_rawdata_files(files)
+
+    @staticmethod
+    def _exclude_duplicated_rawdata_files(files: List[str]) -> List[str]:
+        """同名で複数形式のファイルが存在する場合、RAWDATA_EXTENSIONSで先に定義された形式のみ残す"""
+
+        selected: Dict[str, Tuple[int, int]] = {}
+        for i, file in enumerate(files):
+            stem, extension = os.path.splitext(file)
+            priority: int = RAWDATA_EXTENSIONS.index(extension.lstrip("."))
+            if stem not in selected or priority < selected[stem][0]:
+                selected[stem] = (priority, i)
+
+        return [files[i] for i in sorted(i for _, i in selected.values())]
 
     @staticmethod
     def df_to_pickle(df: DataFrame, file: str, dir_path: str) -> None:
@@ -0,0 +1,254 @@
+"""
+ ==================================
+  file_watcher.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import fnmatch
+import os
+import queue
+import threading
+import time
+from typing import Dict, Final, Iterable, List, Optional, Set, Tuple
+
+from backend.common.common_logger import logger
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import BaseObserver
+from watchdog.observers.polling import PollingObserver
+
+# 書き込み完了とみなすまでにファイルサイズが変化しない時間(秒)
+STABLE_SECONDS: Final[float] = 0.5
+# ポーリング監視の間隔(秒)
+POLLING_INTERVAL: Final[float] = 0.5
+
+
+class FileWatcher(FileSystemEventHandler):
+    """ディレクトリを監視し、書き込みが完了したファイルのパスをキューに1度だけ渡す。
+    * inotify(watchdog)のclose_write、rename(移動先)イベントで完了したファイルは即時に渡す
+    * 作成、更新イベントのみのファイル(ポーリング監視、ネットワークドライブなど)はサイズが一定時間変化しないことで完了を判定する
+    * 監視開始時に存在するファイルもサイズ安定確認の対象とする
+    * state_path指定時は処理済みファイル名を永続化し、再起動後も処理済みファイルは対象外とする
+    inotifyが使えない環境では、ポーリング監視にフォールバックする。環境変数FILE_WATCHER_POLLING=1でポーリング監視を強制する。
+    """
+
+    def __init__(
+        self,
+        dir_path: str,
+        patterns: Iterable[str],
+        state_path: Optional[str] = None,
+        stable_seconds: float = STABLE_SECONDS,
+        use_polling: Optional[bool] = None,
+    ):
+        self.__dir_path: str = os.path.abspath(dir_path)
+        self.__patterns: Tuple[str, ...] = tuple(patterns)
+        self.__state_path: Optional[str] = state_path
+        self.__stable_seconds: float = stable_seconds
+        self.__use_polling: bool = os.environ.get("FILE_WATCHER_POLLING") == "1" if use_polling is None else use_polling
+
+        self.__queue: "queue.Queue[str]" = queue.Queue()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__seen: Set[str] = set()  # キューに渡したファイル名
+        self.__processed: Set[str] = self._load_state()  # 処理済みファイル名
+        self.__pending: Dict[str, Tuple[int, float]] = {}  # 完了待ちファイルパス -> (サイズ, サイズ変化を確認した時刻)
+
+        self.__observer: Optional[BaseObserver] = None
+        self.__stopped: threading.Event = threading.Event()
+        self.__checker: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "FileWatcher":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> "FileWatcher":
+        """監視を開始する。監視開始前に存在するファイルもサイズ安定確認の対象とする"""
+
+        self.__observer = self._start_observer()
+
+        for file_name in sorted(os.listdir(self.__dir_path)):
+            self._add_pending(os.path.join(self.__dir_path, file_name))
+
+        self.__stopped.clear()
+        self.__checker = threading.Thread(target=self._check_pending_loop, daemon=True)
+        self.__checker.start()
+
+        return self
+
+    def stop(self) -> None:
+        """監視を停止する"""
+
+        self.__stopped.set()
+        if self.__checker is not None:
+            self.__checker.join()
+            self.__checker = None
+        if self.__observer is not None:
+            self.__observer.stop()
+            self.__observer.join()
+            self.__observer = None
+
+    def _start_observer(self) -> BaseObserver:
+        if not self.__use_polling:
+            observer: BaseObserver = Observer()
+            observer.schedule(self, self.__dir_path, recursive=False)
+            try:
+                observer.start()
+                return observer
+            except OSError:
+                # inotifyの監視数上限などで開始できない場合
+                logger.warning(f"inotify is not available, fall back to polling. dir: {self.__dir_path}")
+
+        observer = PollingObserver(timeout=POLLING_INTERVAL)
+        observer.schedule(self, self.__dir_path, recursive=False)
+        observer.start()
+
+        return observer
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """完了したファイルのパスを1件取得する。timeout秒以内に完了したファイルがなければNone"""
+
+        try:
+            return self.__queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_batch(self, timeout: Optional[float] = None) -> List[str]:
+        """完了したファイルのパスをまとめて取得する。1件目をtimeout秒まで待ち、以降はキューにあるものをすべて取得する。
+        ファイル名は時刻とファイル番号を含むため、パス順に並べて返す。
+        """
+
+        first: Optional[str] = self.get(timeout)
+        if first is None:
+            return []
+
+        files: List[str] = [first]
+        while True:
+            file_path: Optional[str] = self.get(timeout=0)
+            if file_path is None:
+                break
+            files.append(file_path)
+
+        return sorted(files)
+
+    def mark_processed(self, file_paths: Iterable[str]) -> None:
+        """ファイルを処理済みとする。state_path指定時は処理済みファイル名を追記する"""
+
+        file_names: List[str] = [os.path.basename(f) for f in file_paths]
+        with self.__lock:
+            self.__processed.update(file_names)
+
+        if self.__state_path is None or len(file_names) == 0:
+            return
+
+        with open(self.__state_path, "a") as f:
+            f.write("".join(f"{file_name}\n" for file_name in file_names))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load_state(self) -> Set[str]:
+        """永続化した処理済みファイル名"""
+
+        if self.__state_path is None or not os.path.exists(self.__state_path):
+            return set()
+
+        with open(self.__state_path) as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def _is_target(self, file_path: str) -> bool:
+        if os.path.dirname(os.path.abspath(file_path)) != self.__dir_path:
+            return False
+
+        file_name: str = os.path.basename(file_path)
+        return any(fnmatch.fnmatch(file_name, pattern) for pattern in self.__patterns)
+
+    def _add_pending(self, file_path: str) -> None:
+        """サイズ安定確認の対象に追加する"""
+
+        if not self._is_target(file_path):
+            return
+
+        file_name: str = os.path.basename(file_path)
+        with self.__lock:
+            if file_name in self.__seen or file_name in self.__processed:
+                return
+            self.__pending.setdefault(file_path, (-1, time.monotonic()))
+
+    def _put(self, file_path: str) -> None:
+        """キューに渡す。既に渡したファイルおよび処理済みファイルは対象外"""
+
+        if not self._is_target(file_path):
+            return
+
+        file_name: str = os.path.basename(file_path)
+        with self.__lock:
+            self.__pending.pop(file_path, None)
+            if file_name in self.__seen or file_name in self.__processed:
+                return
+            self.__seen.add(file_name)
+
+        self.__queue.put(file_path)
+
+    def _discard(self, file_path: str) -> None:
+        """監視ディレクトリから削除、移動されたファイルを管理対象から外す"""
+
+        with self.__lock:
+            self.__pending.pop(file_path, None)
+            self.__seen.discard(os.path.basename(file_path))
+
+    def _check_pending(self) -> None:
+        """サイズが一定時間変化していない完了待ちファイルをキューに渡す"""
+
+        now: float = time.monotonic()
+        with self.__lock:
+            pending: List[Tuple[str, Tuple[int, float]]] = list(self.__pending.items())
+
+        completed: List[str] = []
+        for file_path, (size, changed_at) in pending:
+            try:
+                current_size: int = os.stat(file_path).st_size
+            except FileNotFoundError:
+                self._discard(file_path)
+                continue
+
+            if current_size != size:
+                with self.__lock:
+                    if file_path in self.__pending:
+                        self.__pending[file_path] = (current_size, now)
+            elif now - changed_at >= self.__stable_seconds:
+                completed.append(file_path)
+
+        for file_path in sorted(completed):
+            self._put(file_path)
+
+    def _check_pending_loop(self) -> None:
+        while not self.__stopped.wait(self.__stable_seconds / 4):
+            self._check_pending()
+
+    def on_created(self, event: FileSystemEvent) -> None:
+        if not event.is_directory:
+            self._add_pending(str(event.src_path))
+
+    def on_modified(self, event: FileSystemEvent) -> None:
+        if not event.is_directory:
+            self._add_pending(str(event.src_path))
+
+    def on_closed(self, event: FileSystemEvent) -> None:
+        # 書き込みモードで開いたファイルが閉じられた(close_write)
+        if not event.is_directory:
+            self._put(str(event.src_path))
+
+    def on_moved(self, event: FileSystemEvent) -> None:
+        # 一時ファイルからのrenameは書き込み完了とみなす
+        if not event.is_directory:
+            self._discard(str(event.src_path))
+            self._put(str(event.dest_path))
+
+    def on_deleted(self, event: FileSystemEvent) -> None:
+        if not event.is_directory:
+            self._discard(str(event.src_path))
@@ -0,0 +1,141 @@
+"""
+ ==================================
+  rawdata_merger.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from backend.common.common_logger import logger
+from backend.file_manager.file_manager import FileManager
+from backend.file_manager.rawdata_stream import RawdataBlock
+from pandas.core.frame import DataFrame
+
+
+class RawdataMerger:
+    """ハンドラーごとに出力された生データを、時刻で揃えて1つの横長のデータに結合する。
+    * 代表ハンドラーのファイル(ファイル番号)ごとに、同じ時刻範囲の他ハンドラーのデータを結合したブロックを返す
+    * 他ハンドラーのデータが代表ハンドラーのファイル末尾の時刻に達するまで、そのファイルのブロックは保留する
+    * 他ハンドラーのサンプルは、代表ハンドラーの各サンプルに最も近い時刻のものを対応させる
+    * ファイルの読み込みはハンドラーをまたいでスレッドで並行に行う
+    連番と時刻は代表ハンドラーのものを使う。
+
+    ハンドラーはファイル名({machine_id}_{gateway_id}_{handler_id}_...)の"{gateway_id}_{handler_id}"で識別する。
+    """
+
+    def __init__(
+        self,
+        handler_keys: List[str],
+        main_handler_key: str,
+        read_rawdata_file: Callable[[str], DataFrame] = FileManager.read_rawdata,
+        num_of_threads: Optional[int] = None,
+    ):
+        if main_handler_key not in handler_keys:
+            raise ValueError(f"main handler: {main_handler_key} is not in handlers: {handler_keys}")
+
+        self.__main_handler_key: str = main_handler_key
+        self.__sub_handler_keys: List[str] = [k for k in handler_keys if k != main_handler_key]
+        self.__read_rawdata_file: Callable[[str], DataFrame] = read_rawdata_file
+        self.__num_of_threads: int = len(handler_keys) if num_of_threads is None else num_of_threads
+        # 結合待ちの代表ハンドラーのブロック(ファイル名順)
+        self.__main_blocks: List[RawdataBlock] = []
+        # 結合待ちの他ハンドラーのデータ
+        self.__sub_buffers: Dict[str, List[DataFrame]] = {k: [] for k in self.__sub_handler_keys}
+
+    @staticmethod
+    def handler_key(file_name: str) -> str:
+        """ファイル名からハンドラーを識別するキー({gateway_id}_{handler_id})を取得する"""
+
+        parts: List[str] = os.path.basename(file_name).split("_")
+        return f"{parts[1]}_{parts[2]}"
+
+    def add(self, items: Iterable[Union[RawdataBlock, str]]) -> List[RawdataBlock]:
+        """生データファイルまたはブロックを追加し、結合できたブロックを返す"""
+
+        blocks: List[RawdataBlock] = self._read(sorted(items, key=lambda x: x.file_name if isinstance(x, RawdataBlock) else x))
+
+        for block in blocks:
+            key: str = self.handler_key(block.file_name)
+            if key == self.__main_handler_key:
+                self.__main_blocks.append(block)
+            elif key in self.__sub_buffers:
+                self.__sub_buffers[key].append(block.df)
+            else:
+                logger.warning(f"Not target handler's rawdata was ignored. {block.file_name}")
+
+        return self._merge_ready()
+
+    def flush(self) -> List[RawdataBlock]:
+        """保留中のブロックを、他ハンドラーのデータが揃っていなくても結合して返す。データ収集終了時に使う"""
+
+        merged: List[RawdataBlock] = [self._merge(block) for block in self.__main_blocks]
+        self.__main_blocks = []
+        self.__sub_buffers = {k: [] for k in self.__sub_handler_keys}
+
+        return merged
+
+    def _read(self, items: List[Union[RawdataBlock, str]]) -> List[RawdataBlock]:
+        """ファイルはスレッドで並行に読み込み、ブロックにする"""
+
+        files: List[str] = [item for item in items if isinstance(item, str)]
+        with ThreadPoolExecutor(max_workers=max(self.__num_of_threads, 1)) as executor:
+            dfs: Dict[str, DataFrame] = dict(zip(files, executor.map(self.__read_rawdata_file, files)))
+
+        return [item if isinstance(item, RawdataBlock) else RawdataBlock(file_name=os.path.basename(item), df=dfs[item]) for item in items]
+
+    def _merge_ready(self) -> List[RawdataBlock]:
+        """他ハンドラーのデータがファイル末尾の時刻まで揃った代表ハンドラーのブロックを結合する"""
+
+        merged: List[RawdataBlock] = []
+        while len(self.__main_blocks) > 0:
+            block: RawdataBlock = self.__main_blocks[0]
+            if len(block.df) > 0 and not all(self._last_timestamp(k) >= block.df["timestamp"].iloc[-1] for k in self.__sub_handler_keys):
+                break
+            merged.append(self._merge(self.__main_blocks.pop(0)))
+
+        return merged
+
+    def _last_timestamp(self, key: str) -> float:
+        buffer: List[DataFrame] = [df for df in self.__sub_buffers[key] if len(df) > 0]
+        return float(buffer[-1]["timestamp"].iloc[-1]) if len(buffer) > 0 else float("-inf")
+
+    @staticmethod
+    def _sampling_interval(df: DataFrame) -> float:
+        """サンプリング間隔(秒)。1サンプル以下の場合は0"""
+
+        return float(np.median(np.diff(df["timestamp"].to_numpy()))) if len(df) > 1 else 0.0
+
+    def _merge(self, block: RawdataBlock) -> RawdataBlock:
+        """代表ハンドラーのブロックに、同じ時刻範囲の他ハンドラーのデータを結合する。結合したデータはバッファから除く"""
+
+        merged_df: DataFrame = block.df.reset_index(drop=True)
+        if len(merged_df) == 0:
+            return RawdataBlock(file_name=block.file_name, df=merged_df)
+
+        # NOTE: 従来のpkl形式の時刻はDecimalのため、時刻での対応付けのためにfloat64(UNIXTIME)に揃える
+        merged_df = merged_df.astype({"timestamp": "float64"})
+
+        last_timestamp: float = merged_df["timestamp"].iloc[-1]
+        for key in self.__sub_handler_keys:
+            buffer: List[DataFrame] = [df for df in self.__sub_buffers[key] if len(df) > 0]
+            sub_df: DataFrame = pd.concat(buffer, ignore_index=True) if len(buffer) > 0 else pd.DataFrame({"timestamp": []})
+
+            # 次のファイルの先頭サンプルとの対応付けに使うため、末尾の時刻以降のデータは残す
+            self.__sub_buffers[key] = [sub_df[sub_df["timestamp"] > last_timestamp]]
+
+            columns: List[str] = [c for c in sub_df.columns if c not in merged_df.columns or c == "timestamp"]
+            sub_df = sub_df[columns].astype({"timestamp": "float64"})
+            # 他ハンドラーのデータがない時刻に、離れた時刻のサンプルを対応させないよう、サンプリング間隔の半分以内に限定する
+            tolerance: float = max(self._sampling_interval(merged_df), self._sampling_interval(sub_df)) / 2
+            merged_df = pd.merge_asof(merged_df, sub_df, on="timestamp", direction="nearest", tolerance=tolerance)
+
+        return RawdataBlock(file_name=block.file_name, df=merged_df)
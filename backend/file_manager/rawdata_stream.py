@@ -0,0 +1,178 @@
+"""
+ ==================================
+  rawdata_stream.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import dataclasses
+import os
+from typing import Any, Dict, Final, Iterable, List, Optional, Set, Tuple, Union
+
+import pyarrow as pa
+import redis
+from backend.common.common_logger import logger
+from backend.file_manager.file_manager import FileManager
+from pandas.core.frame import DataFrame
+
+# ストリームに保持するブロック(ファイル)数の上限。超えた分は古いものから削除される
+STREAM_MAXLEN: Final[int] = 1_000
+# 最後の書き込みからストリームを削除するまでの時間(秒)
+STREAM_EXPIRE_SECONDS: Final[int] = 24 * 60 * 60
+
+
+@dataclasses.dataclass
+class RawdataBlock:
+    """ストリームで受け渡す、生データファイル1つ分の列指向データ"""
+
+    __slots__ = (
+        "file_name",
+        "df",
+    )
+    file_name: str  # 同じ内容を出力した生データファイル名
+    df: DataFrame
+
+
+class RawdataStream:
+    """データ記録からショット切り出しへ、デコード済みの生データをRedis Streamsで受け渡す。
+    データ記録はファイル出力後にブロックを追加し、ショット切り出しはファイルを読み込まずにブロックを受け取る。
+    生データファイルは従来通り出力するため、再処理はファイルから行える。
+
+    受け取り側はFileWatcherと同じget_batch/mark_processedで利用できる。
+    受け取る前に上限超過で削除されたブロックがある場合は、ディレクトリ内の未処理ファイルのパスを返す。
+    """
+
+    def __init__(self, client: redis.Redis, processed_dir_path: str, machine_id: str, maxlen: int = STREAM_MAXLEN):
+        self.__client: redis.Redis = client
+        self.__processed_dir_path: str = processed_dir_path
+        self.__machine_id: str = machine_id
+        self.__maxlen: int = maxlen
+        # 収集ごとに退避ディレクトリ({machine_id}_{yyyyMMddhhmmss})が異なるため、ディレクトリ名をキーとする
+        self.__key: str = f"rawdata-stream-{os.path.basename(os.path.normpath(processed_dir_path))}"
+        self.__last_id: str = "0-0"  # 受け取った最後のブロックのID
+        self.__delivered: Set[str] = set()  # 受け渡したファイル名
+        self.__processed: Set[str] = set()  # 処理済みファイル名
+
+    @classmethod
+    def from_env(cls, processed_dir_path: str, machine_id: str) -> Optional["RawdataStream"]:
+        """環境変数RAWDATA_STREAM_URL(例: redis://redis:6379/1)のRedisに接続する。未設定の場合はNone(ストリームを使わない)"""
+
+        url: Optional[str] = os.environ.get("RAWDATA_STREAM_URL")
+        if not url:
+            return None
+
+        return cls(redis.Redis.from_url(url), processed_dir_path, machine_id)
+
+    def __enter__(self) -> "RawdataStream":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.__client.close()
+
+    @property
+    def key(self) -> str:
+        return self.__key
+
+    @staticmethod
+    def serialize(df: DataFrame) -> bytes:
+        """DataFrameをArrow IPC形式にする。時刻は生データファイル(parquet)と同じくfloat64(UNIXTIME)とする"""
+
+        if "timestamp" in df.columns:
+            df = df.astype({"timestamp": "float64"})
+
+        table: pa.Table = pa.Table.from_pandas(df, preserve_index=False)
+        sink: pa.BufferOutputStream = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        data: bytes = sink.getvalue().to_pybytes()
+        return data
+
+    @staticmethod
+    def deserialize(data: bytes) -> DataFrame:
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+
+    def publish(self, file_path: str, df: DataFrame) -> None:
+        """生データファイルと同じ内容のブロックを追加する"""
+
+        pipeline = self.__client.pipeline()
+        pipeline.xadd(
+            self.__key, {"file_name": os.path.basename(file_path), "data": self.serialize(df)}, maxlen=self.__maxlen, approximate=True
+        )
+        pipeline.expire(self.__key, STREAM_EXPIRE_SECONDS)
+        pipeline.execute()
+
+    def get_batch(self, timeout: Optional[float] = None) -> List[Union[RawdataBlock, str]]:
+        """未処理のブロックをまとめて取得する。timeout秒まで待ち、なければ空のリスト。
+        未受信のブロックが削除されていた場合は、代わりに退避ディレクトリ内の未処理ファイルのパスを返す。
+        """
+
+        block_ms: int = 0 if timeout is None else max(int(timeout * 1000), 1)
+        response: Any = self.__client.xread({self.__key: self.__last_id}, block=block_ms)
+
+        entries: List[Tuple[bytes, Dict[bytes, bytes]]] = response[0][1] if len(response) > 0 else []
+        if len(entries) > 0 and self._is_trimmed():
+            logger.warning(f"Rawdata stream was trimmed before being read, fall back to files. key: {self.__key}")
+            self.__last_id = self._to_str(entries[-1][0])
+            return self._unprocessed_files()
+
+        blocks: List[Union[RawdataBlock, str]] = []
+        for entry_id, fields in entries:
+            self.__last_id = self._to_str(entry_id)
+            file_name: str = self._to_str(fields[b"file_name"])
+            if file_name in self.__delivered or file_name in self.__processed:
+                continue
+            self.__delivered.add(file_name)
+            blocks.append(RawdataBlock(file_name=file_name, df=self.deserialize(fields[b"data"])))
+
+        # FileWatcherと同じくファイル名順とする
+        return sorted(blocks, key=self.file_name)
+
+    def mark_processed(self, items: Iterable[Union[RawdataBlock, str]]) -> None:
+        """ブロックまたはファイルを処理済みとする"""
+
+        self.__processed.update(self.file_name(item) for item in items)
+
+    @staticmethod
+    def file_name(item: Union[RawdataBlock, str]) -> str:
+        return item.file_name if isinstance(item, RawdataBlock) else os.path.basename(item)
+
+    def _is_trimmed(self) -> bool:
+        """最後に受け取ったブロックより後のブロックが、上限超過で削除されているか。
+        NOTE: max-deleted-entry-idはRedis 7.0以降。取得できない場合は削除されていないとみなす。
+        """
+
+        info: Dict[str, Any] = self.__client.xinfo_stream(self.__key)
+        max_deleted_entry_id: Optional[Any] = info.get("max-deleted-entry-id")
+        if max_deleted_entry_id is None:
+            return False
+
+        return self._parse_id(self._to_str(max_deleted_entry_id)) > self._parse_id(self.__last_id)
+
+    def _unprocessed_files(self) -> List[Union[RawdataBlock, str]]:
+        files: List[str] = FileManager.get_rawdata_files(self.__processed_dir_path, self.__machine_id)
+        targets: List[Union[RawdataBlock, str]] = []
+        for file in files:
+            file_name: str = os.path.basename(file)
+            if file_name in self.__delivered or file_name in self.__processed:
+                continue
+            self.__delivered.add(file_name)
+            targets.append(file)
+
+        return targets
+
+    @staticmethod
+    def _parse_id(entry_id: str) -> Tuple[int, int]:
+        milliseconds, sequence = entry_id.split("-")
+        return int(milliseconds), int(sequence)
+
+    @staticmethod
+    def _to_str(value: Union[str, bytes]) -> str:
+        return value.decode() if isinstance(value, bytes) else value
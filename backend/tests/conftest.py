@@ -18,6 +18,18 @@ import pytest
 
 sys.path.append(os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + "/../backend/"))
 
+from backend.elastic_manager.shot_cache import ShotCache  # noqa
+
+
+@pytest.fixture(autouse=True)
+def shot_cache(tmp_path, mocker):
+    """ショットキャッシュの保存先をテストごとの一時ディレクトリとし、プロセス内のキャッシュを初期化する"""
+
+    mocker.patch.object(ShotCache, "_cache_dir", return_value=str(tmp_path / "shot_cache"))
+    ShotCache.clear()
+    yield ShotCache
+    ShotCache.clear()
+
 
 @pytest.fixture
 def app_config_file(tmp_path):
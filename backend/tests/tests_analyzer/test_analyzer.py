@@ -9,11 +9,16 @@
 
 """
 
-from typing import List, Optional, Tuple
+import pickle
+from typing import Generator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import pytest
+from backend.analyzer import extract_features as ef
 from backend.analyzer.analyzer import Analyzer
+from backend.analyzer.shared_shot_frame import SharedShotFrame
+from backend.common import common
 from backend.elastic_manager.elastic_manager import ElasticManager
 from pandas.core.frame import DataFrame
 from pandas.testing import assert_frame_equal
@@ -39,6 +44,89 @@ class TestExtractBreakChannels:
         assert actual == expected
 
 
+class TestApplyLogic:
+    @pytest.fixture
+    def analyzer(self) -> Generator[Analyzer, None, None]:
+        rng = np.random.default_rng(0)
+        shots: List[DataFrame] = []
+        for shot_number, n in ((1, 3000), (2, 3100), (3, 3000)):
+            x = np.linspace(0, np.pi, n)
+            df = pd.DataFrame({f"load0{i}": np.sin(x) * i + rng.normal(scale=0.05, size=n) for i in range(1, 5)})
+            df["shot_number"] = shot_number
+            df["sequential_number"] = np.arange(n) + shot_number * 10_000
+            df["timestamp"] = np.arange(n)
+            shots.append(df)
+        shots_meta_df: DataFrame = pd.DataFrame({"shot_number": [1, 2, 3], "spm": [80.0, 40.0, 80.0]})
+
+        with Analyzer("dummy", pd.concat(shots, ignore_index=True), shots_meta_df, (2,)) as analyzer:
+            yield analyzer
+
+    def test_normal_batch(self, mocker, analyzer):
+        """正常系：一括処理に対応したロジックは、ショットごとに適用した場合と同じ結果を返す"""
+
+        spy_batch = mocker.spy(ef, "max_load_batch")
+        mocker.patch.dict("backend.analyzer.analyzer.BATCH_FUNCS", {ef.max_load: ef.max_load_batch})
+
+        actual: List[dict] = analyzer._extract([1, 3], "max", ef.max_load)
+
+        mocker.patch.dict("backend.analyzer.analyzer.BATCH_FUNCS", clear=True)
+        expected: List[dict] = analyzer._extract([1, 3], "max", ef.max_load)
+
+        spy_batch.assert_called_once()
+        assert [d["shot_number"] for d in actual] == [1, 1, 1, 1, 3, 3, 3, 3]
+        assert [d["sequential_number_by_shot"] for d in actual] == [d["sequential_number_by_shot"] for d in expected]
+        assert [d["value"] for d in actual] == pytest.approx([d["value"] for d in expected])
+
+    def test_normal_target_shot_numbers(self, analyzer):
+        """正常系：除外ショットとデータのないショットは対象外"""
+
+        assert analyzer._target_shot_numbers() == [1, 3]
+
+    def test_normal_multi_process(self, mocker, analyzer):
+        """正常系：チャンクごとにプロセスで処理し、完了したチャンクから順に保存する"""
+
+        mocker.patch.object(common, "NUM_OF_PROCESS", 2)
+        mocker.patch("backend.analyzer.analyzer.CHUNK_SIZE", 1)
+        mock_bulk_insert = mocker.patch.object(ElasticManager, "bulk_insert")
+
+        analyzer._multi_process("index", "max", ef.max_load)
+
+        assert mock_bulk_insert.call_count == 2
+        actual: List[int] = sorted({d["shot_number"] for call in mock_bulk_insert.call_args_list for d in call.args[0]})
+        assert actual == [1, 3]
+
+
+class TestClose:
+    @pytest.fixture
+    def shots_df(self) -> DataFrame:
+        return pd.DataFrame({"shot_number": [1, 1, 2], "sequential_number": [0, 1, 2], "load01": [1.0, 2.0, 3.0]})
+
+    def test_exception_apply(self, mocker, shots_df):
+        """異常系：with文の中でロジック適用が例外となった場合も、共有メモリが解放される"""
+
+        mocker.patch.object(ElasticManager, "delete_exists_index", side_effect=RuntimeError)
+        shots_meta_df: DataFrame = pd.DataFrame({"shot_number": [1, 2], "spm": [80.0, 80.0]})
+
+        with pytest.raises(RuntimeError):
+            with Analyzer("dummy", shots_df, shots_meta_df, None) as analyzer:
+                shared: SharedShotFrame = pickle.loads(pickle.dumps(getattr(analyzer, "_Analyzer__shots")))
+                analyzer.apply(feature="max", func=ef.max_load)
+
+        with pytest.raises(FileNotFoundError):
+            shared.shot(1)
+
+    def test_exception_invalid_feature(self, shots_df):
+        """異常系：不正な特徴量でsys.exit()した場合も、共有メモリが解放される"""
+
+        with pytest.raises(SystemExit):
+            with Analyzer("dummy", shots_df, pd.DataFrame([]), None) as analyzer:
+                shared: SharedShotFrame = pickle.loads(pickle.dumps(getattr(analyzer, "_Analyzer__shots")))
+                analyzer.apply(feature="invalid", func=ef.max_load)
+
+        with pytest.raises(FileNotFoundError):
+            shared.shot(1)
+
+
 class TestStartBreakDiff:
     def test_normal_no_exclude_shots(self, mocker, start_df, break_df):
         """正常系：荷重開始と破断開始の時間差計算（除外ショットなし）"""
@@ -0,0 +1,87 @@
+"""
+ ==================================
+  test_extract_features.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+from backend.analyzer import extract_features as ef
+from pandas.core.frame import DataFrame
+
+
+def create_shot_df(channels: List[str], num_of_samples: int = 3000) -> DataFrame:
+    """荷重波形を模したノイズ付きのショットデータ"""
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, np.pi, num_of_samples)
+
+    return pd.DataFrame({ch: np.sin(x + i * 0.1) * (i + 1) + rng.normal(scale=0.05, size=num_of_samples) for i, ch in enumerate(channels)})
+
+
+class TestExtractFeatures:
+    @pytest.mark.parametrize("spm", [80.0, 40.0])
+    def test_normal_multi_channel_same_as_single_channel(self, spm):
+        """多チャネル対応の関数は、チャネルごとに処理した場合と同じ結果となること"""
+
+        shot_df = create_shot_df(ef.LOAD_CHANNELS)
+
+        indices, values, _ = ef.extract_features(shot_df, spm, ef.max_load)
+
+        for c, ch in enumerate(ef.LOAD_CHANNELS):
+            expected_index, expected_value, _ = ef.max_load(np.array(shot_df[ch][0:-1]), spm)
+            assert indices[c] == expected_index
+            assert values[c] == pytest.approx(expected_value)
+
+    def test_normal_multi_channel_called_once(self, mocker):
+        """多チャネル対応の関数は、全チャネルの2次元配列で1回だけ呼び出されること"""
+
+        channels = ["load01", "load02", "load03"]
+        shot_df = create_shot_df(channels)
+        func = mocker.Mock(return_value=([10, 20, 30], [1.0, 2.0, 3.0], [None, None, None]), multi_channel=True)
+
+        indices, values, _ = ef.extract_features(shot_df, 80.0, func, channels=channels)
+
+        func.assert_called_once()
+        assert func.call_args.args[0].shape == (len(shot_df) - 1, 3)
+        assert indices == [10, 20, 30]
+        assert values == [1.0, 2.0, 3.0]
+
+    def test_normal_single_channel_fallback(self):
+        """多チャネル非対応の関数は、指定したチャネルごとに呼び出されること"""
+
+        channels = ["load01", "load05"]
+        shot_df = create_shot_df(channels)
+        called: List[str] = []
+
+        def func(d, spm, ch="loadxx"):
+            called.append(ch)
+            return int(np.argmax(d)), float(np.max(d)), None
+
+        indices, values, _ = ef.extract_features(shot_df, 80.0, func, channels=channels)
+
+        assert called == channels
+        assert values == [shot_df[ch][0:-1].max() for ch in channels]
+        assert indices == [int(shot_df[ch][0:-1].idxmax()) for ch in channels]
+
+    @pytest.mark.parametrize("spm", [80.0, 40.0])
+    def test_normal_max_load_batch(self, spm):
+        """複数ショットをまとめて処理しても、ショットごとに処理した場合と同じ結果となること"""
+
+        shot_dfs = [create_shot_df(ef.LOAD_CHANNELS, n) for n in (3000, 3100, 3000)]
+        spms = [spm, 80.0, None]
+
+        actual = ef.max_load_batch(shot_dfs, spms)
+
+        for (indices, values, _), shot_df, s in zip(actual, shot_dfs, spms):
+            expected_indices, expected_values, _ = ef.extract_features(shot_df, s, ef.max_load)
+            assert indices == expected_indices
+            assert values == pytest.approx(expected_values)
@@ -0,0 +1,104 @@
+"""
+ ==================================
+  test_fft_tools.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import numpy as np
+import pytest
+from backend.analyzer import fft_tools
+
+FS = 100_000
+
+
+def create_signal(num_of_samples: int, num_of_channels: int = 2) -> np.ndarray:
+    """100Hzと20kHzの正弦波を重ねた波形(サンプル数, チャネル数)"""
+
+    t = np.arange(num_of_samples) / FS
+    return np.stack([np.sin(2 * np.pi * 100 * t + c) + 0.5 * np.sin(2 * np.pi * 20_000 * t) for c in range(num_of_channels)], axis=1)
+
+
+class TestBandpassRfft:
+    @pytest.mark.parametrize("num_of_samples", [1000, 1001])
+    def test_normal_same_as_bandpass_ifft(self, num_of_samples):
+        """fft_spectrum、bandpass_ifftによるバンドパスと同じ結果となること"""
+
+        x = create_signal(num_of_samples)
+
+        actual = fft_tools.bandpass_rfft(x, FS, 0, 2000)
+
+        for c in range(x.shape[1]):
+            s, f, _ = fft_tools.fft_spectrum(x[:, c], fs=FS)
+            np.testing.assert_allclose(actual[:, c], fft_tools.bandpass_ifft(s, f, 0, 2000).real, atol=1e-12)
+
+    def test_normal_2d_spectrum(self):
+        """fft_spectrum、bandpass_ifftは2次元配列をチャネルごとに処理すること"""
+
+        x = create_signal(1000)
+
+        s, f, _ = fft_tools.fft_spectrum(x, fs=FS)
+        actual = fft_tools.bandpass_ifft(s, f, 0, 2000).real
+
+        for c in range(x.shape[1]):
+            s_c, f_c, _ = fft_tools.fft_spectrum(x[:, c], fs=FS)
+            np.testing.assert_allclose(actual[:, c], fft_tools.bandpass_ifft(s_c, f_c, 0, 2000).real, atol=1e-12)
+
+
+class TestBandpassSosfiltfilt:
+    def test_normal_cut_high_frequency(self):
+        """上限周波数を超える成分が除去されること"""
+
+        x = create_signal(5000)
+        t = np.arange(5000) / FS
+
+        actual = fft_tools.bandpass_sosfiltfilt(x, FS, 0, 2000)
+
+        # 波形の端を除き、100Hz成分のみが残る
+        np.testing.assert_allclose(actual[500:-500, 0], np.sin(2 * np.pi * 100 * t)[500:-500], atol=0.01)
+
+    def test_normal_all_pass(self):
+        """全帯域を通過させる場合は元の波形を返すこと"""
+
+        x = create_signal(1000)
+
+        np.testing.assert_array_equal(fft_tools.bandpass_sosfiltfilt(x, FS, 0, FS / 2), x)
+
+
+class TestBatchBandpass:
+    @pytest.mark.parametrize("method", ["fft", "sosfiltfilt"])
+    def test_normal_same_as_each_waveform(self, method):
+        """長さの異なる波形をまとめて処理しても、波形ごとに処理した場合と同じ結果となること"""
+
+        waveforms = [create_signal(1000), create_signal(1200), create_signal(1000, 3), create_signal(1000)[:, 0]]
+        func = fft_tools.bandpass_rfft if method == "fft" else fft_tools.bandpass_sosfiltfilt
+
+        actual = fft_tools.batch_bandpass(waveforms, FS, 0, 2000, method=method)
+
+        assert [a.shape for a in actual] == [w.shape for w in waveforms]
+        for a, w in zip(actual, waveforms):
+            np.testing.assert_allclose(a, func(w, FS, 0, 2000), atol=1e-12)
+
+    def test_normal_pad(self):
+        """0埋めで長さを揃えた場合も、元の形状で返すこと"""
+
+        waveforms = [create_signal(1000), create_signal(1201)]
+
+        actual = fft_tools.batch_bandpass(waveforms, FS, 0, 2000, pad=True)
+
+        assert [a.shape for a in actual] == [w.shape for w in waveforms]
+
+    def test_normal_empty(self):
+        """波形がない場合は空のリストを返すこと"""
+
+        assert fft_tools.batch_bandpass([], FS, 0, 2000) == []
+
+    def test_exception_unknown_method(self):
+        """未対応の方式はValueErrorとなること"""
+
+        with pytest.raises(ValueError):
+            fft_tools.batch_bandpass([create_signal(100)], FS, 0, 2000, method="fir")
@@ -0,0 +1,106 @@
+"""
+ ==================================
+  test_shared_shot_frame.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import Generator, List
+
+import pandas as pd
+import pytest
+from backend.analyzer.shared_shot_frame import SharedShotFrame
+from pandas.core.frame import DataFrame
+
+
+def sum_load01(shared: SharedShotFrame, shot_number: int) -> float:
+    """子プロセスで共有メモリのショットデータを参照する"""
+
+    return float(shared.shot(shot_number).load01.sum())  # type: ignore
+
+
+class TestSharedShotFrame:
+    @pytest.fixture
+    def shots_df(self) -> DataFrame:
+        return pd.DataFrame(
+            {
+                "shot_number": [2, 1, 2, 1, 3],
+                "sequential_number": [10, 0, 11, 1, 20],
+                "load01": [1.0, 2.0, 3.0, 4.0, 5.0],
+                "timestamp": [f"2021-08-06T10:00:00.00000{i}" for i in range(5)],
+                "tags": [[], ["abnormal"], [], [], []],
+            }
+        )
+
+    @pytest.fixture
+    def shared(self, shots_df) -> Generator[SharedShotFrame, None, None]:
+        with SharedShotFrame.create(shots_df) as shared:
+            yield shared
+
+    def test_normal_shot(self, shared):
+        """正常系：ショット番号ごとに元の順序でデータを返す。リストの列は共有しない"""
+
+        actual: DataFrame = shared.shot(2)  # type: ignore
+
+        assert shared.shot_numbers() == [1, 2, 3]
+        assert list(actual.columns) == ["shot_number", "sequential_number", "load01", "timestamp"]
+        assert actual.sequential_number.tolist() == [10, 11]
+        assert actual.load01.tolist() == [1.0, 3.0]
+        assert actual.timestamp.tolist() == ["2021-08-06T10:00:00.000000", "2021-08-06T10:00:00.000002"]
+
+    def test_normal_shot_not_found(self, shared):
+        """正常系：データのないショットはNone"""
+
+        assert shared.shot(4) is None
+
+    def test_normal_pickle(self, shared):
+        """正常系：pickleされるのは共有メモリ名と形状のみで、復元後も同じデータを参照する"""
+
+        restored: SharedShotFrame = pickle.loads(pickle.dumps(shared))
+
+        pd.testing.assert_frame_equal(restored.shot(1), shared.shot(1))  # type: ignore
+        restored.close()
+
+    def test_normal_process(self, shared):
+        """正常系：子プロセスから共有メモリのデータを参照できる"""
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            actual: List[float] = list(executor.map(sum_load01, [shared] * 3, [1, 2, 3]))
+
+        assert actual == [6.0, 4.0, 5.0]
+
+    def test_normal_empty(self):
+        """正常系：データがない場合は共有メモリを作成しない"""
+
+        shared = SharedShotFrame.create(pd.DataFrame([]))
+
+        assert shared.shot_numbers() == []
+        assert shared.shot(1) is None
+        shared.close()
+
+    def test_normal_close(self, shots_df):
+        """正常系：作成したプロセスで閉じると共有メモリを解放する"""
+
+        shared = SharedShotFrame.create(shots_df)
+        restored: SharedShotFrame = pickle.loads(pickle.dumps(shared))
+        shared.close()
+
+        with pytest.raises(FileNotFoundError):
+            restored.shot(1)
+
+    def test_normal_with(self, shots_df):
+        """正常系：with文を抜けると、例外の場合も共有メモリを解放する"""
+
+        with pytest.raises(RuntimeError):
+            with SharedShotFrame.create(shots_df) as shared:
+                restored: SharedShotFrame = pickle.loads(pickle.dumps(shared))
+                raise RuntimeError
+
+        with pytest.raises(FileNotFoundError):
+            restored.shot(1)
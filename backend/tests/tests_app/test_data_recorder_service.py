@@ -12,7 +12,6 @@
 import os
 import shutil
 from datetime import datetime, timedelta
-from decimal import Decimal
 
 import pytest
 from backend.app.models.data_collect_history import DataCollectHistory
@@ -164,23 +163,22 @@ class TestReadBinaryFiles:
         actual = DataRecorder.read_binary_files(
             file=file,
             sequential_number=0,
-            timestamp=Decimal(file.timestamp),
+            started_timestamp_ns=common.datetime_to_epoch_ns(datetime.fromtimestamp(file.timestamp)),
             sensors=sensors,
-            sampling_interval=Decimal(1.0 / handler.sampling_frequency),
+            sampling_frequency=handler.sampling_frequency,
         )
 
         expected = (
             [
                 {
                     "sequential_number": 0,
-                    "timestamp": Decimal(file.timestamp),
+                    "timestamp": file.timestamp,
                     "stroke_displacement": 10.0,
                     "load01": 1.1,
                     "load02": 2.2,
                 },
             ],
             1,
-            Decimal(file.timestamp) + Decimal(0.00001),
         )
 
         assert actual == expected
@@ -1,3 +1,4 @@
+import pandas as pd
 import pytest
 from backend.app.crud.crud_data_collect_history import CRUDDataCollectHistory
 from backend.app.crud.crud_machine import CRUDMachine
@@ -204,3 +205,104 @@ class TestPredictorTask:
         )
 
         predictor.predictor_task(self.machine_id, debug_mode=True)
+
+
+class TestPredictBatch:
+    def test_normal(self, mocker):
+        """正常系: 複数ショットをまとめて取得し、特徴点をインデックスごとに一括登録して予測する"""
+
+        machine = Machine(machine_id="machine-01")
+        shots_meta = [{"shot_number": 1, "id": "id-1"}, {"shot_number": 2, "id": "id-2"}, {"shot_number": 3, "id": "id-3"}]
+        shot_df = pd.DataFrame({"shot_number": [1], "sequential_number": [0]})
+
+        mock_read = mocker.patch.object(predictor.DataReader, "read_shots_by_number", return_value={1: shot_df, 3: shot_df})
+        mocker.patch.object(
+            predictor,
+            "feature_extract",
+            return_value=(pd.Series({"load01_max-point": 1.0}), {"shots-machine-01-20210709190000-max-point": [{"value": 1.0}]}),
+        )
+        mocker.patch.object(ElasticManager, "exists_index", return_value=True)
+        mock_bulk_insert = mocker.patch.object(ElasticManager, "bulk_insert")
+        mock_predict = mocker.patch.object(predictor, "predict")
+
+        predictor.predict_batch(machine, "20210709190000", "data-index", "meta-index", shots_meta)
+
+        assert mock_read.call_args.args[1] == [1, 2, 3]
+        mock_bulk_insert.assert_called_once_with([{"value": 1.0}, {"value": 1.0}], "shots-machine-01-20210709190000-max-point")
+        assert list(mock_predict.call_args.args[1].index) == [1, 3]
+
+
+class TestFeatureExtract:
+    def test_normal_sensor_channels(self):
+        """正常系: センサーに設定されたチャネルを対象に特徴抽出する"""
+
+        dsl = "ROLLING_MEAN = 3;TARGET = IDXMAX(DST)"
+        machine = Machine(
+            machine_id="machine-01",
+            sensors=[
+                Sensor(
+                    machine_id="machine-01",
+                    sensor_id="stroke_displacement",
+                    sensor_name="stroke_displacement",
+                    sensor_type_id="stroke_displacement",
+                ),
+                Sensor(machine_id="machine-01", sensor_id="load05", sensor_name="load05", sensor_type_id="load", max_point_dsl=dsl),
+                Sensor(machine_id="machine-01", sensor_id="load02", sensor_name="load02", sensor_type_id="load", max_point_dsl=dsl),
+            ],
+        )
+        shot_df = pd.DataFrame(
+            {
+                "shot_number": [1] * 10,
+                "sequential_number": list(range(100, 110)),
+                "sequential_number_by_shot": list(range(10)),
+                "timestamp": list(range(1000, 1010)),
+                "load05": [0.0, 1.0, 2.0, 3.0, 9.0, 3.0, 2.0, 1.0, 0.0, 0.0],
+                "load02": [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 9.0, 5.0, 0.0, 0.0],
+            }
+        )
+
+        features, point_docs = predictor.feature_extract(machine, "20210709190000", shot_df)
+
+        assert predictor.feature_channels(machine) == ["load05", "load02"]
+        assert list(features.index) == ["load05_max-point", "load02_max-point"]
+        docs = point_docs["shots-machine-01-20210709190000-max-point"]
+        assert [(d["load"], d["sequential_number_by_shot"]) for d in docs] == [("load05", 4), ("load02", 6)]
+
+
+class TestModelCache:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        predictor.ModelCache.invalidate()
+        yield
+        predictor.ModelCache.invalidate()
+
+    def test_normal_cache(self, mocker):
+        """正常系: 同じモデルとバージョンはMLFlowから1回だけ取得する"""
+
+        mock_load = mocker.patch("mlflow.sklearn.load_model", side_effect=lambda model_uri: object())
+
+        first = predictor.ModelCache.get("logreg", "1")
+        second = predictor.ModelCache.get("logreg", "1")
+
+        assert first is second
+        mock_load.assert_called_once_with(model_uri="models:/logreg/1")
+
+    def test_normal_version_changed(self, mocker):
+        """正常系: バージョンが変更された場合は新しいバージョンを取得し、古いバージョンを破棄する"""
+
+        mock_load = mocker.patch("mlflow.sklearn.load_model", side_effect=lambda model_uri: object())
+
+        old_model = predictor.ModelCache.get("logreg", "1")
+        new_model = predictor.ModelCache.get("logreg", "2")
+        reloaded_model = predictor.ModelCache.get("logreg", "1")
+
+        assert new_model is not old_model
+        assert reloaded_model is not old_model
+        assert mock_load.call_count == 3
+
+    def test_normal_warm_up_failed(self, mocker):
+        """正常系: 事前のモデル取得に失敗しても例外を送出しない"""
+
+        mocker.patch("mlflow.sklearn.load_model", side_effect=Exception("connection refused"))
+
+        predictor.ModelCache.warm_up("logreg", "1")
@@ -11,20 +11,24 @@
 
 from datetime import datetime
 from decimal import Decimal
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 import pandas as pd
 import pytest
 from backend.app.models.data_collect_history_event import DataCollectHistoryEvent
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.common import common
+from backend.cut_out_shot.cut_out_shot import CutOutShot
 from backend.cut_out_shot.stroke_displacement_cutter import StrokeDisplacementCutter
 from backend.data_converter.data_converter import DataConverter
-
-# from backend.elastic_manager.elastic_manager import ElasticManager
+from backend.elastic_manager.elastic_manager import BulkInsertError, ElasticManager
+from backend.file_manager.rawdata_stream import RawdataBlock
 from pandas.core.frame import DataFrame
 from pandas.testing import assert_frame_equal
 
+from .test_stroke_displacement_cutter import create_noisy_rawdata_df
+
 # class TestAutoCutOutShot:
 # def test_auto_cut_out_shot_multi_handler(self, stroke_displacement_target, pkl_files_multi_handler):
 #     """自動ショット切り出し実行。実行できればOKとする。"""
@@ -55,8 +59,8 @@ class TestExcludeSetupInterval:
     def test_normal_exclude_all(self, stroke_displacement_target, rawdata_df):
         """正常系：段取区間除外（全データ）"""
 
-        collect_start_time: Decimal = Decimal(datetime(2020, 12, 1, 10, 30, 22, 111112).timestamp())
-        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time)
+        collect_start_time_ns: int = common.datetime_to_epoch_ns(datetime(2020, 12, 1, 10, 30, 22, 111112))
+        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time_ns)
 
         expected: DataFrame = rawdata_df.drop(index=rawdata_df.index[:])
 
@@ -65,8 +69,8 @@ class TestExcludeSetupInterval:
     def test_normal_exclude_some_data(self, stroke_displacement_target, rawdata_df):
         """正常系：段取区間除外（部分データ）"""
 
-        collect_start_time: Decimal = Decimal(datetime(2020, 12, 1, 10, 30, 20, 0).timestamp())
-        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time)
+        collect_start_time_ns: int = common.datetime_to_epoch_ns(datetime(2020, 12, 1, 10, 30, 20, 0))
+        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time_ns)
 
         expected: DataFrame = rawdata_df.drop(index=rawdata_df.index[:-3])
 
@@ -76,8 +80,8 @@ class TestExcludeSetupInterval:
         """正常系：段取区間除外（除外対象なし）"""
 
         # rawdata_dfの最初のサンプルと同時刻
-        collect_start_time: Decimal = Decimal(datetime(2020, 12, 1, 10, 30, 10, 111111).timestamp())
-        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time)
+        collect_start_time_ns: int = common.datetime_to_epoch_ns(datetime(2020, 12, 1, 10, 30, 10, 111111))
+        actual: DataFrame = stroke_displacement_target._exclude_setup_interval(rawdata_df, collect_start_time_ns)
 
         expected: DataFrame = rawdata_df
 
@@ -100,7 +104,8 @@ class TestExcludePauseInterval:
             ),
         ]
 
-        actual: DataFrame = stroke_displacement_target._exclude_pause_interval(rawdata_df, pause_events)
+        pause_intervals_ns: List[Tuple[int, int]] = CutOutShot._to_pause_intervals_ns(pause_events)
+        actual: DataFrame = stroke_displacement_target._exclude_pause_interval(rawdata_df, pause_intervals_ns)
 
         # 最初と最後のサンプルを以外すべて除去される。
         expected: DataFrame = pd.concat([rawdata_df[:1], rawdata_df[-1:]], axis=0)
@@ -130,13 +135,29 @@ class TestExcludePauseInterval:
             ),
         ]
 
-        actual: DataFrame = stroke_displacement_target._exclude_pause_interval(rawdata_df, pause_events)
+        pause_intervals_ns: List[Tuple[int, int]] = CutOutShot._to_pause_intervals_ns(pause_events)
+        actual: DataFrame = stroke_displacement_target._exclude_pause_interval(rawdata_df, pause_intervals_ns)
 
         # 最初と最後のサンプルを以外すべて除去される。
         expected: DataFrame = pd.concat([rawdata_df[:1], rawdata_df[-1:]], axis=0)
 
         assert_frame_equal(actual, expected)
 
+    def test_normal_exclude_decimal_timestamp(self, stroke_displacement_target, rawdata_df):
+        """正常系：従来のpkl形式(時刻がDecimal)の生データも、同じく除外されること"""
+
+        start_time = datetime(2020, 12, 1, 10, 30, 11, 111111)
+        end_time = datetime(2020, 12, 1, 10, 30, 21, 111111)
+        decimal_rawdata_df: DataFrame = rawdata_df.assign(timestamp=rawdata_df["timestamp"].map(Decimal))
+
+        actual: DataFrame = stroke_displacement_target._exclude_pause_interval(
+            decimal_rawdata_df, [(common.datetime_to_epoch_ns(start_time), common.datetime_to_epoch_ns(end_time))]
+        )
+
+        expected: DataFrame = pd.concat([decimal_rawdata_df[:1], decimal_rawdata_df[-1:]], axis=0)
+
+        assert_frame_equal(actual, expected)
+
 
 class TestSetToNoneForLowSpm:
     def test_normal(self, stroke_displacement_target, shots_meta_df):
@@ -173,9 +194,9 @@ class TestExcludeOverSample:
         cut_out_targets = cutter.cut_out_targets
         cut_out_targets_df = pd.DataFrame(cut_out_targets)
 
-        actual: DataFrame = stroke_displacement_target._exclude_over_sample(cut_out_targets_df)
+        actual: DataFrame = pd.DataFrame(stroke_displacement_target._exclude_over_sample(cut_out_targets))
 
-        expected: DataFrame = cut_out_targets_df[cut_out_targets_df.shot_number == 2]
+        expected: DataFrame = cut_out_targets_df[cut_out_targets_df.shot_number == 2].reset_index(drop=True)
 
         assert_frame_equal(actual, expected)
 
@@ -192,21 +213,39 @@ class TestExcludeOverSample:
         cut_out_targets = cutter.cut_out_targets
         cut_out_targets_df = pd.DataFrame(cut_out_targets)
 
-        actual: DataFrame = stroke_displacement_target._exclude_over_sample(cut_out_targets_df)
+        actual: DataFrame = pd.DataFrame(stroke_displacement_target._exclude_over_sample(cut_out_targets))
 
         expected: DataFrame = cut_out_targets_df
 
         assert_frame_equal(actual, expected)
 
 
+class TestConvertTimestamp:
+    def test_normal_same_as_fromtimestamp(self):
+        """正常系：切り出し結果のtimestamp変換がdatetime.fromtimestamp()と一致すること"""
+
+        rng = np.random.default_rng(0)
+        timestamps = np.concatenate(
+            [
+                datetime(2020, 12, 1, 10, 30, 10, 111111).timestamp() + np.arange(10_000) * 0.00001,
+                rng.uniform(1.5e9, 1.9e9, 10_000),
+                [1606786210.0000005, 1606786210.9999996],
+            ]
+        )
+
+        actual = common.fromtimestamp_like_builtin(timestamps).tolist()
+
+        assert actual == [datetime.fromtimestamp(x) for x in timestamps.tolist()]
+
+
 class TestApplyPhysicalConversionFormula:
     def test_normal(self, mocker, stroke_displacement_target, rawdata_df):
-        """正常系：lambda式適用"""
+        """正常系：変換式適用"""
 
         # 全データを見る必要はないので一部スライス
         target_df: DataFrame = rawdata_df[:3].copy()
 
-        mocker.patch.object(DataConverter, "get_physical_conversion_formula", return_value=lambda x: x + 1.0)
+        mocker.patch.object(DataConverter, "get_linear_coefficients", return_value=(np.ones(5), np.ones(5)))
 
         actual_df: DataFrame = stroke_displacement_target._apply_physical_conversion_formula(target_df)
 
@@ -247,6 +286,117 @@ class TestApplyPhysicalConversionFormula:
         assert_frame_equal(actual_df, expected_df)
 
 
+class TestCutOutRawdataFiles:
+    """先読み・切り出し・格納スレッドによるパイプライン処理のテスト"""
+
+    def test_normal_same_as_sequential(self, mocker, tmp_path):
+        """正常系：ファイルを先読みしながら切り出した結果が、全データを一括で切り出した結果と一致すること"""
+
+        sensors = [
+            DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement", slope=1.0, intercept=0.0),
+            DataCollectHistorySensor(sensor_id="load01", sensor_type_id="load", slope=2.0, intercept=0.5),
+            DataCollectHistorySensor(sensor_id="load02", sensor_type_id="load", slope=-1.0, intercept=0.0),
+        ]
+        rawdata_df = create_noisy_rawdata_df(0, 20_000)
+
+        rawdata_files = []
+        for i, positions in enumerate(np.array_split(np.arange(len(rawdata_df)), 14)):
+            rawdata_file = str(tmp_path / f"machine-01_{i}.parquet")
+            rawdata_df.iloc[positions].to_parquet(rawdata_file)
+            rawdata_files.append(rawdata_file)
+
+        inserted = []
+        mocker.patch.object(ElasticManager, "parallel_bulk_insert", side_effect=lambda docs, index, **kwargs: inserted.extend(docs))
+
+        target = CutOutShot(
+            cutter=StrokeDisplacementCutter(44.0, 36.0, 0.1, sensors=sensors),
+            data_collect_history=None,
+            sampling_frequency=100_000,
+            sensors=sensors,
+            machine_id="machine-01",
+            target="20201201103011",
+            num_of_process=2,
+            num_of_prefetch=3,
+            queue_size=2,
+        )
+        target._cut_out_rawdata_files(rawdata_files, "shots-index", lambda f: pd.read_parquet(f))
+
+        actual = pd.DataFrame(inserted)
+
+        cutter = StrokeDisplacementCutter(44.0, 36.0, 0.1, sensors=sensors)
+        expected = pd.DataFrame(cutter.cut_out_shot(DataConverter.physical_convert_df(rawdata_df.copy(), sensors)))
+        expected["timestamp"] = expected["timestamp"].map(datetime.fromtimestamp).astype("datetime64[us]")
+        expected["machine_id"] = "machine-01"
+
+        assert_frame_equal(actual, expected)
+        assert target.cutter.shots_summary == cutter.shots_summary
+
+    def test_exception_bulk_insert_failed(self, mocker, stroke_displacement_target, rawdata_df):
+        """異常系：Elasticsearchへの格納で例外が発生した場合、呼び出し元に例外が送出されること"""
+
+        mocker.patch.object(ElasticManager, "parallel_bulk_insert", side_effect=ConnectionError("refused"))
+
+        with pytest.raises(ConnectionError):
+            stroke_displacement_target._cut_out_rawdata_files(["a", "b"], "shots-index", lambda f: rawdata_df.copy())
+
+    def test_exception_bulk_insert_partly_failed(self, mocker, stroke_displacement_target, rawdata_df):
+        """異常系：格納に失敗したドキュメントがある場合、BulkInsertErrorが送出されること"""
+
+        mock_parallel_bulk = mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((i % 2 == 0, {}) for i, _ in enumerate(actions)),
+        )
+        mocker.patch.object(ElasticManager, "get_client")
+        stroke_displacement_target.cutter.cut_out_shot = lambda df: {"timestamp": df["timestamp"].to_numpy()}
+        mocker.patch.object(stroke_displacement_target, "_exclude_over_sample", side_effect=lambda targets: targets)
+        mocker.patch.object(stroke_displacement_target, "_apply_physical_conversion_formula_after_cut_out", side_effect=lambda t: t)
+
+        with pytest.raises(BulkInsertError):
+            stroke_displacement_target._cut_out_rawdata_files(["a"], "shots-index", lambda f: rawdata_df.copy())
+
+        assert mock_parallel_bulk.called
+
+
+class TestAutoCutOutShot:
+    def test_normal_stream_same_as_files(self, mocker, tmp_path):
+        """正常系：ストリームで受け取った生データを切り出した結果が、生データファイルを切り出した結果と一致すること"""
+
+        sensors = [
+            DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement", slope=1.0, intercept=0.0),
+            DataCollectHistorySensor(sensor_id="load01", sensor_type_id="load", slope=2.0, intercept=0.5),
+        ]
+        rawdata_df = create_noisy_rawdata_df(0, 20_000)[["sequential_number", "timestamp", "stroke_displacement", "load01"]]
+
+        rawdata_files = []
+        blocks = []
+        for i, positions in enumerate(np.array_split(np.arange(len(rawdata_df)), 5)):
+            rawdata_file = str(tmp_path / f"machine-01_{i}.parquet")
+            rawdata_df.iloc[positions].to_parquet(rawdata_file, index=False)
+            rawdata_files.append(rawdata_file)
+            blocks.append(RawdataBlock(file_name=f"machine-01_{i}.parquet", df=rawdata_df.iloc[positions].reset_index(drop=True)))
+
+        mocker.patch.object(CutOutShot, "_export_shots_meta_to_es")
+        inserted = {"files": [], "stream": []}
+        for source, rawdata in (("files", rawdata_files), ("stream", blocks)):
+            mocker.patch.object(
+                ElasticManager, "bulk_insert_columns", side_effect=lambda columns, index, **kwargs: inserted[source].append(columns)
+            )
+            target = CutOutShot(
+                cutter=StrokeDisplacementCutter(44.0, 36.0, 0.1, sensors=sensors),
+                data_collect_history=None,
+                sampling_frequency=100_000,
+                sensors=sensors,
+                machine_id="machine-01",
+                target="20201201103011",
+            )
+            target.auto_cut_out_shot(rawdata, "shots-index", "shots-meta-index", debug_mode=True)
+
+        assert len(inserted["files"]) > 0
+        assert len(inserted["stream"]) == len(inserted["files"])
+        for actual, expected in zip(inserted["stream"], inserted["files"]):
+            assert_frame_equal(pd.DataFrame(actual), pd.DataFrame(expected))
+
+
 class TestSetStartSequentialNumber:
     def test_normal_1(self, stroke_displacement_target):
         actual: int = stroke_displacement_target._set_start_sequential_number(start_sequential_number=None, rawdata_count=10)
@@ -1,8 +1,12 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 
+import numpy as np
 import pandas as pd
+import pytest
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.cut_out_shot.pulse_cutter import PulseCutter
+from pandas.core.frame import DataFrame
 from pandas.testing import assert_frame_equal
 
 
@@ -14,7 +18,7 @@ class TestCutOutShot:
         cutter = PulseCutter(threshold=1.0, sensors=pulse_sensors)
 
         cutter.cut_out_shot(rawdata_pulse_df)
-        actual: List[dict] = cutter.cut_out_targets
+        actual: Dict[str, np.ndarray] = cutter.cut_out_targets
         actual_df = pd.DataFrame(actual)
 
         expected = [
@@ -65,3 +69,158 @@ class TestCutOutShot:
         expected_df = pd.DataFrame(expected)
 
         assert_frame_equal(actual_df, expected_df, check_like=True)
+
+
+class LegacyPulseCutter:
+    """1サンプルずつ判定する従来の実装。ベクトル化した実装の検証用"""
+
+    def __init__(self, threshold, sensors):
+        self.__threshold = threshold
+        self.__shot_number = 0
+        self.__sequential_number = 0
+        self.__sequential_number_by_shot = 0
+        self.__is_shot_section = False
+        self.__sensors = sensors
+        self.cut_out_targets: List[dict] = []
+        self.shots_summary: List[dict] = []
+
+    def state(self):
+        return (self.__shot_number, self.__sequential_number, self.__sequential_number_by_shot, self.__is_shot_section)
+
+    def cut_out_shot(self, rawdata_df: DataFrame) -> None:
+        for rawdata in rawdata_df.itertuples():
+            if (not self.__is_shot_section) and (rawdata.pulse >= self.__threshold):
+                self.__is_shot_section = True
+                self.__shot_number += 1
+                self.__sequential_number_by_shot = 0
+                self.shots_summary.append({"shot_number": self.__shot_number, "timestamp": rawdata.timestamp})
+
+            if self.__is_shot_section and (rawdata.pulse < self.__threshold):
+                self.shots_summary[self.__shot_number - 1]["num_of_samples_in_cut_out"] = self.__sequential_number_by_shot
+                self.__is_shot_section = False
+
+            if not self.__is_shot_section:
+                continue
+
+            cut_out_target: dict = {
+                "timestamp": rawdata.timestamp,
+                "sequential_number": self.__sequential_number,
+                "sequential_number_by_shot": self.__sequential_number_by_shot,
+                "rawdata_sequential_number": int(rawdata.sequential_number),
+                "shot_number": self.__shot_number,
+                "tags": [],
+            }
+            for sensor in self.__sensors:
+                cut_out_target[sensor.sensor_id] = getattr(rawdata, sensor.sensor_id)
+
+            self.cut_out_targets.append(cut_out_target)
+            self.__sequential_number += 1
+            self.__sequential_number_by_shot += 1
+
+
+def create_noisy_pulse_df(seed: int, num_of_samples: int) -> DataFrame:
+    """ノイズを含むパルス値（しきい値と一致する値を含むよう0.1単位に丸め）の生データ"""
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_of_samples)
+    noise = rng.normal(0.0, rng.uniform(0.0, 0.5), num_of_samples)
+    pulse = np.where(np.sin(2 * np.pi * t / rng.integers(5, 100)) > 0, 1.0, 0.0) + noise
+
+    return pd.DataFrame(
+        {
+            "sequential_number": t,
+            "timestamp": 1606786210.0 + t * 0.00001,
+            "pulse": np.round(pulse, 1),
+            "load01": rng.normal(size=num_of_samples),
+            "load02": rng.normal(size=num_of_samples),
+        }
+    )
+
+
+def assert_same_as_legacy(rawdata_df: DataFrame, split_positions: List[int], threshold: float) -> None:
+    """ファイル分割位置ごとに両実装で切り出し、切り出し結果、サマリ、内部状態が一致することを確認する"""
+
+    sensors = [
+        DataCollectHistorySensor(sensor_id=c, sensor_type_id=c) for c in rawdata_df.columns if c not in ("sequential_number", "timestamp")
+    ]
+    cutter = PulseCutter(threshold, sensors)
+    legacy_cutter = LegacyPulseCutter(threshold, sensors)
+
+    boundaries = [0] + split_positions + [len(rawdata_df)]
+    for df in (rawdata_df.iloc[s:e] for s, e in zip(boundaries[:-1], boundaries[1:])):
+        actual = pd.DataFrame(cutter.cut_out_shot(df))
+        legacy_cutter.cut_out_targets = []
+        legacy_cutter.cut_out_shot(df)
+        expected = pd.DataFrame(legacy_cutter.cut_out_targets)
+
+        if len(expected) == 0:
+            assert len(actual) == 0
+        else:
+            assert_frame_equal(actual, expected)
+
+        assert (
+            getattr(cutter, "_PulseCutter__shot_number"),
+            getattr(cutter, "_PulseCutter__sequential_number"),
+            getattr(cutter, "_PulseCutter__sequential_number_by_shot"),
+            getattr(cutter, "_PulseCutter__is_shot_section"),
+        ) == legacy_cutter.state()
+
+    assert cutter.shots_summary == legacy_cutter.shots_summary
+
+
+class TestCutOutShotParity:
+    """従来の実装(1サンプルずつ判定)との一致確認"""
+
+    @pytest.mark.parametrize("split_position", range(7))
+    def test_normal_fixture_split(self, rawdata_pulse_df, split_position):
+        """正常系：fixtureをあらゆる位置で2ファイルに分割しても従来の実装と一致すること"""
+
+        for threshold in (1.0, 0.5, 0.0):
+            assert_same_as_legacy(rawdata_pulse_df, [split_position], threshold)
+
+    def test_normal_shot_spans_files(self, rawdata_pulse_df, pulse_sensors):
+        """正常系：ファイルを跨ぐショットのショット番号、連番が分割しない場合と同じであること"""
+
+        cutter = PulseCutter(threshold=1.0, sensors=pulse_sensors)
+        expected = pd.DataFrame(cutter.cut_out_shot(rawdata_pulse_df))
+
+        split_cutter = PulseCutter(threshold=1.0, sensors=pulse_sensors)
+        actual = pd.concat(
+            [pd.DataFrame(split_cutter.cut_out_shot(df)) for df in (rawdata_pulse_df.iloc[:2], rawdata_pulse_df.iloc[2:])],
+            ignore_index=True,
+        )
+
+        assert_frame_equal(actual, expected)
+        assert split_cutter.shots_summary == cutter.shots_summary
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_normal_noisy_waveform(self, seed):
+        """正常系：ノイズを含むランダムな波形、ランダムなファイル分割（空ファイル含む）でも従来の実装と一致すること"""
+
+        rng = np.random.default_rng(seed)
+        rawdata_df = create_noisy_pulse_df(seed, 3000)
+        split_positions = sorted(rng.choice(np.arange(0, 3001), size=rng.integers(0, 30), replace=True).tolist())
+
+        for threshold in (1.0, 0.5):
+            assert_same_as_legacy(rawdata_df, split_positions, threshold)
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_normal_missing_pulse(self, seed):
+        """正常系：パルスの欠損(NaN)を含む波形（ファイル先頭、ファイル跨ぎ含む）でも従来の実装と一致すること"""
+
+        rng = np.random.default_rng(seed)
+        rawdata_df = create_noisy_pulse_df(seed, 3000)
+        rawdata_df.loc[rng.random(3000) < 0.2, "pulse"] = np.nan
+        rawdata_df.loc[1000:1100, "pulse"] = np.nan
+        split_positions = sorted(rng.choice(np.arange(0, 3001), size=rng.integers(0, 30), replace=True).tolist()) + [1050]
+
+        for threshold in (1.0, 0.5):
+            assert_same_as_legacy(rawdata_df, sorted(split_positions), threshold)
+
+    def test_normal_missing_pulse_at_head(self, rawdata_pulse_df):
+        """正常系：先頭から欠損が続く場合はショット区間外のまま、ショット区間中の欠損はショット区間に含まれること"""
+
+        rawdata_df = rawdata_pulse_df.copy()
+        rawdata_df["pulse"] = [np.nan, np.nan, 1.0, np.nan, 0.0, np.nan]
+
+        assert_same_as_legacy(rawdata_df, [3, 5], 1.0)
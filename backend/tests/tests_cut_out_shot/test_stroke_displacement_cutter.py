@@ -1,8 +1,12 @@
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 
+import numpy as np
 import pandas as pd
+import pytest
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
 from backend.cut_out_shot.stroke_displacement_cutter import StrokeDisplacementCutter
+from pandas.core.frame import DataFrame
 from pandas.testing import assert_frame_equal
 
 
@@ -22,7 +26,7 @@ class TestCutOutShot:
         )
 
         stroke_displacement_cutter.cut_out_shot(rawdata_df)
-        actual: List[dict] = stroke_displacement_cutter.cut_out_targets
+        actual: Dict[str, np.ndarray] = stroke_displacement_cutter.cut_out_targets
         actual_df = pd.DataFrame(actual)
 
         expected = [
@@ -129,7 +133,7 @@ class TestCutOutShot:
         )
 
         stroke_displacement_cutter.cut_out_shot(rawdata_df)
-        actual: List[dict] = stroke_displacement_cutter.cut_out_targets
+        actual: Dict[str, np.ndarray] = stroke_displacement_cutter.cut_out_targets
         actual_df = pd.DataFrame(actual)
 
         expected = [
@@ -166,3 +170,143 @@ class TestCutOutShot:
         expected_df = pd.DataFrame(expected)
 
         assert_frame_equal(actual_df, expected_df, check_like=True)
+
+
+class LegacyStrokeDisplacementCutter:
+    """1サンプルずつ判定する従来の実装。ベクトル化した実装の検証用"""
+
+    def __init__(self, start_stroke_displacement, end_stroke_displacement, margin, sensors):
+        self.__start_stroke_displacement = start_stroke_displacement
+        self.__end_stroke_displacement = end_stroke_displacement
+        self.__margin = margin
+        self.__shot_number = 0
+        self.__sequential_number = 0
+        self.__sequential_number_by_shot = 0
+        self.__is_shot_section = False
+        self.__is_target_of_cut_out = False
+        self.__sensors = sensors
+        self.cut_out_targets: List[dict] = []
+        self.shots_summary: List[dict] = []
+
+    def state(self):
+        return (
+            self.__shot_number,
+            self.__sequential_number,
+            self.__sequential_number_by_shot,
+            self.__is_shot_section,
+            self.__is_target_of_cut_out,
+        )
+
+    def cut_out_shot(self, rawdata_df: DataFrame) -> None:
+        for rawdata in rawdata_df.itertuples():
+            if (not self.__is_shot_section) and (
+                self.__end_stroke_displacement <= rawdata.stroke_displacement <= self.__start_stroke_displacement
+            ):
+                self.__is_shot_section = True
+                self.__is_target_of_cut_out = True
+                self.__shot_number += 1
+                self.__sequential_number_by_shot = 0
+                self.shots_summary.append({"shot_number": self.__shot_number, "timestamp": rawdata.timestamp})
+
+            if self.__is_shot_section and (rawdata.stroke_displacement > self.__start_stroke_displacement + self.__margin):
+                self.__is_shot_section = False
+
+            if not self.__is_shot_section:
+                continue
+
+            if self.__is_target_of_cut_out and (rawdata.stroke_displacement <= self.__end_stroke_displacement):
+                self.shots_summary[self.__shot_number - 1]["num_of_samples_in_cut_out"] = self.__sequential_number_by_shot
+                self.__is_target_of_cut_out = False
+
+            if not self.__is_target_of_cut_out:
+                continue
+
+            cut_out_target: dict = {
+                "timestamp": rawdata.timestamp,
+                "sequential_number": self.__sequential_number,
+                "sequential_number_by_shot": self.__sequential_number_by_shot,
+                "rawdata_sequential_number": int(rawdata.sequential_number),
+                "shot_number": self.__shot_number,
+                "tags": [],
+            }
+            for sensor in self.__sensors:
+                cut_out_target[sensor.sensor_id] = getattr(rawdata, sensor.sensor_id)
+
+            self.cut_out_targets.append(cut_out_target)
+            self.__sequential_number += 1
+            self.__sequential_number_by_shot += 1
+
+
+def create_noisy_rawdata_df(seed: int, num_of_samples: int) -> DataFrame:
+    """ノイズを含むストローク変位値（しきい値と一致する値を含むよう0.1単位に丸め）の生データ"""
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_of_samples)
+    noise = rng.normal(0.0, rng.uniform(0.0, 1.5), num_of_samples)
+    stroke_displacement = 40.0 + 8.0 * np.cos(2 * np.pi * t / rng.integers(20, 200)) + noise
+
+    return pd.DataFrame(
+        {
+            "sequential_number": t,
+            "timestamp": 1606786210.0 + t * 0.00001,
+            "stroke_displacement": np.round(stroke_displacement, 1),
+            "load01": rng.normal(size=num_of_samples),
+            "load02": rng.normal(size=num_of_samples),
+        }
+    )
+
+
+def assert_same_as_legacy(rawdata_df: DataFrame, split_positions: List[int], start: float, end: float, margin: float) -> None:
+    """ファイル分割位置ごとに両実装で切り出し、切り出し結果、サマリ、内部状態が一致することを確認する"""
+
+    sensors = [
+        DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement"),
+        DataCollectHistorySensor(sensor_id="load01", sensor_type_id="load"),
+        DataCollectHistorySensor(sensor_id="load02", sensor_type_id="load"),
+    ]
+    cutter = StrokeDisplacementCutter(start, end, margin, sensors)
+    legacy_cutter = LegacyStrokeDisplacementCutter(start, end, margin, sensors)
+
+    boundaries = [0] + split_positions + [len(rawdata_df)]
+    for df in (rawdata_df.iloc[s:e] for s, e in zip(boundaries[:-1], boundaries[1:])):
+        actual = pd.DataFrame(cutter.cut_out_shot(df))
+        legacy_cutter.cut_out_targets = []
+        legacy_cutter.cut_out_shot(df)
+        expected = pd.DataFrame(legacy_cutter.cut_out_targets)
+
+        if len(expected) == 0:
+            assert len(actual) == 0
+        else:
+            assert_frame_equal(actual, expected)
+
+        assert (
+            cutter._StrokeDisplacementCutter__shot_number,
+            cutter._StrokeDisplacementCutter__sequential_number,
+            cutter._StrokeDisplacementCutter__sequential_number_by_shot,
+            cutter._StrokeDisplacementCutter__is_shot_section,
+            cutter._StrokeDisplacementCutter__is_target_of_cut_out,
+        ) == legacy_cutter.state()
+
+    assert cutter.shots_summary == legacy_cutter.shots_summary
+
+
+class TestCutOutShotParity:
+    """従来の実装(1サンプルずつ判定)との一致確認"""
+
+    @pytest.mark.parametrize("split_position", range(14))
+    def test_normal_fixture_split(self, rawdata_df, split_position):
+        """正常系：fixtureをあらゆる位置で2ファイルに分割しても従来の実装と一致すること"""
+
+        for start, end, margin in ((47.0, 34.0, 0.1), (46.9, 34.0, 0.1), (47.0, 34.961, 0.0)):
+            assert_same_as_legacy(rawdata_df, [split_position], start, end, margin)
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_normal_noisy_waveform(self, seed):
+        """正常系：ノイズを含むランダムな波形、ランダムなファイル分割、負のマージンでも従来の実装と一致すること"""
+
+        rng = np.random.default_rng(seed)
+        rawdata_df = create_noisy_rawdata_df(seed, 3000)
+        split_positions = sorted(rng.choice(np.arange(1, 3000), size=rng.integers(0, 20), replace=False).tolist())
+
+        for margin in (0.5, 0.1, 0.0, -0.2):
+            assert_same_as_legacy(rawdata_df, split_positions, 44.0, 36.0, margin)
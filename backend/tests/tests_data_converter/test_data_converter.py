@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
+from backend.data_converter.data_converter import DataConverter
+from pandas.testing import assert_frame_equal
+
+
+def create_sensors():
+    return [
+        DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement", slope=-8.75, intercept=87.5),
+        DataCollectHistorySensor(sensor_id="load01", sensor_type_id="load", slope=2.5, intercept=-0.3),
+        DataCollectHistorySensor(sensor_id="bolt01", sensor_type_id="bolt", slope=0.1, intercept=1.2),
+        DataCollectHistorySensor(sensor_id="pulse", sensor_type_id="pulse", slope=5.0, intercept=5.0),
+    ]
+
+
+class TestConvertPhysicalValues:
+    def test_normal_same_as_scalar_formula(self):
+        """正常系：線形変換は slope * v + intercept、pulseは恒等変換と同じ結果になること"""
+
+        sensors = create_sensors()
+        values = np.random.default_rng(0).normal(size=(1000, len(sensors)))
+
+        actual = DataConverter.convert_physical_values(values, sensors)
+
+        expected = values.copy()
+        for i, s in enumerate(sensors[:3]):
+            expected[:, i] = [s.slope * v + s.intercept for v in values[:, i].tolist()]
+
+        np.testing.assert_array_equal(actual, expected)
+
+    def test_normal_non_linear_conversion(self):
+        """正常系：登録した非線形変換が該当センサー種別の列のみに適用されること"""
+
+        temperature = DataCollectHistorySensor(sensor_id="temperature", sensor_type_id="temperature", slope=1.0, intercept=0.0)
+        sensors = create_sensors() + [temperature]
+        values = np.array([[1.0, 1.0, 1.0, 1.0, 4.0], [2.0, 2.0, 2.0, 0.0, 9.0]])
+
+        DataConverter.register_non_linear_conversion("temperature", lambda v, s: np.sqrt(v))
+        try:
+            actual = DataConverter.convert_physical_values(values, sensors)
+        finally:
+            DataConverter.unregister_non_linear_conversion("temperature")
+
+        np.testing.assert_array_equal(actual[:, 4], [2.0, 3.0])
+        np.testing.assert_array_equal(actual[:, 3], [1.0, 0.0])
+
+    def test_exception_register_linear_type(self):
+        """異常系：線形変換のセンサー種別には非線形変換を登録できない"""
+
+        with pytest.raises(ValueError):
+            DataConverter.register_non_linear_conversion("load", lambda v, s: v)
+
+
+class TestPhysicalConvert:
+    def test_normal_df(self):
+        """正常系：DataFrameのセンサー列のみ変換されること"""
+
+        sensors = create_sensors()[:2]
+        df = pd.DataFrame({"timestamp": [1.0, 2.0], "stroke_displacement": [0.0, 1.0], "load01": [1.0, 2.0]})
+
+        actual = DataConverter.physical_convert_df(df, sensors)
+
+        expected = pd.DataFrame({"timestamp": [1.0, 2.0], "stroke_displacement": [87.5, 78.75], "load01": [2.2, 4.7]})
+
+        assert_frame_equal(actual, expected)
+
+    def test_normal_columns(self):
+        """正常系：列ごとの配列のセンサー列のみ変換されること"""
+
+        sensors = create_sensors()[1:3]
+        columns = {"shot_number": np.array([1, 2]), "load01": np.array([1.0, 2.0]), "bolt01": np.array([10.0, 20.0])}
+
+        actual = DataConverter.physical_convert_columns(columns, sensors)
+
+        np.testing.assert_array_equal(actual["shot_number"], [1, 2])
+        np.testing.assert_array_equal(actual["load01"], [2.5 * 1.0 - 0.3, 2.5 * 2.0 - 0.3])
+        np.testing.assert_array_equal(actual["bolt01"], [0.1 * 10.0 + 1.2, 0.1 * 20.0 + 1.2])
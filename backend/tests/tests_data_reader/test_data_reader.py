@@ -0,0 +1,285 @@
+"""
+ ==================================
+  test_data_reader.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from typing import Generator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from backend.common import common
+from backend.data_reader.data_reader import DataReader
+from pandas.core.frame import DataFrame
+
+
+@pytest.fixture(autouse=True)
+def num_of_samples_in_cut_out(mocker):
+    """ショットメタデータのサンプル数。デフォルトではショットメタデータがないものとする"""
+
+    return mocker.patch("backend.data_reader.data_reader.ElasticManager.get_num_of_samples_in_cut_out", return_value={})
+
+
+def create_docs(num_of_docs: int) -> List[dict]:
+    """shotsインデックスのドキュメント"""
+
+    return [
+        {
+            "sequential_number": i,
+            "timestamp": f"2021-08-06T10:00:00.{i:06d}",
+            "shot_number": i // 3 + 1,
+            "load01": i * 0.1,
+            "tags": [] if i % 2 else ["abnormal"],
+        }
+        for i in range(num_of_docs)
+    ]
+
+
+def fake_sliced_scan(docs: List[dict]):
+    """sequential_numberの剰余でsliceに振り分け、逆順に返すsliced_scanの代替"""
+
+    def sliced_scan(
+        index: str, slice_id: int, num_of_slices: int, query: Optional[dict] = None, size: int = 10_000, scroll: str = "5m"
+    ) -> Generator[dict, None, None]:
+        yield from reversed([doc for doc in docs if doc["sequential_number"] % num_of_slices == slice_id])
+
+    return sliced_scan
+
+
+def fake_search_after_scan(docs: List[dict]):
+    """クエリのショット番号で絞り込み、sortの昇順に返すsearch_after_scanの代替"""
+
+    def search_after_scan(
+        index: str, query: dict, sort: List[str], source: Optional[List[str]] = None, size: int = 10_000
+    ) -> Generator[dict, None, None]:
+        if "terms" in query["query"]:
+            targets = query["query"]["terms"]["shot_number"]
+        else:
+            shot_range = query["query"]["range"]["shot_number"]
+            targets = range(shot_range["gte"], shot_range["lte"] + 1)
+
+        hits = sorted((doc for doc in docs if doc["shot_number"] in targets), key=lambda doc: [doc[field] for field in sort])
+        for doc in hits:
+            yield doc if source is None else {k: v for k, v in doc.items() if k in source}
+
+    return search_after_scan
+
+
+class TestReadShotsByNumber:
+    def test_normal(self, mocker):
+        """正常系: 指定したショットのデータが1回のクエリで取得され、ショットごとに分割される"""
+
+        docs: List[dict] = create_docs(30)
+        mock_scan = mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(list(reversed(docs)))
+        )
+
+        actual = DataReader().read_shots_by_number("shots-tmp-data", [2, 5, 11])
+
+        assert mock_scan.call_count == 1
+        assert list(actual.keys()) == [2, 5]
+        for shot_number, shot_df in actual.items():
+            expected: DataFrame = pd.DataFrame([doc for doc in docs if doc["shot_number"] == shot_number])
+            pd.testing.assert_frame_equal(shot_df, expected)
+
+    def test_normal_fields(self, mocker):
+        """正常系: fieldsを指定した場合、そのフィールドとショット番号、連番のみを取得する"""
+
+        docs: List[dict] = create_docs(30)
+        mock_scan = mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(docs)
+        )
+
+        actual = DataReader().read_shots_by_number("shots-tmp-data", [1], fields=["load01"])
+
+        assert mock_scan.call_args.kwargs["source"] == ["shot_number", "sequential_number", "load01"]
+        assert list(actual[1].columns) == ["sequential_number", "shot_number", "load01"]
+
+    def test_normal_cache(self, mocker, shot_cache, num_of_samples_in_cut_out):
+        """正常系: 取得済みのショットはキャッシュから返し、キャッシュにないショットのみを取得する"""
+
+        docs: List[dict] = create_docs(30)
+        mock_scan = mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(docs)
+        )
+        num_of_samples_in_cut_out.side_effect = lambda index, shot_numbers: {shot_number: 3 for shot_number in shot_numbers}
+
+        DataReader().read_shots_by_number("shots-tmp-data", [1, 2])
+        actual = DataReader().read_shots_by_number("shots-tmp-data", [2, 3])
+
+        assert mock_scan.call_args.kwargs["query"] == {"query": {"terms": {"shot_number": [3]}}}
+        assert list(actual.keys()) == [2, 3]
+        pd.testing.assert_frame_equal(actual[2], pd.DataFrame(docs[3:6]))
+        assert shot_cache.stats()["hits"] == 1
+
+    def test_normal_no_cache_with_fields(self, mocker, shot_cache):
+        """正常系: 一部のフィールドのみを取得したショットはキャッシュしない"""
+
+        mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(create_docs(30))
+        )
+
+        DataReader().read_shots_by_number("shots-tmp-data", [1], fields=["load01"])
+
+        assert shot_cache.get("shots-tmp-data", 1) is None
+
+    def test_normal_no_cache_while_cutting_out(self, mocker, shot_cache, num_of_samples_in_cut_out):
+        """正常系: 切り出し中で一部のサンプルのみ登録されたショットはキャッシュせず、全サンプル登録後に取得したショットをキャッシュする"""
+
+        docs: List[dict] = create_docs(30)
+        inserted_docs: List[dict] = []
+        num_of_samples: dict = {}
+        mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(inserted_docs)
+        )
+        num_of_samples_in_cut_out.side_effect = lambda index, shot_numbers: {k: v for k, v in num_of_samples.items() if k in shot_numbers}
+
+        # ショット1の前半のみ登録された状態で取得
+        inserted_docs.extend(docs[0:2])
+        actual = DataReader().read_shots_by_number("shots-tmp-data", [1])
+
+        assert len(actual[1]) == 2
+        assert shot_cache.get("shots-tmp-data", 1) is None
+
+        # 残りが登録され、ショットメタデータにサンプル数が記録された後に取得
+        inserted_docs.extend(docs[2:3])
+        num_of_samples[1] = 3
+        actual = DataReader().read_shots_by_number("shots-tmp-data", [1])
+
+        pd.testing.assert_frame_equal(actual[1], pd.DataFrame(docs[0:3]))
+        pd.testing.assert_frame_equal(shot_cache.get("shots-tmp-data", 1), pd.DataFrame(docs[0:3]))
+
+    def test_normal_no_shots(self, mocker):
+        """正常系: ショット番号が空であればクエリせず空のdictを返す"""
+
+        mock_scan = mocker.patch("backend.data_reader.data_reader.ElasticManager.search_after_scan")
+
+        assert DataReader().read_shots_by_number("shots-tmp-data", []) == {}
+        mock_scan.assert_not_called()
+
+
+class TestReadShot:
+    def test_normal(self, mocker):
+        """正常系: 特定ショットのデータを連番の昇順で取得する"""
+
+        docs: List[dict] = create_docs(30)
+        mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(list(reversed(docs)))
+        )
+
+        actual: DataFrame = DataReader().read_shot("shots-tmp-data", 3)
+
+        pd.testing.assert_frame_equal(actual, pd.DataFrame(docs[6:9]))
+
+    def test_normal_no_data(self, mocker):
+        """正常系: データがなければNoneを返す"""
+
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan([]))
+
+        assert DataReader().read_shot("shots-tmp-data", 3) is None
+
+
+class TestReadShots:
+    def test_normal(self, mocker):
+        """正常系: endの1つ前のショットまでを連番の昇順で取得する"""
+
+        docs: List[dict] = create_docs(30)
+        mocker.patch(
+            "backend.data_reader.data_reader.ElasticManager.search_after_scan", side_effect=fake_search_after_scan(list(reversed(docs)))
+        )
+
+        actual: DataFrame = DataReader().read_shots("shots-tmp-data", 2, 4)
+
+        pd.testing.assert_frame_equal(actual, pd.DataFrame(docs[3:9]))
+
+
+class TestReadSlice:
+    def test_normal(self, mocker):
+        """正常系: 担当sliceのドキュメントがArrow IPCストリームを経由してDataFrameに変換される"""
+
+        docs: List[dict] = create_docs(10)
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.sliced_scan", side_effect=fake_sliced_scan(docs))
+
+        actual: DataFrame = DataReader._arrow_ipc_to_df(DataReader._read_slice("shots-tmp-data", 1, 2))
+        expected: DataFrame = pd.DataFrame(list(reversed(docs[1::2])))
+
+        pd.testing.assert_frame_equal(actual, expected)
+        assert isinstance(actual.tags[0], list)
+
+    def test_normal_missing_fields(self, mocker):
+        """正常系: ドキュメントによって含まれないフィールドは欠損値となる"""
+
+        docs: List[dict] = [
+            {"sequential_number": 0, "load01": 1.0},
+            {"sequential_number": 1, "load01": 2.0, "load02": 3.0},
+            {"sequential_number": 2, "load02": 4.0},
+        ]
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.sliced_scan", side_effect=lambda **kwargs: iter(docs))
+
+        actual: DataFrame = DataReader._arrow_ipc_to_df(DataReader._read_slice("shots-tmp-data", 0, 1))
+
+        pd.testing.assert_frame_equal(actual, pd.DataFrame(docs))
+
+    def test_normal_no_docs(self, mocker):
+        """正常系: ドキュメントがなければ空のDataFrameとなる"""
+
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.sliced_scan", side_effect=lambda **kwargs: iter([]))
+
+        actual: DataFrame = DataReader._arrow_ipc_to_df(DataReader._read_slice("shots-tmp-data", 0, 1))
+
+        assert len(actual) == 0
+
+
+class TestDocsToTable:
+    def test_normal_pages(self):
+        """正常系: ページを跨いで欠損するフィールド、ページによって型が異なるフィールドも、ドキュメントのリストと同じDataFrameになる"""
+
+        docs: List[dict] = [
+            {"sequential_number": 0, "load01": 1, "tags": []},
+            {"sequential_number": 1, "load01": 2, "tags": []},
+            {"sequential_number": 2, "load01": 3.5, "tags": ["abnormal"]},
+            {"sequential_number": 3, "tags": [], "load02": 4.0},
+            {"sequential_number": 4, "load01": 5.5, "tags": ["abnormal"]},
+        ]
+
+        actual: DataFrame = common.arrow_table_to_df(DataReader._docs_to_table(iter(docs), page_size=2))
+
+        pd.testing.assert_frame_equal(actual, pd.DataFrame(docs))
+        assert actual.tags.tolist() == [doc["tags"] for doc in docs]
+
+    def test_normal_no_docs(self):
+        """正常系: ドキュメントがなければ空のテーブルとなる"""
+
+        actual: pa.Table = DataReader._docs_to_table(iter([]), page_size=2)
+
+        assert actual.num_rows == 0
+        assert actual.num_columns == 0
+
+
+class TestMultiProcessReadAll:
+    def test_normal(self, mocker):
+        """正常系: 全sliceの結果が結合され、連番の昇順にソートされる"""
+
+        docs: List[dict] = create_docs(100)
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.count", return_value=len(docs))
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.sliced_scan", side_effect=fake_sliced_scan(docs))
+
+        actual: DataFrame = DataReader().multi_process_read_all("shots-tmp-data", num_of_process=3)
+
+        pd.testing.assert_frame_equal(actual, pd.DataFrame(docs))
+
+    def test_normal_no_data(self, mocker):
+        """正常系: データがなければNoneを返す"""
+
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.count", return_value=0)
+        mocker.patch("backend.data_reader.data_reader.ElasticManager.sliced_scan", side_effect=lambda **kwargs: iter([]))
+
+        actual: Optional[DataFrame] = DataReader().multi_process_read_all("shots-tmp-data", num_of_process=2)
+
+        assert actual is None
@@ -0,0 +1,54 @@
+"""
+ ==================================
+  conftest.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import pathlib
+from typing import List
+
+import numpy as np
+import pytest
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor
+from backend.file_manager.file_manager import FileInfo
+
+
+@pytest.fixture
+def recorder_sensors() -> List[DataCollectHistorySensor]:
+    """変位センサー1ch + 荷重センサー4chのセンサーリスト。変位センサーは先頭以外に定義しておく"""
+
+    sensors: List[DataCollectHistorySensor] = [DataCollectHistorySensor(sensor_id=f"load0{i}", sensor_type_id="load") for i in range(1, 3)]
+    sensors.append(DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement"))
+    sensors.extend(DataCollectHistorySensor(sensor_id=f"load0{i}", sensor_type_id="load") for i in range(3, 5))
+
+    yield sensors
+
+
+@pytest.fixture
+def sampling_frequency() -> int:
+    """100kHzサンプリング"""
+
+    yield 100_000
+
+
+@pytest.fixture
+def dat_files(tmp_path) -> List[FileInfo]:
+    """5chのdatファイルのfixture。丸め境界(x.xxx5)の値を含む"""
+
+    rng = np.random.default_rng(0)
+    files_info: List[FileInfo] = []
+
+    for file_number, num_of_samples in enumerate((1000, 777, 1)):
+        values: np.ndarray = rng.uniform(-100.0, 100.0, (num_of_samples, 5))
+        values[::3] = np.round(values[::3], 3) + 0.0005
+
+        dat_file: pathlib.Path = tmp_path / f"machine-01_gateway-01_handler-01_20201216-080058.620753_{file_number}.dat"
+        dat_file.write_bytes(values.astype("<f8").tobytes())
+        files_info.append(FileInfo(str(dat_file), 0.0))
+
+    yield files_info
@@ -0,0 +1,172 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from backend.app.models.data_collect_history import DataCollectHistory
+from backend.app.models.data_collect_history_gateway import DataCollectHistoryGateway
+from backend.app.models.data_collect_history_handler import DataCollectHistoryHandler
+from backend.app.services.cut_out_shot_service import CutOutShotService
+from backend.common import common
+from backend.data_recorder.data_recorder import DataRecorder
+from backend.file_manager.file_manager import FileInfo, FileManager
+from pandas.testing import assert_frame_equal
+
+
+class TestDecodeBinaryFile:
+    @pytest.mark.parametrize("sampling_frequency", [100_000, 33_333])
+    def test_normal_same_as_read_binary_files(self, dat_files, recorder_sensors, sampling_frequency):
+        """struct.unpackによる1行ずつのデコード結果と同一のDataFrame、連番が得られること"""
+
+        started_timestamp_ns = 1607071800_000000000
+
+        expected_seq, actual_seq = 10, 10
+
+        for file in dat_files:
+            samples, expected_seq = DataRecorder.read_binary_files(
+                file, expected_seq, started_timestamp_ns, recorder_sensors, sampling_frequency
+            )
+            actual, actual_seq = DataRecorder.decode_binary_file(
+                file, actual_seq, started_timestamp_ns, recorder_sensors, sampling_frequency
+            )
+
+            assert_frame_equal(actual, pd.DataFrame(samples))
+            assert list(actual.columns) == ["sequential_number", "timestamp", "stroke_displacement", "load01", "load02", "load03", "load04"]
+            assert actual["timestamp"].dtype == np.float64
+            assert actual_seq == expected_seq
+
+    def test_normal_timestamp_without_drift(self, dat_files, recorder_sensors):
+        """時刻は連番から求めるため、連番が大きくても開始時刻 + 連番 / サンプリング周波数からずれないこと"""
+
+        started_timestamp_ns = common.datetime_to_epoch_ns(datetime(2020, 12, 16, 8, 0, 58, 620753))
+        # 100kHzで約10日分収集した後の連番
+        sequential_number = 86_400 * 10 * 100_000
+
+        actual, _ = DataRecorder.decode_binary_file(dat_files[0], sequential_number, started_timestamp_ns, recorder_sensors, 100_000)
+
+        assert common.timestamp_to_epoch_ns(actual["timestamp"].to_numpy())[:3].tolist() == [
+            started_timestamp_ns + 86_400 * 10 * 1_000_000_000 + i * 10_000 for i in range(3)
+        ]
+
+    def test_normal_empty_file(self, tmp_path, recorder_sensors, sampling_frequency):
+        """空ファイルの場合は空のDataFrameを返し、連番は進まないこと"""
+
+        dat_file = tmp_path / "empty.dat"
+        dat_file.write_bytes(b"")
+
+        actual, seq = DataRecorder.decode_binary_file(FileInfo(str(dat_file), 0.0), 5, 1_500000000, recorder_sensors, sampling_frequency)
+
+        assert actual.empty
+        assert seq == 5
+
+    def test_normal_incomplete_record_is_truncated(self, dat_files, tmp_path, recorder_sensors, sampling_frequency):
+        """末尾の不完全なレコードは切り捨てられること"""
+
+        with open(dat_files[0].file_path, "rb") as f:
+            binary = f.read()
+
+        dat_file = tmp_path / "incomplete.dat"
+        dat_file.write_bytes(binary[: 8 * 5 * 3 + 12])
+
+        actual, seq = DataRecorder.decode_binary_file(FileInfo(str(dat_file), 0.0), 0, 0, recorder_sensors, sampling_frequency)
+
+        assert len(actual) == 3
+        assert seq == 3
+
+
+def create_handler(sampling_frequency: float, processed_dir_path: str) -> DataCollectHistoryHandler:
+    """出力先ディレクトリを持つハンドラー"""
+
+    history = DataCollectHistory(processed_dir_path=processed_dir_path)
+    gateway = DataCollectHistoryGateway(data_collect_history=history)
+    return DataCollectHistoryHandler(sampling_frequency=sampling_frequency, data_collect_history_gateway=gateway)
+
+
+class TestDataRecordParallel:
+    @pytest.mark.parametrize("storage", ["parquet", "pkl"])
+    @pytest.mark.parametrize("sampling_frequency", [100_000, 33_333, 3])
+    def test_normal_same_as_serial(self, dat_files, tmp_path, recorder_sensors, monkeypatch, storage, sampling_frequency):
+        """並列に処理した場合も、逐次処理と同一の生データファイルが出力されること"""
+
+        monkeypatch.setenv("RAWDATA_STORAGE", storage)
+        empty_file = tmp_path / "machine-01_gateway-01_handler-01_20201216-080058.620753_3.dat"
+        empty_file.write_bytes(b"")
+        files = dat_files + [FileInfo(str(empty_file), 0.0)]
+        started_timestamp_ns = common.datetime_to_epoch_ns(datetime(2020, 12, 16, 8, 0, 58, 620753))
+        (tmp_path / "serial").mkdir()
+        (tmp_path / "parallel").mkdir()
+
+        serial_handler = create_handler(sampling_frequency, str(tmp_path / "serial"))
+        parallel_handler = create_handler(sampling_frequency, str(tmp_path / "parallel"))
+
+        expected = DataRecorder.data_record(serial_handler, files, started_timestamp_ns, 0, recorder_sensors, is_manual=True)
+        actual = DataRecorder.data_record_parallel(parallel_handler, files, started_timestamp_ns, 0, recorder_sensors, num_of_process=2)
+
+        assert actual == expected
+        for file in files:
+            file_name = os.path.splitext(os.path.basename(file.file_path))[0] + f".{storage}"
+            assert_frame_equal(
+                FileManager.read_rawdata(str(tmp_path / "parallel" / file_name)),
+                FileManager.read_rawdata(str(tmp_path / "serial" / file_name)),
+            )
+
+    def test_normal_offsets_same_as_serial(self, dat_files, recorder_sensors, sampling_frequency):
+        """ファイルサイズから求めた連番の開始値が、逐次処理の値と同一であること"""
+
+        started_timestamp_ns = 1607071800_620753000
+
+        actual = DataRecorder._file_offsets(dat_files, len(recorder_sensors), 10)
+
+        sequential_number = 10
+        for file, offset in zip(dat_files, actual):
+            assert offset == sequential_number
+            _, sequential_number = DataRecorder.decode_binary_file(
+                file, sequential_number, started_timestamp_ns, recorder_sensors, sampling_frequency
+            )
+
+    def test_normal_offsets_mismatched(self, mocker, dat_files, tmp_path, recorder_sensors):
+        """開始値が前のファイルの終了値と一致しない場合は、以降のファイルを逐次処理し直すこと"""
+
+        started_timestamp_ns = 1607071800_000000000
+        (tmp_path / "serial").mkdir()
+        (tmp_path / "parallel").mkdir()
+        offsets = DataRecorder._file_offsets(dat_files, len(recorder_sensors), 0)
+        offsets[1] += 1
+        mocker.patch.object(DataRecorder, "_file_offsets", return_value=offsets)
+
+        DataRecorder.data_record(
+            create_handler(100_000, str(tmp_path / "serial")), dat_files, started_timestamp_ns, 0, recorder_sensors, is_manual=True
+        )
+        DataRecorder.data_record_parallel(
+            create_handler(100_000, str(tmp_path / "parallel")), dat_files, started_timestamp_ns, 0, recorder_sensors, num_of_process=2
+        )
+
+        for file in dat_files:
+            file_name = os.path.splitext(os.path.basename(file.file_path))[0] + ".parquet"
+            assert_frame_equal(
+                FileManager.read_rawdata(str(tmp_path / "parallel" / file_name)),
+                FileManager.read_rawdata(str(tmp_path / "serial" / file_name)),
+            )
+
+
+class TestPreviewTimestamps:
+    @pytest.mark.parametrize("sampling_frequency", [100_000, 33_333])
+    def test_normal_same_as_recorded(self, dat_files, recorder_sensors, sampling_frequency):
+        """datファイルのプレビューの連番、時刻、センサー値が、データ記録で出力される値と同一であること"""
+
+        started_timestamp_ns = common.datetime_to_epoch_ns(datetime(2020, 12, 16, 8, 0, 58, 620753))
+        recorded = []
+        sequential_number = 0
+        for file in dat_files:
+            samples, sequential_number = DataRecorder.decode_binary_file(
+                file, sequential_number, started_timestamp_ns, recorder_sensors, sampling_frequency
+            )
+            recorded.append(samples)
+
+        actual = CutOutShotService.fetch_dat_df(
+            [f.file_path for f in dat_files], 1, recorder_sensors, started_timestamp_ns, sampling_frequency, 3, 7, 50
+        )
+
+        expected = recorded[1].iloc[3::7].head(50).reset_index(drop=True)
+        assert_frame_equal(actual, expected)
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+import pytest
+from backend.elastic_manager.bulk_indexer import BulkIndexer
+from backend.elastic_manager.elastic_manager import BulkInsertError, BulkInsertResult, ElasticManager
+
+
+def consume(inserted, wait=None):
+    """ドキュメントを読み出してinsertedに追加するparallel_bulk_insertのモック"""
+
+    def parallel_bulk_insert(docs, index, **kwargs):
+        for doc in docs:
+            if wait is not None:
+                wait.wait()
+            inserted.append(doc)
+        return BulkInsertResult(success=len(inserted))
+
+    return parallel_bulk_insert
+
+
+class TestBulkIndexer:
+    def test_normal(self, mocker):
+        """正常系: キューに追加した全データが1件ずつのドキュメントとして格納される"""
+
+        inserted = []
+        mocker.patch.object(ElasticManager, "parallel_bulk_insert", side_effect=consume(inserted))
+
+        with BulkIndexer("tmp_index", num_of_threads=3, queue_size=1) as indexer:
+            for i in range(10):
+                indexer.put({"shot_number": np.array([i, i]), "machine_id": "machine-01"})
+
+        assert [x["shot_number"] for x in inserted] == [i for i in range(10) for _ in range(2)]
+        assert indexer.result.success == 20
+
+    def test_normal_bounded_queue(self, mocker):
+        """正常系: 格納が終わらない間は、キューの上限を超えて追加できない"""
+
+        released = threading.Event()
+        mocker.patch.object(ElasticManager, "parallel_bulk_insert", side_effect=consume([], wait=released))
+
+        indexer = BulkIndexer("tmp_index", queue_size=1)
+        indexer.start()
+        indexer.put({"shot_number": np.array([1])})  # 格納スレッドが取り出して待機
+        indexer.put({"shot_number": np.array([2])})  # キューに残る
+
+        producer = threading.Thread(target=indexer.put, args=({"shot_number": np.array([3])},))
+        producer.start()
+        producer.join(timeout=0.2)
+
+        assert producer.is_alive()
+
+        released.set()
+        producer.join()
+        indexer.close()
+
+    def test_exception(self, mocker):
+        """異常系: 格納スレッドの例外が呼び出し元に送出される"""
+
+        mocker.patch.object(ElasticManager, "parallel_bulk_insert", side_effect=ConnectionError("refused"))
+
+        with pytest.raises(ConnectionError):
+            with BulkIndexer("tmp_index", queue_size=1) as indexer:
+                for i in range(5):
+                    indexer.put({"shot_number": np.array([i])})
+
+    def test_exception_raise_on_error(self, mocker):
+        """異常系: raise_on_errorの場合、投入に失敗したドキュメントがあればcloseでBulkInsertErrorが送出される"""
+
+        mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((False, {}) for _ in actions),
+        )
+        mocker.patch.object(ElasticManager, "get_client")
+
+        with pytest.raises(BulkInsertError):
+            with BulkIndexer("tmp_index", queue_size=1, raise_on_error=True) as indexer:
+                indexer.put({"shot_number": np.array([1, 2])})
@@ -9,8 +9,42 @@
 
 """
 
+from datetime import datetime
+
 import elasticsearch
-from backend.elastic_manager.elastic_manager import ElasticManager
+import numpy as np
+import pandas as pd
+import pytest
+from backend.elastic_manager import elastic_manager
+from backend.elastic_manager.elastic_manager import BulkInsertError, ElasticManager
+
+
+class TestGetClient:
+    def test_normal_reuse_in_process(self):
+        """正常系: 同一プロセス内では同じクライアントが返る"""
+
+        assert ElasticManager.get_client() is ElasticManager.get_client()
+
+    def test_normal_new_client_after_fork(self, mocker):
+        """正常系: PIDが変わった(fork後の)プロセスでは新しいクライアントが生成される"""
+
+        client = ElasticManager.get_client()
+
+        mocker.patch("os.getpid", return_value=-1)
+        forked_client = ElasticManager.get_client()
+
+        assert forked_client is not client
+        assert ElasticManager.get_client() is forked_client
+
+    def test_normal_pool_settings(self):
+        """正常系: コネクションプールとリトライの設定が反映される"""
+
+        client = ElasticManager.create_client(maxsize=7, keep_alive=False)
+        connection = client.transport.get_connection()
+
+        assert connection.pool.pool.maxsize == 7
+        assert connection.headers["connection"] == "close"
+        assert client.transport.max_retries == elastic_manager.ELASTIC_MAX_RETRIES
 
 
 class TestGetLatestIndex:
@@ -43,6 +77,38 @@ class TestGetLatestIndex:
         assert actual == expected
 
 
+class TestGetNumOfSamplesInCutOut:
+    def test_normal(self, mocker):
+        """正常系: 対応するショットメタデータインデックスから、サンプル数が記録されたショットのサンプル数のみを返す"""
+
+        mocker.patch.object(ElasticManager, "exists_index", return_value=True)
+        mock_get_docs = mocker.patch.object(
+            ElasticManager,
+            "get_docs",
+            return_value=[
+                {"shot_number": 1, "num_of_samples_in_cut_out": 3},
+                {"shot_number": 2, "num_of_samples_in_cut_out": None},
+                {"shot_number": 3},
+            ],
+        )
+
+        actual = ElasticManager.get_num_of_samples_in_cut_out("shots-machine-01-20210327141514-data", [1, 2, 3])
+
+        assert actual == {1: 3}
+        assert mock_get_docs.call_args.kwargs["index"] == "shots-machine-01-20210327141514-meta"
+        assert mock_get_docs.call_args.kwargs["query"]["query"] == {"terms": {"shot_number": [1, 2, 3]}}
+
+    def test_normal_no_meta_index(self, mocker):
+        """正常系: ショットメタデータインデックスがない、またはショットデータインデックスでなければ空のdictを返す"""
+
+        mocker.patch.object(ElasticManager, "exists_index", return_value=False)
+        mock_get_docs = mocker.patch.object(ElasticManager, "get_docs")
+
+        assert ElasticManager.get_num_of_samples_in_cut_out("shots-machine-01-20210327141514-data", [1]) == {}
+        assert ElasticManager.get_num_of_samples_in_cut_out("tmp_index", [1]) == {}
+        mock_get_docs.assert_not_called()
+
+
 class TestDeleteDataBySeqNum:
     def test_normal(self, mocker):
         """正常系：delete_by_queryが一度のみ呼び出されること"""
@@ -153,3 +219,203 @@ class TestDeleteDataByShotNum:
         ElasticManager.delete_data_by_shot_num("tmp_index", 1)
 
         mock_delete_by_query.assert_called_once()
+
+
+class TestGenerateDocsFromColumns:
+    def test_normal(self):
+        """正常系: 列ごとの配列から1件ずつドキュメントが生成され、配列でない値は全ドキュメント共通となる"""
+
+        tags = np.empty(3, dtype=object)
+        tags[:] = [[], [], []]
+        columns = {
+            "timestamp": np.array(["2020-12-01T10:30:10.111111", "2020-12-01T10:30:11", "2020-12-01T10:30:12"], dtype="datetime64[us]"),
+            "shot_number": np.array([1, 1, 2]),
+            "load01": np.array([0.1, 0.2, 0.3]),
+            "tags": tags,
+            "machine_id": "machine-01",
+        }
+
+        actual = list(ElasticManager.generate_docs_from_columns(columns, block_size=2))
+
+        expected = [
+            {"timestamp": datetime(2020, 12, 1, 10, 30, 10, 111111), "shot_number": 1, "load01": 0.1, "tags": [], "machine_id": "machine-01"},  # noqa
+            {"timestamp": datetime(2020, 12, 1, 10, 30, 11), "shot_number": 1, "load01": 0.2, "tags": [], "machine_id": "machine-01"},
+            {"timestamp": datetime(2020, 12, 1, 10, 30, 12), "shot_number": 2, "load01": 0.3, "tags": [], "machine_id": "machine-01"},
+        ]
+
+        assert actual == expected
+        assert all(type(doc["timestamp"]) is datetime and type(doc["shot_number"]) is int for doc in actual)
+
+    def test_normal_empty(self):
+        """正常系: 空の配列からはドキュメントが生成されない"""
+
+        columns = {"shot_number": np.array([], dtype=np.int64), "machine_id": "machine-01"}
+
+        actual = list(ElasticManager.generate_docs_from_columns(columns))
+
+        assert actual == []
+
+
+class TestGenerateDocsFromDf:
+    def test_normal(self):
+        """正常系: to_dict(orient="records")と同じドキュメントが生成される"""
+
+        df = pd.DataFrame(
+            {
+                "timestamp": pd.date_range("2021-08-06", periods=3, freq="1ms"),
+                "shot_number": [1, 2, 3],
+                "load": ["load01", "load02", "load03"],
+                "value": [0.1, 0.2, 0.3],
+            }
+        )
+
+        actual = list(ElasticManager.generate_docs_from_df(df, block_size=2))
+
+        assert actual == df.to_dict(orient="records")
+
+
+class TestParallelBulkInsert:
+    @pytest.fixture(autouse=True)
+    def mock_client(self, mocker):
+        yield mocker.patch.object(ElasticManager, "get_client").return_value
+
+    def test_normal(self, mocker, mock_client):
+        """正常系: 全件成功した場合、成功件数が返る。既定ではインデックスをリフレッシュしない"""
+
+        mock_parallel_bulk = mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((True, {}) for _ in actions),
+        )
+
+        docs = ({"shot_number": i} for i in range(10))
+        actual = ElasticManager.parallel_bulk_insert(docs, "tmp_index", chunk_size=3, max_chunk_bytes=1024)
+
+        assert (actual.success, actual.failed) == (10, 0)
+        assert mock_parallel_bulk.call_args.kwargs["chunk_size"] == 3
+        assert mock_parallel_bulk.call_args.kwargs["max_chunk_bytes"] == 1024
+        mock_client.indices.refresh.assert_not_called()
+
+    def test_normal_refresh(self, mocker, mock_client):
+        """正常系: refreshを指定した場合、投入後にインデックスがリフレッシュされる"""
+
+        mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((True, {}) for _ in actions),
+        )
+
+        ElasticManager.parallel_bulk_insert(({"shot_number": i} for i in range(3)), "tmp_index", refresh=True)
+
+        mock_client.indices.refresh.assert_called_once_with(index="tmp_index")
+
+    def test_normal_keep_shot_cache(self, mocker, shot_cache):
+        """正常系: ドキュメントの追加ではショットキャッシュを無効化しない"""
+
+        mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((True, {}) for _ in actions),
+        )
+        shot_cache.put("tmp_index", 1, pd.DataFrame({"shot_number": [1], "sequential_number": [0]}))
+
+        ElasticManager.parallel_bulk_insert(({"shot_number": i} for i in range(3)), "tmp_index")
+
+        assert shot_cache.get("tmp_index", 1) is not None
+
+    def test_normal_failed_docs(self, mocker):
+        """正常系: 失敗したドキュメントの件数とエラーが返る"""
+
+        error = {"index": {"status": 400, "error": {"type": "mapper_parsing_exception"}}}
+        mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((i % 2 == 0, error) for i, _ in enumerate(actions)),
+        )
+
+        actual = ElasticManager.parallel_bulk_insert(({"shot_number": i} for i in range(10)), "tmp_index")
+
+        assert (actual.success, actual.failed) == (5, 5)
+        assert actual.errors == [error] * 5
+
+    def test_exception_raise_on_error(self, mocker):
+        """異常系: raise_on_errorの場合、失敗したドキュメントがあれば例外を送出する"""
+
+        mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.parallel_bulk",
+            side_effect=lambda client, actions, **kwargs: ((False, {}) for _ in actions),
+        )
+
+        with pytest.raises(BulkInsertError):
+            ElasticManager.parallel_bulk_insert(({"shot_number": i} for i in range(3)), "tmp_index", raise_on_error=True)
+
+
+class TestSlicedScan:
+    def test_normal(self, mocker):
+        """正常系: slice指定付きでscanし、_sourceを返す"""
+
+        mock_scan = mocker.patch(
+            "backend.elastic_manager.elastic_manager.helpers.scan", return_value=iter([{"_source": {"sequential_number": 1}}])
+        )
+
+        actual = list(ElasticManager.sliced_scan("tmp_index", 1, 4, query={"query": {"match_all": {}}}))
+
+        assert actual == [{"sequential_number": 1}]
+        assert mock_scan.call_args.kwargs["query"] == {"query": {"match_all": {}}, "slice": {"id": 1, "max": 4}}
+
+    def test_normal_single_slice(self, mocker):
+        """正常系: 分割数が1の場合はslice指定しない"""
+
+        mock_scan = mocker.patch("backend.elastic_manager.elastic_manager.helpers.scan", return_value=iter([]))
+
+        list(ElasticManager.sliced_scan("tmp_index", 0, 1))
+
+        assert mock_scan.call_args.kwargs["query"] == {}
+
+
+class TestSearchAfterScan:
+    def test_normal(self, mocker):
+        """正常系: 取得件数がsize未満になるまで、前ページ末尾のsort値をsearch_afterに指定して取得する"""
+
+        hits = [{"_source": {"sequential_number": i}, "sort": [i]} for i in range(5)]
+        pages = [{"hits": {"hits": hits[0:2]}}, {"hits": {"hits": hits[2:4]}}, {"hits": {"hits": hits[4:5]}}]
+        bodies = []
+
+        def search(index, body, size):
+            bodies.append(dict(body))
+            return pages[len(bodies) - 1]
+
+        mock_client = mocker.MagicMock()
+        mock_client.search.side_effect = search
+        mocker.patch.object(ElasticManager, "get_client", return_value=mock_client)
+
+        query = {"query": {"match_all": {}}}
+        actual = list(ElasticManager.search_after_scan("tmp_index", query, ["sequential_number"], source=["a"], size=2))
+
+        assert actual == [{"sequential_number": i} for i in range(5)]
+        assert [body.get("search_after") for body in bodies] == [None, [1], [3]]
+        assert bodies[0]["sort"] == [{"sequential_number": {"order": "asc"}}]
+        assert bodies[0]["_source"] == ["a"]
+
+
+class TestUpdateDocs:
+    def test_normal(self, mocker):
+        """正常系: 複数documentを1回のbulkリクエストで更新する"""
+
+        mocker.patch.object(ElasticManager, "exists_index", return_value=True)
+        mocker.patch.object(ElasticManager, "get_client")
+        mock_bulk = mocker.patch("backend.elastic_manager.elastic_manager.helpers.bulk", return_value=(2, []))
+
+        actual = ElasticManager.update_docs("tmp_index", ["id-1", "id-2"], {"predicted": True})
+
+        assert actual == 2
+        assert mock_bulk.call_count == 1
+        assert mock_bulk.call_args.args[1] == [
+            {"_op_type": "update", "_index": "tmp_index", "_id": "id-1", "doc": {"predicted": True}},
+            {"_op_type": "update", "_index": "tmp_index", "_id": "id-2", "doc": {"predicted": True}},
+        ]
+        assert mock_bulk.call_args.kwargs["refresh"] is True
+
+    def test_normal_no_ids(self, mocker):
+        """正常系: 更新対象がなければリクエストしない"""
+
+        mock_bulk = mocker.patch("backend.elastic_manager.elastic_manager.helpers.bulk")
+
+        assert ElasticManager.update_docs("tmp_index", [], {"predicted": True}) == 0
+        mock_bulk.assert_not_called()
@@ -0,0 +1,152 @@
+"""
+ ==================================
+  test_shot_cache.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import os
+
+import pandas as pd
+from backend.elastic_manager import shot_cache as shot_cache_module
+from backend.elastic_manager.shot_cache import ShotCache
+from pandas.core.frame import DataFrame
+
+
+def create_shot_df(shot_number: int, num_of_samples: int = 10) -> DataFrame:
+    return pd.DataFrame(
+        {
+            "timestamp": [f"2021-08-06T10:00:00.{i:06d}" for i in range(num_of_samples)],
+            "sequential_number": range(shot_number * 100, shot_number * 100 + num_of_samples),
+            "sequential_number_by_shot": range(num_of_samples),
+            "shot_number": shot_number,
+            "load01": [i * 0.1 for i in range(num_of_samples)],
+            "tags": [["abnormal"] if i == 0 else [] for i in range(num_of_samples)],
+        }
+    )
+
+
+class TestShotCache:
+    def test_normal_hit(self, shot_cache):
+        """正常系: キャッシュしたショットが取得でき、ヒット数が増える"""
+
+        expected: DataFrame = create_shot_df(1)
+        shot_cache.put("shots-tmp-data", 1, expected)
+
+        actual = shot_cache.get("shots-tmp-data", 1)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        assert shot_cache.stats()["hits"] == 1
+        assert shot_cache.stats()["misses"] == 0
+
+    def test_normal_miss(self, shot_cache):
+        """正常系: キャッシュにないショットはNoneとなり、ミス数が増える"""
+
+        assert shot_cache.get("shots-tmp-data", 1) is None
+        assert shot_cache.stats()["misses"] == 1
+
+    def test_normal_copy(self, shot_cache):
+        """正常系: 取得したDataFrameを変更してもキャッシュに影響しない"""
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+
+        df: DataFrame = shot_cache.get("shots-tmp-data", 1)
+        df["load01"] = 0.0
+
+        pd.testing.assert_frame_equal(shot_cache.get("shots-tmp-data", 1), create_shot_df(1))
+
+    def test_normal_fields(self, shot_cache):
+        """正常系: fieldsを指定した場合、そのフィールドとショット番号、連番のみを返す"""
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+
+        actual = shot_cache.get("shots-tmp-data", 1, fields=["load01"])
+
+        assert list(actual.columns) == ["sequential_number", "shot_number", "load01"]
+        assert shot_cache.get("shots-tmp-data", 1, fields=["load02"]) is None
+
+    def test_normal_disk(self, shot_cache):
+        """正常系: プロセス内のキャッシュにないショットはディスクキャッシュから取得する"""
+
+        expected: DataFrame = create_shot_df(1)
+        shot_cache.put("shots-tmp-data", 1, expected)
+        shot_cache.clear()
+
+        actual = shot_cache.get("shots-tmp-data", 1)
+
+        pd.testing.assert_frame_equal(actual, expected)
+        assert isinstance(actual.tags[0], list)
+        assert shot_cache.stats()["disk_hits"] == 1
+
+    def test_normal_lru(self, shot_cache, mocker):
+        """正常系: バイト数の上限を超えた場合、最も古く参照されたショットから破棄する"""
+
+        shot_bytes: int = int(create_shot_df(1).memory_usage(deep=True).sum())
+        mocker.patch.object(shot_cache_module, "SHOT_CACHE_MAX_BYTES", shot_bytes * 2)
+        mocker.patch.object(shot_cache_module, "SHOT_CACHE_DISK_ENABLED", False)
+        mocker.patch.object(ShotCache, "_cache_dir", return_value=None)
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+        shot_cache.put("shots-tmp-data", 2, create_shot_df(2))
+        shot_cache.get("shots-tmp-data", 1)
+        shot_cache.put("shots-tmp-data", 3, create_shot_df(3))
+
+        assert shot_cache.get("shots-tmp-data", 2) is None
+        assert shot_cache.get("shots-tmp-data", 1) is not None
+        assert shot_cache.get("shots-tmp-data", 3) is not None
+        assert shot_cache.stats()["bytes"] <= shot_bytes * 2
+
+    def test_normal_invalidate(self, shot_cache):
+        """正常系: 無効化したインデックスのショットはプロセス内、ディスクともに取得できない"""
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+        shot_cache.put("shots-other-data", 1, create_shot_df(1))
+
+        shot_cache.invalidate("shots-tmp-data")
+
+        assert shot_cache.get("shots-tmp-data", 1) is None
+        shot_cache.clear()
+        assert shot_cache.get("shots-tmp-data", 1) is None
+        assert shot_cache.get("shots-other-data", 1) is not None
+
+    def test_normal_invalidate_by_other_process(self, shot_cache, tmp_path):
+        """正常系: 他プロセスで世代が更新された場合、プロセス内のキャッシュも使わない"""
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+
+        (tmp_path / "shot_cache" / "shots-tmp-data" / "generation").write_text("updated-by-other-process")
+
+        assert shot_cache.get("shots-tmp-data", 1) is None
+
+    def test_normal_put_stale_generation(self, shot_cache):
+        """正常系: 取得中に無効化された場合、取得したショットはキャッシュしない"""
+
+        generation: str = shot_cache.generation("shots-tmp-data")
+        shot_cache.invalidate("shots-tmp-data")
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1), generation)
+
+        assert shot_cache.get("shots-tmp-data", 1) is None
+
+    def test_normal_disk_eviction(self, shot_cache, mocker, tmp_path):
+        """正常系: ディスクキャッシュが上限を超えた場合、最終参照日時の古いファイルから削除する"""
+
+        shot_cache.put("shots-tmp-data", 1, create_shot_df(1))
+        shot_file = tmp_path / "shot_cache" / "shots-tmp-data" / shot_cache.generation("shots-tmp-data") / "1.parquet"
+        file_bytes: int = os.path.getsize(shot_file)
+        mocker.patch.object(shot_cache_module, "SHOT_CACHE_DISK_MAX_BYTES", int(file_bytes * 2.5))
+
+        shot_cache.put("shots-other-data", 2, create_shot_df(2))
+        os.utime(shot_file, (0, 0))
+        shot_cache.put("shots-tmp-data", 3, create_shot_df(3))
+        shot_cache.clear()
+
+        disk_bytes: int = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(tmp_path / "shot_cache") for f in files)
+        assert disk_bytes <= file_bytes * 2.5
+        assert shot_cache.get("shots-tmp-data", 1) is None
+        assert shot_cache.get("shots-other-data", 2) is not None
+        assert shot_cache.get("shots-tmp-data", 3) is not None
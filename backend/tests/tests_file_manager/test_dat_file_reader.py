@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from backend.file_manager.dat_file_reader import DatFileReader
+
+
+@pytest.fixture
+def dat_file(tmp_path):
+    """5ch x 100行のdatファイル。値は行番号*10+チャネル番号"""
+
+    values = np.arange(100)[:, None] * 10.0 + np.arange(5)[None, :]
+    file_path = tmp_path / "test-machine-01_gw_handler_20201216-080058.620753_1.dat"
+    # 末尾に不完全な行を含める
+    file_path.write_bytes(values.astype("<f8").tobytes() + b"\x00" * 12)
+
+    yield str(file_path), values
+
+
+class TestDatFileReader:
+    def test_normal_count_samples(self, dat_file):
+        """正常系：不完全な行を除いたサンプル数が得られること"""
+
+        file_path, values = dat_file
+
+        assert DatFileReader(file_path, 5).num_of_samples == 100
+
+    def test_normal_read_range_and_stride(self, dat_file):
+        """正常系：offset, stride, limitで指定した行のみ読み込めること"""
+
+        file_path, values = dat_file
+        reader = DatFileReader(file_path, 5)
+
+        np.testing.assert_array_equal(reader.read(), values)
+        np.testing.assert_array_equal(reader.read(offset=10, limit=5), values[10:15])
+        np.testing.assert_array_equal(reader.read(offset=3, limit=10, stride=10), values[3::10])
+        np.testing.assert_array_equal(reader.read(offset=95, limit=10, stride=2), values[95::2])
+
+    def test_normal_read_out_of_range(self, dat_file):
+        """正常系：範囲外のoffsetでは空の配列が返ること"""
+
+        file_path, _ = dat_file
+
+        actual = DatFileReader(file_path, 5).read(offset=100)
+
+        assert actual.shape == (0, 5)
+
+    def test_abnormal_invalid_stride(self, dat_file):
+        """異常系：strideが1未満の場合はValueError"""
+
+        file_path, _ = dat_file
+
+        with pytest.raises(ValueError):
+            DatFileReader(file_path, 5).read(stride=0)
+
+    def test_normal_count_preceding_samples(self, dat_file, tmp_path):
+        """正常系：各ファイルの先頭の連番がそれ以前のファイルのサンプル数の累計となること"""
+
+        file_path, _ = dat_file
+        file_path_2 = tmp_path / "test-machine-01_gw_handler_20201216-080059.620753_2.dat"
+        file_path_2.write_bytes(np.zeros((7, 5)).astype("<f8").tobytes())
+
+        actual = DatFileReader.count_preceding_samples([file_path, str(file_path_2), file_path], 5)
+
+        assert actual == [0, 100, 107]
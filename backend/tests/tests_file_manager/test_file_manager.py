@@ -1,8 +1,13 @@
 import pathlib
 from datetime import datetime
+from decimal import Decimal
 
+import numpy as np
+import pandas as pd
+import pytest
 from backend.app.models.data_collect_history_handler import DataCollectHistoryHandler
-from backend.file_manager.file_manager import FileInfo, FileManager
+from backend.file_manager.file_manager import FileInfo, FileManager, RawdataStorage
+from pandas.testing import assert_frame_equal
 
 
 class TestCreateFileTimestamp:
@@ -237,6 +242,85 @@ class TestGetFiles:
         assert actual == expected
 
 
+class TestRawdataStorage:
+    @staticmethod
+    def create_samples() -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "sequential_number": [0, 1, 2],
+                "timestamp": [Decimal(1607072458.62), Decimal(1607072458.62001), Decimal(1607072458.62002)],
+                "stroke_displacement": [10.0, 9.5, 9.0],
+                "load01": [1.1, 1.2, 1.3],
+            }
+        )
+
+    def test_normal_parquet_typed_columns(self, tmp_path, monkeypatch):
+        """正常系：parquet形式で型を揃えて出力され、必要な列のみ読み込めること"""
+
+        monkeypatch.setenv("RAWDATA_STORAGE", "parquet")
+        monkeypatch.setenv("RAWDATA_SENSOR_DTYPE", "float32")
+
+        file = FileInfo(str(tmp_path / "test-machine-01_gw_handler_20201216-080058.620753_1.dat"), 0.0)
+        file_path = FileManager.export_rawdata(self.create_samples(), file, str(tmp_path))
+
+        assert file_path.endswith(".parquet")
+
+        actual = FileManager.read_rawdata(file_path)
+
+        assert actual.dtypes.to_dict() == {
+            "sequential_number": np.dtype("int64"),
+            "timestamp": np.dtype("float64"),
+            "stroke_displacement": np.dtype("float32"),
+            "load01": np.dtype("float32"),
+        }
+        assert actual["timestamp"].tolist() == [1607072458.62, 1607072458.62001, 1607072458.62002]
+
+        actual_selected = FileManager.read_rawdata(file_path, columns=["stroke_displacement", "not_exists"])
+
+        assert list(actual_selected.columns) == ["stroke_displacement"]
+
+    def test_normal_pickle_readable(self, tmp_path):
+        """正常系：既存のpickleファイルも読み込めること"""
+
+        file_path = tmp_path / "test-machine-01_gw_handler_20201216-080058.620753_1.pkl"
+        expected = self.create_samples()
+        expected.to_pickle(file_path)
+
+        actual = FileManager.read_rawdata(str(file_path), columns=["timestamp", "load01"])
+
+        assert_frame_equal(actual, expected[["timestamp", "load01"]])
+
+    def test_exception_abstract_storage(self):
+        """異常系：保存形式を実装していないストレージは生成できないこと"""
+
+        with pytest.raises(TypeError):
+            RawdataStorage()  # type: ignore
+
+    def test_normal_get_rawdata_files(self, tmp_path):
+        """正常系：pkl/parquetを名前順に取得し、同名ファイルはparquetを優先すること"""
+
+        machine_id = "test-machine-01"
+
+        tmp_file_1 = tmp_path / f"{machine_id}_gw_handler_20201216-075958.708968_1.pkl"
+        tmp_file_2 = tmp_path / f"{machine_id}_gw_handler_20201216-080000.280213_2.pkl"
+        tmp_file_3 = tmp_path / f"{machine_id}_gw_handler_20201216-080000.280213_2.parquet"
+        tmp_file_4 = tmp_path / f"{machine_id}_gw_handler_20201216-080001.853297_3.parquet"
+        tmp_file_5 = tmp_path / f"{machine_id}_gw_handler_20201216-080001.853297_3.dat"
+
+        for tmp_file in (tmp_file_1, tmp_file_2, tmp_file_3, tmp_file_4, tmp_file_5):
+            tmp_file.write_text("")
+
+        actual = FileManager.get_rawdata_files(str(tmp_path), machine_id)
+
+        expected = [
+            tmp_file_1._str,
+            tmp_file_3._str,
+            tmp_file_4._str,
+        ]
+
+        assert actual == expected
+
+
 # class TestGetPickleFileList:
 #     def test_normal_two_handler(self, tmp_path):
 #         machine_id = "test-machine-01"
@@ -0,0 +1,122 @@
+"""
+ ==================================
+  test_file_watcher.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import os
+import pathlib
+import time
+from typing import List
+
+import pytest
+from backend.file_manager.file_watcher import FileWatcher
+
+TIMEOUT: float = 5.0
+
+
+def write_file(path: pathlib.Path, size: int = 1024) -> None:
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+class TestFileWatcher:
+    def test_normal_close_write(self, tmp_path):
+        """書き込みが完了したファイルが、サイズ安定確認を待たずに渡されること"""
+
+        with FileWatcher(str(tmp_path), ["*.dat"], stable_seconds=60.0) as watcher:
+            started: float = time.monotonic()
+            write_file(tmp_path / "m_g_h_20201216-080058.620753_1.dat")
+
+            actual = watcher.get(timeout=TIMEOUT)
+
+            assert actual == str(tmp_path / "m_g_h_20201216-080058.620753_1.dat")
+            assert time.monotonic() - started < 1.0
+
+    def test_normal_rename(self, tmp_path):
+        """一時ファイル名からrenameされたファイルが、rename後のパスで渡されること"""
+
+        with FileWatcher(str(tmp_path), ["*.dat"], stable_seconds=60.0) as watcher:
+            write_file(tmp_path / "m_1.tmp")
+            os.rename(tmp_path / "m_1.tmp", tmp_path / "m_1.dat")
+
+            assert watcher.get(timeout=TIMEOUT) == str(tmp_path / "m_1.dat")
+
+    @pytest.mark.parametrize("use_polling", [False, True])
+    def test_normal_existing_files_once(self, tmp_path, use_polling):
+        """監視開始前のファイルも対象となり、対象パターンのファイルが1度だけ渡されること"""
+
+        write_file(tmp_path / "m_2.dat")
+        write_file(tmp_path / "m_1.dat")
+        write_file(tmp_path / "m_1.pkl")
+
+        with FileWatcher(str(tmp_path), ["*.dat"], stable_seconds=0.1, use_polling=use_polling) as watcher:
+            actual: List[str] = []
+            deadline: float = time.monotonic() + TIMEOUT
+            while len(actual) < 2 and time.monotonic() < deadline:
+                actual.extend(watcher.get_batch(timeout=0.1))
+
+            # 追記しても再度渡されないこと
+            with open(tmp_path / "m_1.dat", "ab") as f:
+                f.write(b"\0")
+
+            assert sorted(actual) == [str(tmp_path / "m_1.dat"), str(tmp_path / "m_2.dat")]
+            assert watcher.get_batch(timeout=0.5) == []
+
+    def test_normal_size_stable(self, tmp_path):
+        """作成、更新イベントのみの場合は、サイズが変化しなくなってから渡されること"""
+
+        with FileWatcher(str(tmp_path), ["*.dat"], stable_seconds=0.5, use_polling=True) as watcher:
+            with open(tmp_path / "m_1.dat", "wb") as f:
+                for _ in range(5):
+                    f.write(b"\0" * 1024)
+                    f.flush()
+                    time.sleep(0.2)
+                    assert watcher.get(timeout=0) is None
+                written_at: float = time.monotonic()
+
+            assert watcher.get(timeout=TIMEOUT) == str(tmp_path / "m_1.dat")
+            assert time.monotonic() - written_at >= 0.3
+
+    def test_normal_get_batch_sorted(self, tmp_path):
+        """まとめて取得したファイルがパス順に並ぶこと"""
+
+        with FileWatcher(str(tmp_path), ["*.dat"]) as watcher:
+            for file_number in (3, 1, 2):
+                write_file(tmp_path / f"m_20201216-080058.620753_{file_number}.dat")
+            time.sleep(0.5)
+
+            actual = watcher.get_batch(timeout=TIMEOUT)
+
+            assert actual == [str(tmp_path / f"m_20201216-080058.620753_{file_number}.dat") for file_number in (1, 2, 3)]
+
+    def test_normal_state_persisted(self, tmp_path):
+        """処理済みとしたファイルは、監視を再開しても渡されないこと"""
+
+        watch_dir: pathlib.Path = tmp_path / "data"
+        watch_dir.mkdir()
+        state_path: str = str(tmp_path / "processed.txt")
+
+        with FileWatcher(str(watch_dir), ["*.dat"], state_path=state_path) as watcher:
+            write_file(watch_dir / "m_1.dat")
+            watcher.mark_processed([watcher.get(timeout=TIMEOUT)])
+
+        with FileWatcher(str(watch_dir), ["*.dat"], state_path=state_path, stable_seconds=0.1) as watcher:
+            write_file(watch_dir / "m_2.dat")
+
+            assert watcher.get(timeout=TIMEOUT) == str(watch_dir / "m_2.dat")
+            assert watcher.get(timeout=0.5) is None
+
+    def test_normal_timeout(self, tmp_path):
+        """対象ファイルがない場合は、timeout後に空で返ること"""
+
+        with FileWatcher(str(tmp_path), ["*.dat"]) as watcher:
+            write_file(tmp_path / "m_1.pkl")
+
+            assert watcher.get(timeout=0.5) is None
+            assert watcher.get_batch(timeout=0.5) == []
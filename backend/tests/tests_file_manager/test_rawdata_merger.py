@@ -0,0 +1,113 @@
+"""
+ ==================================
+  test_rawdata_merger.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+from backend.file_manager.rawdata_merger import RawdataMerger
+from backend.file_manager.rawdata_stream import RawdataBlock
+from pandas.core.frame import DataFrame
+from pandas.testing import assert_frame_equal
+
+STARTED_TIMESTAMP: float = 1606786211.0
+SAMPLING_INTERVAL: float = 1.0 / 100_000
+
+
+def create_handler_df(sensor_ids: List[str], num_of_samples: int, seed: int) -> DataFrame:
+    """ハンドラーごとの生データ。同じ収集開始時刻、サンプリング周波数で時刻付けする"""
+
+    rng = np.random.default_rng(seed)
+    sequential_number = np.arange(num_of_samples, dtype=np.int64)
+    df = pd.DataFrame({"sequential_number": sequential_number, "timestamp": STARTED_TIMESTAMP + sequential_number * SAMPLING_INTERVAL})
+    for sensor_id in sensor_ids:
+        df[sensor_id] = rng.uniform(-100.0, 100.0, num_of_samples)
+
+    return df
+
+
+def split_to_blocks(df: DataFrame, handler_key: str, sizes: List[int]) -> List[RawdataBlock]:
+    """ファイルごとのブロックに分割する"""
+
+    bounds = np.cumsum([0] + sizes)
+    return [
+        RawdataBlock(file_name=f"machine-01_{handler_key}_20201201-103011.000000_{i + 1}.parquet", df=df.iloc[start:end])
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+class TestRawdataMerger:
+    def test_normal_same_as_joined(self):
+        """ファイルの区切りが異なるハンドラーのデータを、時刻で揃えて結合できること"""
+
+        main_df = create_handler_df(["stroke_displacement", "load01"], 1000, 0)
+        sub_df = create_handler_df(["load02", "load03"], 1000, 1)
+        main_blocks = split_to_blocks(main_df, "gw-01_handler-01", [300, 300, 400])
+        sub_blocks = split_to_blocks(sub_df, "gw-02_handler-01", [250, 250, 250, 250])
+
+        merger = RawdataMerger(["gw-01_handler-01", "gw-02_handler-01"], "gw-01_handler-01")
+        actual: List[RawdataBlock] = []
+        for i in range(4):
+            actual.extend(merger.add(main_blocks[i : i + 1] + sub_blocks[i : i + 1]))
+
+        assert [b.file_name for b in actual] == [b.file_name for b in main_blocks]
+        expected = main_df.merge(sub_df.drop(columns="sequential_number"), on="timestamp")
+        assert_frame_equal(pd.concat([b.df for b in actual], ignore_index=True), expected)
+
+    def test_normal_wait_for_other_handler(self):
+        """他ハンドラーのデータが揃うまで保留し、収集終了時は揃っていなくても結合すること"""
+
+        main_blocks = split_to_blocks(create_handler_df(["load01"], 200, 0), "gw-01_handler-01", [100, 100])
+        sub_blocks = split_to_blocks(create_handler_df(["load02"], 150, 1), "gw-01_handler-02", [150])
+
+        merger = RawdataMerger(["gw-01_handler-01", "gw-01_handler-02"], "gw-01_handler-01")
+
+        assert merger.add(main_blocks) == []
+        first = merger.add(sub_blocks)
+        second = merger.flush()
+
+        assert [b.file_name for b in first] == [main_blocks[0].file_name]
+        assert [b.file_name for b in second] == [main_blocks[1].file_name]
+        assert second[0].df["load02"].notna().sum() == 50
+
+    def test_normal_read_files(self, tmp_path):
+        """ファイルパスを渡した場合は、読み込んでから結合すること"""
+
+        main_df = create_handler_df(["load01"], 100, 0)
+        sub_df = create_handler_df(["load02"], 100, 1)
+        main_file = str(tmp_path / "machine-01_gw-01_handler-01_20201201-103011.000000_1.parquet")
+        sub_file = str(tmp_path / "machine-01_gw-01_handler-02_20201201-103011.000000_1.parquet")
+        main_df.to_parquet(main_file, index=False)
+        sub_df.to_parquet(sub_file, index=False)
+
+        merger = RawdataMerger(["gw-01_handler-01", "gw-01_handler-02"], "gw-01_handler-01")
+        actual = merger.add([sub_file, main_file])
+
+        assert len(actual) == 1
+        assert_frame_equal(actual[0].df, main_df.assign(load02=sub_df["load02"]))
+
+    def test_normal_ignore_not_target_handler(self):
+        """対象外のハンドラーのデータは結合しないこと"""
+
+        main_blocks = split_to_blocks(create_handler_df(["load01"], 100, 0), "gw-01_handler-01", [100])
+        other_blocks = split_to_blocks(create_handler_df(["load09"], 100, 1), "gw-09_handler-09", [100])
+
+        merger = RawdataMerger(["gw-01_handler-01"], "gw-01_handler-01")
+        actual = merger.add(main_blocks + other_blocks)
+
+        assert list(actual[0].df.columns) == ["sequential_number", "timestamp", "load01"]
+
+    def test_exception_main_handler_not_in_handlers(self):
+        """代表ハンドラーが対象ハンドラーに含まれない場合はValueErrorとなること"""
+
+        with pytest.raises(ValueError):
+            RawdataMerger(["gw-01_handler-01"], "gw-01_handler-02")
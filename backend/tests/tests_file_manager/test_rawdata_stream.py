@@ -0,0 +1,148 @@
+"""
+ ==================================
+  test_rawdata_stream.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+from backend.common import common
+from backend.file_manager.file_manager import FileInfo, FileManager
+from backend.file_manager.rawdata_stream import RawdataBlock, RawdataStream
+from pandas.core.frame import DataFrame
+from pandas.testing import assert_frame_equal
+
+
+class InMemoryStreamClient:
+    """テスト用に、RawdataStreamが使うRedis Streamsのコマンドのみをメモリ上で再現する"""
+
+    def __init__(self):
+        self.entries: List[Tuple[bytes, Dict[bytes, bytes]]] = []
+        self.max_deleted_entry_id: bytes = b"0-0"
+        self.sequence: int = 0
+
+    def pipeline(self) -> "InMemoryStreamClient":
+        return self
+
+    def execute(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def expire(self, key: str, seconds: int) -> None:
+        pass
+
+    def xadd(self, key: str, fields: Dict[str, Any], maxlen: int, approximate: bool) -> None:
+        self.sequence += 1
+        encoded = {k.encode(): v.encode() if isinstance(v, str) else v for k, v in fields.items()}
+        self.entries.append((f"1-{self.sequence}".encode(), encoded))
+        while len(self.entries) > maxlen:
+            self.max_deleted_entry_id = self.entries.pop(0)[0]
+
+    def xread(self, streams: Dict[str, str], block: int) -> List[Any]:
+        key, last_id = next(iter(streams.items()))
+        last_sequence: int = int(last_id.split("-")[1])
+        entries = [e for e in self.entries if int(e[0].decode().split("-")[1]) > last_sequence]
+        return [[key.encode(), entries]] if len(entries) > 0 else []
+
+    def xinfo_stream(self, key: str) -> Dict[str, Any]:
+        return {"length": len(self.entries), "max-deleted-entry-id": self.max_deleted_entry_id}
+
+
+def create_samples(sequential_number: int, num_of_samples: int = 100) -> DataFrame:
+    """データ記録が出力する生データ(時刻はfloat64のUNIX時間)"""
+
+    rng = np.random.default_rng(sequential_number)
+    timestamps_ns = common.sampling_timestamps_ns(1600000000_000000000, np.arange(num_of_samples), 100_000)
+    return pd.DataFrame(
+        {
+            "sequential_number": np.arange(sequential_number, sequential_number + num_of_samples, dtype=np.int64),
+            "timestamp": common.epoch_ns_to_timestamp(timestamps_ns),
+            "stroke_displacement": rng.uniform(0.0, 50.0, num_of_samples),
+            "load01": rng.uniform(-100.0, 100.0, num_of_samples),
+        }
+    )
+
+
+def publish(stream: RawdataStream, tmp_path, file_number: int) -> str:
+    """生データファイルを出力し、同じ内容をストリームに追加する"""
+
+    samples: DataFrame = create_samples(file_number * 100)
+    file = FileInfo(str(tmp_path / f"machine-01_gw-01_handler-01_20201216-080058.620753_{file_number}.dat"), 0.0)
+    rawdata_file: str = FileManager.export_rawdata(samples, file, str(tmp_path))
+    stream.publish(rawdata_file, samples)
+
+    return rawdata_file
+
+
+@pytest.fixture
+def stream(tmp_path) -> RawdataStream:
+    return RawdataStream(InMemoryStreamClient(), str(tmp_path), "machine-01", maxlen=3)  # type: ignore
+
+
+class TestRawdataStream:
+    def test_normal_same_as_rawdata_file(self, stream, tmp_path):
+        """ストリームで受け取ったデータが、生データファイルを読み込んだ場合と同じであること"""
+
+        rawdata_file: str = publish(stream, tmp_path, 1)
+
+        actual: List[RawdataBlock] = stream.get_batch(timeout=0)
+
+        assert len(actual) == 1
+        assert actual[0].file_name == "machine-01_gw-01_handler-01_20201216-080058.620753_1.parquet"
+        assert_frame_equal(actual[0].df, FileManager.read_rawdata(rawdata_file))
+
+    def test_normal_once(self, stream, tmp_path):
+        """受け取ったブロックは、再度受け取らないこと"""
+
+        publish(stream, tmp_path, 1)
+        publish(stream, tmp_path, 2)
+
+        first = stream.get_batch(timeout=0)
+        stream.mark_processed(first)
+        publish(stream, tmp_path, 3)
+        second = stream.get_batch(timeout=0)
+
+        assert [b.file_name.split("_")[-1] for b in first] == ["1.parquet", "2.parquet"]
+        assert [b.file_name.split("_")[-1] for b in second] == ["3.parquet"]
+        assert stream.get_batch(timeout=0) == []
+
+    def test_normal_trimmed_fall_back_to_files(self, stream, tmp_path):
+        """受け取る前に削除されたブロックがある場合、未処理の生データファイルのパスを返すこと"""
+
+        publish(stream, tmp_path, 1)
+        stream.mark_processed(stream.get_batch(timeout=0))
+        rawdata_files: List[str] = [publish(stream, tmp_path, file_number) for file_number in range(2, 7)]
+
+        actual = stream.get_batch(timeout=0)
+
+        assert actual == rawdata_files
+        # 削除されなかったブロックは、ファイルで受け渡し済みのため対象外
+        assert stream.get_batch(timeout=0) == []
+
+    def test_normal_from_env_not_set(self, tmp_path, monkeypatch):
+        """環境変数RAWDATA_STREAM_URLが未設定の場合は、ストリームを使わないこと"""
+
+        monkeypatch.delenv("RAWDATA_STREAM_URL", raising=False)
+
+        actual: Optional[RawdataStream] = RawdataStream.from_env(str(tmp_path), "machine-01")
+
+        assert actual is None
+
+    def test_normal_key_by_collect(self):
+        """収集(退避ディレクトリ)ごとに異なるストリームとなること"""
+
+        first = RawdataStream(InMemoryStreamClient(), "/data/machine-01_20201216080058/", "machine-01")  # type: ignore
+        second = RawdataStream(InMemoryStreamClient(), "/data/machine-01_20201217080058", "machine-01")  # type: ignore
+
+        assert first.key == "rawdata-stream-machine-01_20201216080058"
+        assert second.key == "rawdata-stream-machine-01_20201217080058"
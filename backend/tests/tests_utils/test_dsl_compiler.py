@@ -0,0 +1,220 @@
+"""
+ ==================================
+  test_dsl_compiler.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+from backend.utils.dsl_compiler import CompiledDsl, DslError, MultiChannelWaveform, Waveform, compile_dsl
+from backend.utils.extract_features_by_shot import eval_dsl, extract_features, extract_features_by_dsls
+
+DSLS: List[str] = [
+    r"ROLLING_WINDOW = 9;HORIZONTAL_LIMIT = [1104.874008786576, 1172.3325853073954];VERTICAL_LIMIT = [None, None];TARGET = IDXMIN(ACC);",
+    r"ROLLING_WINDOW = 19;HORIZONTAL_LIMIT = [1264.4156514760432, 1465.621588396266];VERTICAL_LIMIT = [None, None];TARGET = IDXMIN(DST);",
+    r"ROLLING_WINDOW = 1;HORIZONTAL_LIMIT = [IDXMAX(VCT)-20, IDXMAX(VCT)];VERTICAL_LIMIT = [None, None];TARGET = IDXMAX(ACC);",
+    "ROLLING_MEAN = 5\nTARGET = IDXMAX(DST)",
+    "ROLLING_MEAN = 3;HORIZONTAL_LIMIT = [IDXMIN(VCT), None];VERTICAL_LIMIT = [None, 0.5];TARGET = IDXMIN(ACC)",
+    "ROLLING_MEAN = 7;MAX_V = IDXMAX(VCT);HORIZONTAL_LIMIT = [MAX_V - 100, MAX_V + 100];VERTICAL_LIMIT = [0.9, None];TARGET = IDXMAX(ACC)",
+]
+
+
+def legacy_eval_dsl(d: np.ndarray, dslstr: str) -> Tuple[Any, float]:
+    """従来のexecによるDSL評価。グローバル変数を評価ごとに初期化し、比較対象とする"""
+
+    namespace: Dict[str, Any] = {
+        "df": pd.DataFrame(np.array(d), columns=["o"]),
+        "ROLLING_MEAN": 1,
+        "TARGET": 999,
+        "HORIZONTAL_LIMIT": [None, None],
+        "VERTICAL_LIMIT": [None, None],
+        "DST": "d",
+        "VCT": "v",
+        "ACC": "a",
+    }
+
+    def _gendf() -> None:
+        df = namespace["df"]
+        if "d" not in df.columns:
+            df["d"] = df.o.rolling(namespace["ROLLING_MEAN"], center=True).mean()
+            df["v"] = df.d.rolling(namespace["ROLLING_MEAN"], center=True).mean().diff()
+            df["a"] = df.v.rolling(namespace["ROLLING_MEAN"], center=True).mean().diff()
+
+    def _narrowing() -> pd.DataFrame:
+        ndf = namespace["df"].copy()
+        horizontal_limit, vertical_limit = namespace["HORIZONTAL_LIMIT"], namespace["VERTICAL_LIMIT"]
+        if horizontal_limit[0] is not None:
+            ndf = ndf[ndf.index >= horizontal_limit[0]]
+        if horizontal_limit[1] is not None:
+            ndf = ndf[ndf.index <= horizontal_limit[1]]
+        if vertical_limit[0] is not None:
+            ndf = ndf[ndf.d <= vertical_limit[0]]
+        if vertical_limit[1] is not None:
+            ndf = ndf[ndf.d <= vertical_limit[1]]
+        return ndf
+
+    def _idx(d: str, func_name: str) -> Any:
+        _gendf()
+        ndf = _narrowing() if namespace["NARROW"] is True else namespace["df"]
+        return getattr(ndf[d], func_name)()
+
+    namespace["IDXMAX"] = lambda d: _idx(d, "idxmax")
+    namespace["IDXMIN"] = lambda d: _idx(d, "idxmin")
+
+    dslstr = "NARROW = False\n" + dslstr.replace("TARGET", "NARROW = True\nTARGET")
+    exec(dslstr, namespace)
+
+    return namespace["TARGET"], namespace["df"]["d"][namespace["TARGET"]]
+
+
+def create_waveform(seed: int, num_of_samples: int = 2000) -> np.ndarray:
+    """荷重波形を模したノイズ付きの波形"""
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, np.pi, num_of_samples)
+
+    return np.sin(x) + rng.normal(scale=0.05, size=num_of_samples)
+
+
+class TestCompileDsl:
+    @pytest.mark.parametrize("dslstr", DSLS)
+    def test_normal_same_as_legacy(self, dslstr):
+        """従来のexecによる評価と同じ結果となること"""
+
+        for seed in range(5):
+            d = create_waveform(seed)
+            expected_target, expected_value = legacy_eval_dsl(d, dslstr)
+
+            actual_target, actual_value, _ = eval_dsl(d, 80.0, dslstr=dslstr)
+
+            assert actual_target == expected_target
+            assert actual_value == expected_value
+
+    def test_normal_variables_not_shared(self):
+        """評価ごとに変数が初期化され、前回の評価の変数が引き継がれないこと"""
+
+        d = create_waveform(0)
+        expected = eval_dsl(d, 80.0, dslstr="TARGET = IDXMAX(DST)")
+
+        eval_dsl(d, 80.0, dslstr="ROLLING_MEAN = 51;HORIZONTAL_LIMIT = [100, 200];TARGET = IDXMAX(DST)")
+        actual = eval_dsl(d, 80.0, dslstr="TARGET = IDXMAX(DST)")
+
+        assert actual == expected
+
+    def test_normal_compiled_dsl_cached(self):
+        """同じDSLの構文解析結果が再利用されること"""
+
+        assert compile_dsl(DSLS[0]) is compile_dsl(DSLS[0])
+
+    def test_normal_waveform_shared(self):
+        """同じ波形に対する複数のDSL評価で、微分系列を再利用すること"""
+
+        waveform = Waveform(create_waveform(0))
+
+        first = compile_dsl("ROLLING_MEAN = 5;TARGET = IDXMAX(DST)").evaluate(waveform)
+        second = compile_dsl("ROLLING_MEAN = 5;TARGET = IDXMIN(ACC)").evaluate(waveform)
+
+        assert first.series is second.series
+
+    def test_normal_thread_safe(self):
+        """複数スレッドから同時に評価しても、逐次評価と同じ結果となること"""
+
+        waveforms = [create_waveform(seed) for seed in range(4)]
+        expected = [eval_dsl(d, 80.0, dslstr=dslstr) for d in waveforms for dslstr in DSLS]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            actual = list(executor.map(lambda args: eval_dsl(args[0], 80.0, dslstr=args[1]), [(d, s) for d in waveforms for s in DSLS]))
+
+        assert actual == expected
+
+    @pytest.mark.parametrize(
+        "dslstr",
+        [
+            "TARGET = __import__('os').system('ls')",
+            "TARGET = DST.__class__",
+            "TARGET = IDXMAX(DST).real",
+            "TARGET = open('/etc/passwd')",
+            "TARGET = UNKNOWN",
+            "TARGET = 'a'",
+            "TARGET = [x for x in range(10)]",
+            "TARGET = IDXMAX(DST) if NARROW else 0",
+            "import os",
+            "IDXMAX = 1",
+            "TARGET += 1",
+            "TARGET = IDXMAX(DST, ACC)",
+            "TARGET = (",
+        ],
+    )
+    def test_exception_unsupported_dsl(self, dslstr):
+        """DSLで許可されていない構文はDslErrorとなること"""
+
+        with pytest.raises(DslError):
+            compile_dsl(dslstr)
+
+    def test_exception_target_out_of_range(self):
+        """TARGETが波形の範囲外の場合はKeyErrorとなること"""
+
+        with pytest.raises(KeyError):
+            compile_dsl("TARGET = 99999").evaluate(Waveform(create_waveform(0)))
+
+    def test_exception_compiled_dsl_immutable(self):
+        """構文解析済みのDSLは変更できないこと"""
+
+        compiled: CompiledDsl = compile_dsl(DSLS[0])
+
+        with pytest.raises(AttributeError):
+            compiled.source = ""  # type: ignore
+
+
+class TestMultiChannelWaveform:
+    def test_normal_same_as_single_channel(self):
+        """チャネルごとの評価結果が、1チャネルずつ計算した場合と同じとなること"""
+
+        values = np.stack([create_waveform(seed) for seed in range(3)], axis=1)
+        waveforms = MultiChannelWaveform(values).channels()
+
+        for c, waveform in enumerate(waveforms):
+            for dslstr in DSLS:
+                expected = compile_dsl(dslstr).evaluate(Waveform(values[:, c]))
+                actual = compile_dsl(dslstr).evaluate(waveform)
+                assert (actual.target, actual.value) == (expected.target, expected.value)
+
+    def test_exception_not_2d(self):
+        """2次元配列でない場合はValueErrorとなること"""
+
+        with pytest.raises(ValueError):
+            MultiChannelWaveform(create_waveform(0))
+
+
+class TestExtractFeaturesByDsls:
+    def test_normal_same_as_extract_features(self):
+        """DSLごとにextract_featuresを呼び出した場合と同じ結果となること"""
+
+        shot_data = pd.DataFrame({f"load0{i}": create_waveform(i) for i in range(1, 5)})
+
+        actual = extract_features_by_dsls(shot_data, DSLS)
+
+        for dslstr in DSLS:
+            argmax, valmax, _ = extract_features(shot_data, 80.0, eval_dsl, sub_func=None, dslstr=dslstr)
+            assert actual[dslstr] == (argmax, valmax)
+
+    def test_normal_channels(self):
+        """指定したチャネルの順に結果を返すこと"""
+
+        channels = ["load03", "load05"]
+        shot_data = pd.DataFrame({ch: create_waveform(i) for i, ch in enumerate(channels)})
+
+        actual = extract_features_by_dsls(shot_data, DSLS, channels=channels)
+
+        for dslstr in DSLS:
+            argmax, valmax, _ = extract_features(shot_data, 80.0, eval_dsl, sub_func=None, channels=channels, dslstr=dslstr)
+            assert actual[dslstr] == (argmax, valmax)
@@ -0,0 +1,92 @@
+"""
+ ==================================
+  benchmark_data_recorder.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + "/../../"))
+
+from backend.app.models.data_collect_history_sensor import DataCollectHistorySensor  # noqa
+from backend.data_recorder.data_recorder import DataRecorder  # noqa
+from backend.file_manager.file_manager import FileInfo, FileManager  # noqa
+from backend.utils.gateway_simulator import create_waveforms, output_file, pack_binaries  # noqa
+
+
+def create_sensors() -> List[DataCollectHistorySensor]:
+    """gateway_simulatorの単一ハンドラー構成(5ch)に対応するセンサー"""
+
+    sensors: List[DataCollectHistorySensor] = [
+        DataCollectHistorySensor(sensor_id="stroke_displacement", sensor_type_id="stroke_displacement"),
+    ]
+    sensors.extend(DataCollectHistorySensor(sensor_id=f"load0{i}", sensor_type_id="load") for i in range(1, 5))
+
+    return sensors
+
+
+def main(num_of_files: int, num_of_samples: int) -> None:
+    """gateway_simulatorで生成したdatファイルを、旧実装(struct.unpack)と新実装(np.frombuffer)でデコードし比較する"""
+
+    machine_id, gateway_id, handler_id = "benchmark-machine-01", "benchmark-gw-01", "benchmark-handler-01"
+    sensors: List[DataCollectHistorySensor] = create_sensors()
+    channels: List[str] = [s.sensor_id for s in sensors]
+    sampling_frequency: int = 100_000
+    started_timestamp_ns: int = time.time_ns()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file_number in range(num_of_files):
+            _, _, y, _, _ = create_waveforms(channels, original=num_of_samples)
+            output_file(machine_id, gateway_id, handler_id, file_number, pack_binaries(y, channels, num_of_samples), data_dir=tmp_dir)
+
+        files_info: List[FileInfo] = FileManager.create_files_info(tmp_dir, machine_id, gateway_id, handler_id, "dat")
+        total_bytes: int = sum(os.path.getsize(f.file_path) for f in files_info)
+        total_samples: int = num_of_files * num_of_samples
+
+        legacy: List[pd.DataFrame] = []
+        sequential_number: int = 0
+        start = time.perf_counter()
+        for file in files_info:
+            samples, sequential_number = DataRecorder.read_binary_files(
+                file, sequential_number, started_timestamp_ns, sensors, sampling_frequency
+            )
+            legacy.append(pd.DataFrame(samples))
+        legacy_sec: float = time.perf_counter() - start
+
+        vectorized: List[pd.DataFrame] = []
+        sequential_number = 0
+        start = time.perf_counter()
+        for file in files_info:
+            df, sequential_number = DataRecorder.decode_binary_file(
+                file, sequential_number, started_timestamp_ns, sensors, sampling_frequency
+            )
+            vectorized.append(df)
+        vectorized_sec: float = time.perf_counter() - start
+
+    for expected, actual in zip(legacy, vectorized):
+        pd.testing.assert_frame_equal(expected, actual)
+
+    for label, sec in (("struct.unpack", legacy_sec), ("np.frombuffer", vectorized_sec)):
+        print(f"{label:>14}: {sec:8.3f} sec, {total_samples / sec:12,.0f} samples/sec, {total_bytes / sec / 1024 ** 2:8.1f} MiB/sec")
+    print(f"speedup: {legacy_sec / vectorized_sec:.1f}x (outputs are identical)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--files", help="number of dat files", type=int, default=10)
+    parser.add_argument("-n", "--samples", help="number of samples per file", type=int, default=100_000)
+    args = parser.parse_args()
+
+    main(args.files, args.samples)
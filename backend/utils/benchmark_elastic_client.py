@@ -0,0 +1,123 @@
+"""
+ ==================================
+  benchmark_elastic_client.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + "/../../"))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Elasticsearchの代わりに最小限の応答を返すハンドラー。接続(TCPコネクション)数を数える"""
+
+    protocol_version = "HTTP/1.1"  # keep-aliveを有効にする
+    disable_nagle_algorithm = True
+    connections: int = 0
+    requests: int = 0
+    lock = threading.Lock()
+    latency: float = 0.0
+
+    def setup(self) -> None:
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+
+    def _respond(self) -> None:
+        length: int = int(self.headers.get("Content-Length", 0))
+        if length > 0:
+            self.rfile.read(length)
+
+        with StandInHandler.lock:
+            StandInHandler.requests += 1
+
+        if self.path == "/":
+            body: dict = {"version": {"number": "7.17.0", "build_flavor": "default"}, "tagline": "You Know, for Search"}
+        else:
+            body = {"count": 0, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+
+        time.sleep(StandInHandler.latency)
+
+        payload: bytes = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-elastic-product", "Elasticsearch")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def run(label: str, call: Callable[[], None], num_of_calls: int, num_of_threads: int) -> Tuple[float, int]:
+    """num_of_calls回のリクエストをnum_of_threadsスレッドで実行し、所要時間と接続数を返す"""
+
+    StandInHandler.connections = 0
+    start: float = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_of_threads) as executor:
+        list(executor.map(lambda _: call(), range(num_of_calls)))
+    elapsed: float = time.perf_counter() - start
+
+    print(f"{label:>24}: {elapsed:8.3f} sec, {num_of_calls / elapsed:10,.0f} calls/sec, {StandInHandler.connections:6} connections")
+
+    return elapsed, StandInHandler.connections
+
+
+def main(num_of_calls: int, num_of_threads: int, latency_ms: float) -> None:
+    """呼び出しごとにクライアントを生成する従来の方式と、プロセスごとのクライアントを再利用する方式を比較する"""
+
+    StandInHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["ELASTIC_URL"] = f"127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("ELASTIC_USER", "elastic")
+    os.environ.setdefault("ELASTIC_PASSWORD", "password")
+
+    from backend.elastic_manager import elastic_manager  # noqa
+    from elasticsearch import Elasticsearch  # noqa
+
+    def new_client_per_call() -> None:
+        es = Elasticsearch(hosts=elastic_manager.ELASTIC_URL, http_auth=("elastic", "password"), timeout=50000)
+        es.count(index="benchmark")
+        es.close()
+
+    def pooled_client() -> None:
+        elastic_manager.ElasticManager.get_client().count(index="benchmark")
+
+    results: Dict[str, Tuple[float, int]] = {}
+    for label, call in (("new client per call", new_client_per_call), ("pooled client", pooled_client)):
+        results[label] = run(label, call, num_of_calls, num_of_threads)
+
+    server.shutdown()
+
+    (legacy_sec, legacy_connections), (pooled_sec, pooled_connections) = results["new client per call"], results["pooled client"]
+    print(f"speedup: {legacy_sec / pooled_sec:.1f}x, connections: {legacy_connections} -> {pooled_connections}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--calls", help="number of requests", type=int, default=2_000)
+    parser.add_argument("-t", "--threads", help="number of client threads", type=int, default=8)
+    parser.add_argument("-l", "--latency", help="server latency in ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    main(args.calls, args.threads, args.latency)
@@ -0,0 +1,99 @@
+"""
+ ==================================
+  benchmark_fft_bandpass.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + "/../../"))
+
+import backend.analyzer.extract_features as ef  # noqa
+
+
+def create_shots(num_of_shots: int, num_of_samples: int, seed: int = 0) -> Tuple[List[pd.DataFrame], List[float]]:
+    """荷重波形を模した4chのショットデータとSPM。ショットごとにサンプル数を±5%の範囲でばらつかせる"""
+
+    rng = np.random.default_rng(seed)
+    shots: List[pd.DataFrame] = []
+    for _ in range(num_of_shots):
+        n: int = int(num_of_samples * rng.uniform(0.95, 1.05))
+        x = np.linspace(0, np.pi, n)
+        shots.append(pd.DataFrame({ch: np.sin(x) * (i + 1) + rng.normal(scale=0.05, size=n) for i, ch in enumerate(ef.LOAD_CHANNELS)}))
+    spms: List[float] = rng.choice([40.0, 80.0], size=num_of_shots).tolist()
+
+    return shots, spms
+
+
+def per_channel(shots: List[pd.DataFrame], spms: List[float]) -> list:
+    """従来の処理。チャネルごとにfft_spectrum、bandpass_ifftを呼び出す"""
+
+    results = []
+    for shot_df, spm in zip(shots, spms):
+        indices, values = [], []
+        for ch in ef.LOAD_CHANNELS:
+            i, v, _ = ef.max_load(shot_df[ch].to_numpy()[:-1], spm)  # extract_features()と同じく最終サンプルは対象外
+            indices.append(i)
+            values.append(v)
+        results.append((indices, values, [None] * len(indices)))
+
+    return results
+
+
+def per_shot(shots: List[pd.DataFrame], spms: List[float]) -> list:
+    """ショットごとに全チャネルをまとめてバンドパスする"""
+
+    return [ef.extract_features(shot_df, spm, ef.max_load) for shot_df, spm in zip(shots, spms)]
+
+
+def measure(func: Callable[[], list]) -> Tuple[list, float]:
+    start = time.perf_counter()
+    results: list = func()
+    return results, time.perf_counter() - start
+
+
+def main(num_of_shots: int, num_of_samples: int) -> None:
+    """max_loadを、チャネルごと、ショットごと、複数ショット一括(FFT/0埋めFFT/sosfiltfilt)で処理し比較する"""
+
+    shots, spms = create_shots(num_of_shots, num_of_samples)
+
+    cases: List[Tuple[str, Callable[[], list]]] = [
+        ("per channel", lambda: per_channel(shots, spms)),
+        ("per shot", lambda: per_shot(shots, spms)),
+        ("batched fft", lambda: ef.max_load_batch(shots, spms)),
+        ("batched fft(pad)", lambda: ef.max_load_batch(shots, spms, pad=True)),
+        ("batched sosfiltfilt", lambda: ef.max_load_batch(shots, spms, method="sosfiltfilt")),
+    ]
+
+    expected: list = []
+    base_sec: float = 0.0
+    for label, func in cases:
+        results, sec = measure(func)
+        if len(expected) == 0:
+            expected, base_sec = results, sec
+        matched: int = sum(r[0] == e[0] for r, e in zip(results, expected))
+        print(
+            f"{label:>20}: {sec:8.3f} sec, {num_of_shots / sec:10,.1f} shots/sec, "
+            f"speedup: {base_sec / sec:5.1f}x, same max point: {matched}/{num_of_shots} shots"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--shots", help="number of shots", type=int, default=3000)
+    parser.add_argument("-n", "--samples", help="number of samples per shot", type=int, default=3000)
+    args = parser.parse_args()
+
+    main(args.shots, args.samples)
@@ -0,0 +1,294 @@
+"""
+ ==================================
+  dsl_compiler.py
+ ==================================
+
+  Copyright(c) 2021 UNIADEX, Ltd. All Rights Reserved.
+  CONFIDENTIAL
+  Author: UNIADEX, Ltd.
+
+"""
+
+import ast
+import dataclasses
+import functools
+import operator
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple, cast
+
+import numpy as np
+import pandas as pd
+
+# DSLで参照する系列名
+DST: Final[str] = "d"
+VCT: Final[str] = "v"
+ACC: Final[str] = "a"
+SERIES_NAMES: Final[Dict[str, str]] = {"DST": DST, "VCT": VCT, "ACC": ACC}
+
+# DSLの変数の初期値。評価ごとに初期化し、他の評価と共有しない
+DEFAULT_VARIABLES: Final[Dict[str, Any]] = {
+    "ROLLING_MEAN": 1,
+    "NARROW": False,
+    "TARGET": 999,
+    "HORIZONTAL_LIMIT": [None, None],
+    "VERTICAL_LIMIT": [None, None],
+}
+
+BINARY_OPERATORS: Final[Dict[type, Callable[[Any, Any], Any]]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+UNARY_OPERATORS: Final[Dict[type, Callable[[Any], Any]]] = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+FUNCTIONS: Final[Tuple[str, ...]] = ("IDXMAX", "IDXMIN")
+
+
+class DslError(ValueError):
+    """DSLの構文エラー、または評価時のエラー"""
+
+
+class Waveform:
+    """1チャネル分の波形。移動平均の窓幅ごとに変位(d)、速度(v)、加速度(a)を1度だけ計算し、同じ波形に対する全DSLで共有する"""
+
+    def __init__(self, values: np.ndarray):
+        self.values: np.ndarray = np.asarray(values, dtype=np.float64)
+        self.__derivatives: Dict[int, Dict[str, np.ndarray]] = {}
+
+    def derivatives(self, window: int) -> Dict[str, np.ndarray]:
+        """元波形(o)と、窓幅windowの中央移動平均による変位(d)、速度(v)、加速度(a)"""
+
+        if window not in self.__derivatives:
+            self.__derivatives[window] = self._calculate(window)
+
+        return self.__derivatives[window]
+
+    def _calculate(self, window: int) -> Dict[str, np.ndarray]:
+        o: pd.Series = pd.Series(self.values)
+        d: pd.Series = o.rolling(window, center=True).mean()
+        v: pd.Series = d.rolling(window, center=True).mean().diff()
+        a: pd.Series = v.rolling(window, center=True).mean().diff()
+
+        return {"o": self.values, DST: d.to_numpy(), VCT: v.to_numpy(), ACC: a.to_numpy()}
+
+
+class MultiChannelWaveform:
+    """複数チャネルの波形。(サンプル数, チャネル数)の2次元配列で保持し、微分系列を全チャネルまとめて計算する"""
+
+    def __init__(self, values: np.ndarray):
+        self.values: np.ndarray = np.asarray(values, dtype=np.float64)
+        if self.values.ndim != 2:
+            raise ValueError(f"values must be 2-D (samples, channels). shape: {self.values.shape}")
+        self.__derivatives: Dict[int, Dict[str, np.ndarray]] = {}
+
+    def derivatives(self, window: int) -> Dict[str, np.ndarray]:
+        """元波形(o)と、窓幅windowの中央移動平均による変位(d)、速度(v)、加速度(a)。いずれも(サンプル数, チャネル数)"""
+
+        if window not in self.__derivatives:
+            o: pd.DataFrame = pd.DataFrame(self.values)
+            d: pd.DataFrame = o.rolling(window, center=True).mean()
+            v: pd.DataFrame = d.rolling(window, center=True).mean().diff()
+            a: pd.DataFrame = v.rolling(window, center=True).mean().diff()
+            self.__derivatives[window] = {"o": self.values, DST: d.to_numpy(), VCT: v.to_numpy(), ACC: a.to_numpy()}
+
+        return self.__derivatives[window]
+
+    def channels(self) -> List[Waveform]:
+        """チャネルごとの波形。微分系列はこの波形から切り出すため、全チャネルで1回だけ計算する"""
+
+        return [_ChannelWaveform(self, i) for i in range(self.values.shape[1])]
+
+
+class _ChannelWaveform(Waveform):
+    """MultiChannelWaveformの1チャネル分"""
+
+    def __init__(self, parent: MultiChannelWaveform, channel: int):
+        super().__init__(parent.values[:, channel])
+        self.__parent: MultiChannelWaveform = parent
+        self.__channel: int = channel
+
+    def _calculate(self, window: int) -> Dict[str, np.ndarray]:
+        return {k: v[:, self.__channel] for k, v in self.__parent.derivatives(window).items()}
+
+
+@dataclasses.dataclass
+class DslResult:
+    """DSLの評価結果。targetは特徴点のインデックス、valueは特徴点の変位"""
+
+    target: Any
+    value: float
+    variables: Dict[str, Any]
+    series: Dict[str, np.ndarray]
+
+
+class _Evaluation:
+    """1回の評価の状態。DSLの変数は評価ごとに持ち、波形の微分系列のみをWaveformで共有する"""
+
+    def __init__(self, waveform: Waveform):
+        self.waveform: Waveform = waveform
+        self.variables: Dict[str, Any] = {k: list(v) if isinstance(v, list) else v for k, v in DEFAULT_VARIABLES.items()}
+        # NOTE: 移動平均の窓幅は、最初にIDXMAX/IDXMINを評価した時点のROLLING_MEANで確定する
+        self.series: Optional[Dict[str, np.ndarray]] = None
+
+    def get_series(self) -> Dict[str, np.ndarray]:
+        if self.series is None:
+            self.series = self.waveform.derivatives(self.variables["ROLLING_MEAN"])
+        return self.series
+
+    def evaluate(self, node: ast.expr) -> Any:
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return self.variables[node.id]
+            return SERIES_NAMES[node.id]
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [self.evaluate(e) for e in node.elts]
+        if isinstance(node, ast.BinOp):
+            return BINARY_OPERATORS[type(node.op)](self.evaluate(node.left), self.evaluate(node.right))
+        if isinstance(node, ast.UnaryOp):
+            return UNARY_OPERATORS[type(node.op)](self.evaluate(node.operand))
+        if isinstance(node, ast.Subscript):
+            return self.evaluate(node.value)[self.evaluate(_subscript_index(node))]
+        if isinstance(node, ast.Call):
+            return self.idx(node.func.id, self.evaluate(node.args[0]))  # type: ignore
+
+        raise DslError(f"Unsupported expression: {ast.dump(node)}")
+
+    def idx(self, func_name: str, series_name: Any) -> Any:
+        """系列の最大値(IDXMAX)、最小値(IDXMIN)のインデックス。NARROWの場合はHORIZONTAL_LIMIT、VERTICAL_LIMITで範囲を限定する"""
+
+        series: Dict[str, np.ndarray] = self.get_series()
+        if series_name not in series:
+            raise DslError(f"Unknown series: {series_name}")
+
+        values: np.ndarray = series[series_name]
+        positions: np.ndarray = np.arange(len(values))
+        mask: np.ndarray = np.ones(len(values), dtype=bool)
+
+        if self.variables["NARROW"] is True:
+            horizontal_limit, vertical_limit = self.variables["HORIZONTAL_LIMIT"], self.variables["VERTICAL_LIMIT"]
+            if horizontal_limit[0] is not None:
+                mask &= positions >= horizontal_limit[0]
+            if horizontal_limit[1] is not None:
+                mask &= positions <= horizontal_limit[1]
+            # NOTE: 従来の実装に合わせ、上下限とも変位が指定値以下の範囲とする
+            if vertical_limit[0] is not None:
+                mask &= series[DST] <= vertical_limit[0]
+            if vertical_limit[1] is not None:
+                mask &= series[DST] <= vertical_limit[1]
+
+        candidates: np.ndarray = positions[mask]
+        candidate_values: np.ndarray = values[mask]
+
+        # 有効な値がない場合はpandasの挙動に合わせる
+        if np.isnan(candidate_values).all():
+            s: pd.Series = pd.Series(candidate_values, index=candidates)
+            return s.idxmax() if func_name == "IDXMAX" else s.idxmin()
+
+        i: int = int(np.nanargmax(candidate_values) if func_name == "IDXMAX" else np.nanargmin(candidate_values))
+        return int(candidates[i])
+
+
+def _subscript_index(node: ast.Subscript) -> ast.expr:
+    """Python3.8のast.Indexを吸収する"""
+
+    index: ast.expr = node.slice
+    if type(index).__name__ == "Index":
+        return cast(ast.expr, getattr(index, "value"))
+    return index
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledDsl:
+    """構文解析済みのDSL。評価ごとに変数を初期化するため、複数スレッドから同時に評価できる"""
+
+    source: str
+    statements: Tuple[Tuple[str, ast.expr], ...]
+
+    def evaluate(self, waveform: Waveform) -> DslResult:
+        """波形に対してDSLを評価する。TARGETへの代入時はNARROWをTrueとし、範囲を限定して探索する"""
+
+        evaluation: _Evaluation = _Evaluation(waveform)
+
+        for name, expr in self.statements:
+            if name == "TARGET":
+                evaluation.variables["NARROW"] = True
+            evaluation.variables[name] = evaluation.evaluate(expr)
+
+        target: Any = evaluation.variables["TARGET"]
+        series: Dict[str, np.ndarray] = evaluation.get_series()
+
+        # 特徴点の変位。インデックス外の場合は従来と同様にKeyErrorとする
+        if isinstance(target, float) and target.is_integer():
+            target = int(target)
+        if not isinstance(target, (int, np.integer)) or not 0 <= target < len(series[DST]):
+            raise KeyError(target)
+
+        return DslResult(target=target, value=series[DST][target], variables=evaluation.variables, series=series)
+
+
+def _validate(node: ast.AST, names: List[str]) -> None:
+    """DSLで使える式か検証する"""
+
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float, type(None))):
+            raise DslError(f"Unsupported constant: {node.value!r}")
+    elif isinstance(node, ast.Name):
+        if node.id not in names and node.id not in SERIES_NAMES:
+            raise DslError(f"Unknown name: {node.id}")
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        for e in node.elts:
+            _validate(e, names)
+    elif isinstance(node, ast.BinOp):
+        if type(node.op) not in BINARY_OPERATORS:
+            raise DslError(f"Unsupported operator: {type(node.op).__name__}")
+        _validate(node.left, names)
+        _validate(node.right, names)
+    elif isinstance(node, ast.UnaryOp):
+        if type(node.op) not in UNARY_OPERATORS:
+            raise DslError(f"Unsupported operator: {type(node.op).__name__}")
+        _validate(node.operand, names)
+    elif isinstance(node, ast.Subscript):
+        _validate(node.value, names)
+        _validate(_subscript_index(node), names)
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise DslError(f"Unsupported function: {ast.dump(node.func)}")
+        if len(node.args) != 1 or len(node.keywords) != 0:
+            raise DslError(f"{node.func.id} takes exactly one argument.")
+        _validate(node.args[0], names)
+    else:
+        raise DslError(f"Unsupported expression: {type(node).__name__}")
+
+
+@functools.lru_cache(maxsize=256)
+def compile_dsl(source: str) -> CompiledDsl:
+    """DSLを構文解析し、評価可能な形式に変換する。同じDSLの解析結果は再利用する。
+    DSLは「変数名 = 式」を改行または;で区切ったもので、式には数値、None、リスト、四則演算、
+    DST/VCT/ACC、定義済みの変数、IDXMAX/IDXMINのみを使える。
+    """
+
+    try:
+        module: ast.Module = ast.parse(source, mode="exec")
+    except SyntaxError as e:
+        raise DslError(f"Invalid DSL syntax: {e}") from e
+
+    names: List[str] = list(DEFAULT_VARIABLES.keys())
+    statements: List[Tuple[str, ast.expr]] = []
+
+    for stmt in module.body:
+        if not isinstance(stmt, ast.Assign) or len(stmt.targets) != 1 or not isinstance(stmt.targets[0], ast.Name):
+            raise DslError(f"Only assignment to a variable is allowed: {ast.dump(stmt)}")
+
+        _validate(stmt.value, names)
+
+        name: str = stmt.targets[0].id
+        if name in SERIES_NAMES or name in FUNCTIONS:
+            raise DslError(f"{name} cannot be assigned.")
+
+        names.append(name)
+        statements.append((name, stmt.value))
+
+    return CompiledDsl(source=source, statements=tuple(statements))
@@ -8,36 +8,36 @@ import pandas as pd
 sys.path.append(os.path.abspath(os.path.dirname(os.path.abspath(__file__)) + "/../../"))
 
 
-from backend.analyzer.extract_features import NARROW_PADDING
+from backend.analyzer.extract_features import LOAD_CHANNELS, NARROW_PADDING
 
 # import backend.analyzer.h_one_extract_features as ef
 from backend.app.crud.crud_data_collect_history import CRUDDataCollectHistory
 from backend.app.crud.crud_machine import CRUDMachine
 from backend.app.db.session import SessionLocal
 from backend.data_reader.data_reader import DataReader
+from backend.utils.dsl_compiler import DslResult, MultiChannelWaveform, Waveform, compile_dsl
 
 ### 以下大塚さんに要確認(Juypterから持ってきたが、extract_features.pyへの取込が必要) ###
 
-ROLLING_MEAN = 1
-NARROW = False
-TARGET = 999
-HORIZONTAL_LIMIT = [None, None]
-VERTICAL_LIMIT = [None, None]
-
-#
-DST = "d"
-VCT = "v"
-ACC = "a"
 
 # 4ch前提の設計になっていたので、暫定修正。処理対象カラム名を引数で渡すようにすれば行けるのでは?
 def extract_features(
-    shot_data, spm, func, narrowing=None, sub_func=None, disp_narrowing=False, disp_chart=False, xlim=[-100, 100], **kwargs
+    shot_data,
+    spm,
+    func,
+    narrowing=None,
+    sub_func=None,
+    disp_narrowing=False,
+    disp_chart=False,
+    xlim=[-100, 100],
+    channels=None,
+    **kwargs
 ):
     """特徴抽出ハンドラ関数
     変位をトリガーに切り出した1ショットのデータをpd.DataFrame(shot_data)として受け取り、
     抽出した特徴値を返す。
-    shot_dataは4ch('load01','load02','load03','load04')固定であり、
-    特徴値はindexと値をそれぞれ長さ4のリストとして返す。
+    対象チャネルはchannelsで指定し、省略時は4ch('load01','load02','load03','load04')とする。
+    特徴値はindexと値をそれぞれチャネル数の長さのリストとして返す。
 
     funcは特徴抽出関数のポインタであり、kwargsはfuncにそのまま渡される。
     kwargsの内容には基本的に感知しないが、例外が二つ。
@@ -58,6 +58,7 @@ def extract_features(
                                       4ch共通の範囲を指定したい場合に使用。現在は破断点の場合のみ、narrowing_var_chを指定。
     :disp_narrowing (bool)            sub_funcで指定した関数に渡され、グラフ表示を制御する
     :disp_chart (bool)                グラフ表示; ショットごとの元波形と特徴量を表示。
+    :channels (list)                  対象チャネル名のリスト
     :**kwargs (可変キーワード引数)    funcに指定した関数に対応した引数を指定
     :return (list, list, list)        indexリスト, 値リスト, デバッグリスト
     """
@@ -92,8 +93,7 @@ def extract_features(
     argmax = []
     valmax = []
     debugval = []
-    chs = ["load01", "load02", "load03", "load04"]
-    # chs = ["load01"]
+    chs = LOAD_CHANNELS if channels is None else list(channels)
     for ch in chs:
         kwargs["ch"] = ch  # 可変キーワードにch追加
         i, v, d = func(np.array(shot_data[ch][sub_start:sub_end]), spm, **kwargs)  # ここでnp.arrayになるのでindexがなくなる
@@ -116,92 +116,37 @@ def extract_features(
     return argmax, valmax, debugval
 
 
-ROLLING_MEAN = 1
-NARROW = False
-TARGET = 999
-HORIZONTAL_LIMIT = [None, None]
-VERTICAL_LIMIT = [None, None]
-#
-DST = "d"
-VCT = "v"
-ACC = "a"
-
-# 初期は元波形をdf['o']として初期化。復数系列をどうするか?
-def _gendf():
-    # ここにdf['d']が無かったらというifを入れる
-    if "d" not in df.columns:
-        #         print('T')
-        df["d"] = df.o.rolling(ROLLING_MEAN, center=True).mean()
-        df["v"] = df.d.rolling(ROLLING_MEAN, center=True).mean().diff()
-        df["a"] = df.v.rolling(ROLLING_MEAN, center=True).mean().diff()
-    # else:
-
-
-def _narrowing():
-    ndf = df.copy()
-    if HORIZONTAL_LIMIT[0] is not None:
-        ndf = ndf[ndf.index >= HORIZONTAL_LIMIT[0]]
-    if HORIZONTAL_LIMIT[1] is not None:
-        ndf = ndf[ndf.index <= HORIZONTAL_LIMIT[1]]
-    if VERTICAL_LIMIT[0] is not None:
-        ndf = ndf[ndf.d <= VERTICAL_LIMIT[0]]
-    if VERTICAL_LIMIT[1] is not None:
-        ndf = ndf[ndf.d <= VERTICAL_LIMIT[1]]
-
-    return ndf
-
-
-# 使う関数の数だけ以下を用意する。と言ってもこれ以外にMAXとMINだけか?
-# 現在は各関数に記述してるが、共通化できる。と言うか、クラスにしちゃった方が良いか?
-def IDXMAX(d):
-    _gendf()
-    if NARROW is True:
-        ndf = _narrowing()
-    else:
-        ndf = df
-    target = ndf[d].idxmax()
-    return target
-
-
-def IDXMIN(d):
-    _gendf()
-    if NARROW is True:
-        ndf = _narrowing()
-    else:
-        ndf = df
-    target = ndf[d].idxmin()
-    return target
+# デバッグ用可視化関数。上位のメニュー?から呼ぶことを想定
+def disp_data(result: DslResult):
+    """eval_dslの評価結果(DslResult)を可視化する"""
 
+    df = pd.DataFrame(result.series)[["o", "d", "v", "a"]]
+    horizontal_limit = result.variables["HORIZONTAL_LIMIT"]
+    vertical_limit = result.variables["VERTICAL_LIMIT"]
 
-# デバッグ用可視化関数。上位のメニュー?から呼ぶことを想定
-def disp_data():
-    axes = df[["o", "d", "v", "a"]].plot(subplots=True, figsize=(10, 6))
+    axes = df.plot(subplots=True, figsize=(10, 6))
     for ax in axes:
         hlimit = [0, 0]
-        ax.axvline(TARGET, color="r")  # 検索結果
+        ax.axvline(result.target, color="r")  # 検索結果
 
-        if not (HORIZONTAL_LIMIT[0] is None and HORIZONTAL_LIMIT[1] is None):  # 上下限とも無指定なら範囲限定無し
-            if HORIZONTAL_LIMIT[0] is None:
+        if not (horizontal_limit[0] is None and horizontal_limit[1] is None):  # 上下限とも無指定なら範囲限定無し
+            if horizontal_limit[0] is None:
                 hlimit[0] = df.index[0]
             else:
-                hlimit[0] = HORIZONTAL_LIMIT[0]
-            if HORIZONTAL_LIMIT[1] is None:
+                hlimit[0] = horizontal_limit[0]
+            if horizontal_limit[1] is None:
                 hlimit[1] = df.index[-1]
             else:
-                hlimit[1] = HORIZONTAL_LIMIT[1]
+                hlimit[1] = horizontal_limit[1]
             ax.axvspan(hlimit[0], hlimit[1], color="b", alpha=0.3)
-    if VERTICAL_LIMIT[0] is not None or VERTICAL_LIMIT[1] is not None:
-        if VERTICAL_LIMIT[0] is not None:
-            axes[1].axhline(VERTICAL_LIMIT[0], color="b")
-            vlimit_low = VERTICAL_LIMIT[0]
-        else:
-            vlimit_low = df["d"].min()
-        if VERTICAL_LIMIT[1] is not None:
-            axes[1].axhline(VERTICAL_LIMIT[1], color="b")
-            vlimit_high = VERTICAL_LIMIT[1]
+    if vertical_limit[0] is not None or vertical_limit[1] is not None:
+        if vertical_limit[0] is not None:
+            axes[1].axhline(vertical_limit[0], color="b")
+        if vertical_limit[1] is not None:
+            axes[1].axhline(vertical_limit[1], color="b")
+            vlimit_high = vertical_limit[1]
         else:
             vlimit_high = df["d"].max()
-        #         axes[1].axhspan(vlimit_low,vlimit_high,color='b',alpha=.3)
         axes[1].fill_between(df.index, df["d"], vlimit_high)
 
     plt.show()
@@ -209,18 +154,39 @@ def disp_data():
 
 # 特徴抽出関数。これをextract_features()に渡す。
 def eval_dsl(d, spm, fs=100000, low=0, high=None, r_window=19, Debug=False, shot=9999, ch="loadxx", debug_xlim=[-1500, 1000], dslstr=""):
+    """DSLを評価し、特徴点のインデックスと変位を返す。DSLは構文解析済みのものを再利用する"""
+
+    result: DslResult = compile_dsl(dslstr).evaluate(Waveform(np.array(d)))
+
+    return result.target, result.value, None
+
+
+def extract_features_by_dsls(shot_data, dslstrs, narrowing=None, channels=None):
+    """複数のDSLによる特徴抽出を、1ショットに対してまとめて行う。
+    全チャネルを2次元配列にまとめて微分系列を一括で計算し、全DSLで共有する。
+    戻り値はDSLごとの(indexリスト, 値リスト)で、extract_features(shot_data, spm, eval_dsl, channels=channels, dslstr=dsl)の結果と同じ。
+    """
+
+    compiled = {dslstr: compile_dsl(dslstr) for dslstr in dslstrs}
+    chs = LOAD_CHANNELS if channels is None else list(channels)
+
+    if narrowing is not None:
+        sub_start = narrowing[0] - NARROW_PADDING
+        sub_end = narrowing[1] + NARROW_PADDING
+    else:
+        sub_start = shot_data.index[0]
+        sub_end = shot_data.index[-1]
 
-    global df
-    df = pd.DataFrame(np.array(d), columns=["o"])
-    #     _gendf()
-    #     print(df.o.idxmin())
+    waveforms = MultiChannelWaveform(shot_data[chs][sub_start:sub_end].to_numpy(dtype=np.float64)).channels()
 
-    dslstr = "NARROW = False\n" + dslstr.replace("TARGET", "NARROW = True\nTARGET")
-    dslstr = "global df, ROLLING_MEAN, HORIZONTAL_LIMIT, VERTICAL_LIMIT, TARGET, NARROW\n" + dslstr
-    exec(dslstr)
+    results = {dslstr: ([], []) for dslstr in compiled}
+    for waveform in waveforms:
+        for dslstr, dsl in compiled.items():
+            result: DslResult = dsl.evaluate(waveform)
+            results[dslstr][0].append(result.target + sub_start)  # subset中の相対indexなので、offsetを加える
+            results[dslstr][1].append(result.value)
 
-    return TARGET, df["d"][TARGET], None  # ここからdfは参照できない..
-    # return TARGET, 0, None
+    return results
 
 
 ###
@@ -42,22 +42,34 @@ def main(machine_id: str, show_fig: bool = False):
 
     is_multi_handler = True if len(handlers) >= 2 else False
 
+    sensor_ids = [sensor.sensor_id for sensor in sensors]
+    resampling, x, y, x_sample, y_sample = create_waveforms(sensor_ids)
+
+    if show_fig:
+        save_fig(x, y, x_sample, y_sample)
+
+    if is_multi_handler:
+        simulate_multi_handler(machine_id, handlers, resampling, y_sample)
+    else:
+        simulate_single_handler(machine_id, handlers[0], resampling, y_sample)
+
+
+def create_waveforms(sensor_ids: List[str], original: int = 10000, sampling_rate: int = 100):
+    """センサーごとの波形（元データとサンプリング後のデータ）を生成する"""
     # 元データ
     freq = 1  # 周波数
-    original = 10000
     x = np.linspace(0, 1, original)
 
     y = {}
-    for sensor in sensors:
-        if sensor.sensor_id == "dummy01":
-            y[sensor.sensor_id] = np.array([0.0] * 10000)
-        elif sensor.sensor_id == "stroke_displacement":
-            y[sensor.sensor_id] = np.cos(2 * np.pi * x * freq) + 1  # cos波を+1上に平行移動
+    for sensor_id in sensor_ids:
+        if sensor_id == "dummy01":
+            y[sensor_id] = np.array([0.0] * original)
+        elif sensor_id == "stroke_displacement":
+            y[sensor_id] = np.cos(2 * np.pi * x * freq) + 1  # cos波を+1上に平行移動
         else:
-            y[sensor.sensor_id] = np.sin(2 * np.pi * x * freq) + 1 + np.random.randn(original) * 10 ** -2  # sin波を+1上に平行移動しノイズを追加
+            y[sensor_id] = np.sin(2 * np.pi * x * freq) + 1 + np.random.randn(original) * 10 ** -2  # sin波を+1上に平行移動しノイズを追加
 
     # 元データをサンプリング
-    sampling_rate = 100  # 100Hz
     sampling_interval = 1 / sampling_rate
     resampling = int(original * sampling_interval)
     x_sample = np.linspace(0, 1, resampling)
@@ -65,13 +77,12 @@ def main(machine_id: str, show_fig: bool = False):
     for k, v in y.items():
         y_sample[k] = v[::resampling]
 
-    if show_fig:
-        save_fig(x, y, x_sample, y_sample)
+    return resampling, x, y, x_sample, y_sample
 
-    if is_multi_handler:
-        simulate_multi_handler(machine_id, handlers, resampling, y_sample)
-    else:
-        simulate_single_handler(machine_id, handlers[0], resampling, y_sample)
+
+def pack_binaries(y_sample: Dict[str, np.ndarray], channels: List[str], num_of_samples: int) -> bytes:
+    """チャネル順に並べたサンプルをバイナリ化する。1行ずつstruct.pack("<dd...")して連結したものと同じバイト列となる"""
+    return np.column_stack([y_sample[ch][:num_of_samples] for ch in channels]).astype("<f8").tobytes()
 
 
 def save_fig(x, y, x_sample, y_sample):
@@ -86,9 +97,10 @@ def save_fig(x, y, x_sample, y_sample):
     plt.savefig("tmp.png")
 
 
-def output_file(machine_id, gateway_id, handler_id, file_number, binaries):
+def output_file(machine_id, gateway_id, handler_id, file_number, binaries, data_dir=None):
     """バイナリファイル出力"""
-    data_dir = os.environ["DATA_DIR"]
+    if data_dir is None:
+        data_dir = os.environ["DATA_DIR"]
     utc_now = datetime.utcnow()
     now_str = datetime.strftime(utc_now, "%Y%m%d_%H%M%S.%f")
     file_name = f"{machine_id}_{gateway_id}_{handler_id}_{now_str}_{file_number}.dat"
@@ -99,6 +111,7 @@ def output_file(machine_id, gateway_id, handler_id, file_number, binaries):
         f.write(binaries)
 
     print(f"dat file created: {file_path}")
+    return file_path
 
 
 def simulate_single_handler(machine_id, handler, resampling, y_sample):
@@ -106,18 +119,7 @@ def simulate_single_handler(machine_id, handler, resampling, y_sample):
     handler_id = handler.handler_id
 
     for file_number in range(100):
-        binaries = b""
-        for i in range(resampling):
-            binary = struct.pack(
-                "<ddddd",
-                y_sample["stroke_displacement"][i],
-                y_sample["load01"][i],
-                y_sample["load02"][i],
-                y_sample["load03"][i],
-                y_sample["load04"][i],
-            )
-            binaries += binary
-
+        binaries = pack_binaries(y_sample, ["stroke_displacement", "load01", "load02", "load03", "load04"], resampling)
         output_file(machine_id, gateway_id, handler_id, file_number, binaries)
 
 
@@ -126,19 +128,7 @@ def simulate_multi_handler(machine_id, handlers, resampling, y_sample):
     handler_ids = [x.handler_id for x in handlers]
 
     for file_number in range(100):
-        binaries = b""
-        for i in range(resampling):
-            binary = struct.pack(
-                "<dddddd",
-                y_sample["stroke_displacement"][i],
-                y_sample["load01"][i],
-                y_sample["load02"][i],
-                y_sample["load03"][i],
-                y_sample["load04"][i],
-                y_sample["dummy01"][i],
-            )
-            binaries += binary
-
+        binaries = pack_binaries(y_sample, ["stroke_displacement", "load01", "load02", "load03", "load04", "dummy01"], resampling)
         output_file(machine_id, gateway_id, handler_ids[0], file_number, binaries)
 
 